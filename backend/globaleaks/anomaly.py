@@ -331,7 +331,7 @@ class AlarmClass(object):
                 "False" if old_accept_submissions else "True"))
 
             # Invalidate the cache of node avoiding accesses to the db from here
-            GLApiCache.invalidate()
+            GLApiCache.invalidate_dependencies('node')
 
 # Alarm is a singleton class exported once
 Alarm = AlarmClass()
@@ -11,15 +11,17 @@
 import os, sys
 
 from twisted.application import internet, service
-from twisted.internet import reactor, defer
+from twisted.internet import reactor, defer, threads
 from twisted.python import log as txlog, logfile as txlogfile
 
 from globaleaks.db import init_db, sync_clean_untracked_files, \
     sync_refresh_memory_variables
 from globaleaks.rest import api
+from globaleaks.rest.apicache import GLApiCache
 from globaleaks.settings import GLSettings
 from globaleaks.utils.utility import log, GLLogObserver
 from globaleaks.utils.sock import listen_tcp_on_sock, reserve_port_for_ip
+from globaleaks.utils.staticfiles import GLStaticFiles
 from globaleaks.workers.supervisor import ProcessSupervisor
 
 # this import seems unused but it is required in order to load the mocks
@@ -81,8 +83,26 @@ class GLService(service.Service):
     def _deferred_start(self):
         GLSettings.orm_tp.start()
         reactor.addSystemEventTrigger('after', 'shutdown', GLSettings.orm_tp.stop)
+        GLSettings.orm_tp_ro.start()
+        reactor.addSystemEventTrigger('after', 'shutdown', GLSettings.orm_tp_ro.stop)
+        GLSettings.pgp_tp.start()
+        reactor.addSystemEventTrigger('after', 'shutdown', GLSettings.pgp_tp.stop)
+        GLSettings.secure_delete_tp.start()
+        reactor.addSystemEventTrigger('after', 'shutdown', GLSettings.secure_delete_tp.stop)
+        GLSettings.kdf_tp.start()
+        reactor.addSystemEventTrigger('after', 'shutdown', GLSettings.kdf_tp.stop)
         GLSettings.api_factory = api.get_api_factory()
 
+        # precompute the most requested resources before accepting requests
+        GLApiCache.warmup_enabled = True
+        yield GLApiCache.warmup()
+
+        # index the files of the client computing their compressed variants
+        try:
+            yield threads.deferToThread(GLStaticFiles.load, GLSettings.client_path, GLSettings.client_cache_path)
+        except Exception as excep:
+            log.err("Unable to index the files of the client: %s" % excep)
+
         for sock in GLSettings.http_socks:
             listen_tcp_on_sock(reactor, sock.fileno(), GLSettings.api_factory)
 
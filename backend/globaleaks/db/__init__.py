@@ -9,13 +9,13 @@ from cyclone.util import ObjectDict
 from storm import exceptions
 from twisted.internet.defer import inlineCallbacks
 
-from globaleaks import models, security, DATABASE_VERSION, FIRST_DATABASE_VERSION_SUPPORTED
+from globaleaks import models, DATABASE_VERSION, FIRST_DATABASE_VERSION_SUPPORTED
 from globaleaks.db.appdata import db_update_appdata, db_fix_fields_attrs
 from globaleaks.handlers.admin import files
 from globaleaks.models import config, l10n, User
 from globaleaks.models.config import NodeFactory, NotificationFactory, PrivateFactory
 from globaleaks.models.l10n import EnabledLanguage
-from globaleaks.orm import transact, transact_sync
+from globaleaks.orm import transact, transact_sync, store_pool
 from globaleaks.settings import GLSettings
 from globaleaks.utils.utility import log
 
@@ -63,6 +63,10 @@ def init_db(store, use_single_lang=False):
         data = favicon_file.read()
         files.db_add_file(store, data, u'favicon')
 
+    # the stores opened on the empty database need to be reopened
+    # in order to apply the settings reserved to initialized databases
+    store_pool.recycle()
+
 
 def update_db():
     """
@@ -90,6 +94,9 @@ def update_db():
             log.msg('\n'.join(traceback.format_exception(etype, value, tback)))
             return -1
 
+        # stores opened before the migration refer to the old database schema
+        store_pool.recycle()
+
         log.msg("Migration completed with success!")
 
     else:
@@ -112,18 +119,20 @@ def db_get_tracked_files(store):
 @transact_sync
 def sync_clean_untracked_files(store):
     """
-    removes files in GLSettings.submission_path that are not
-    tracked by InternalFile/ReceiverFile.
+    enqueue for secure deletion the files in GLSettings.submission_path
+    that are not tracked by InternalFile/ReceiverFile.
     """
     tracked_files = db_get_tracked_files(store)
+    queued_files = set(store.find(models.SecureFileDelete).values(models.SecureFileDelete.filepath))
+
     for filesystem_file in os.listdir(GLSettings.submission_path):
         if filesystem_file not in tracked_files:
-            file_to_remove = os.path.join(GLSettings.submission_path, filesystem_file)
-            try:
-                log.debug("Removing untracked file: %s" % file_to_remove)
-                security.overwrite_and_remove(file_to_remove)
-            except OSError:
-                log.err("Failed to remove untracked file" % file_to_remove)
+            file_to_remove = unicode(os.path.join(GLSettings.submission_path, filesystem_file))
+            if file_to_remove not in queued_files:
+                log.debug("Enqueuing untracked file for secure deletion: %s" % file_to_remove)
+                secure_file_delete = models.SecureFileDelete()
+                secure_file_delete.filepath = file_to_remove
+                store.add(secure_file_delete)
 
 
 def db_refresh_exception_delivery_list(store):
@@ -0,0 +1,18 @@
+# -*- coding: UTF-8
+
+from globaleaks.db.migrations.update import MigrationBase
+from globaleaks.models import *
+
+
+class MigrationScript(MigrationBase):
+    # the new database is created from sqlite.sql and it is therefore
+    # provided with the indexes on the foreign keys of the tips tables
+    # and on the receipt hash used by the whistleblower login.
+    def epilogue(self):
+        # the events not yet notified are recorded in the new
+        # notification outbox in order to not lose them
+        for model in [ReceiverTip, Comment, Message, ReceiverFile]:
+            for obj in self.store_new.find(model, model.new == True):
+                db_add_notification_event(self.store_new, obj)
+
+        self.store_new.commit()
@@ -198,6 +198,14 @@ CREATE TABLE mail (
     PRIMARY KEY (id)
 );
 
+CREATE TABLE notificationevent (
+    id TEXT NOT NULL,
+    creation_date TEXT NOT NULL,
+    type TEXT NOT NULL CHECK (type IN ('ReceiverTip', 'Comment', 'Message', 'ReceiverFile')),
+    object_id TEXT NOT NULL,
+    PRIMARY KEY (id)
+);
+
 CREATE TABLE receiver (
     id TEXT NOT NULL,
     configuration TEXT NOT NULL CHECK (configuration IN ('default', 'forcefully_selected', 'unselectable')),
@@ -434,3 +442,19 @@ CREATE INDEX config_group_index ON config(var_group);
 CREATE INDEX config_item_index ON config(var_group, var_name);
 CREATE INDEX config_l10n_group_index ON config_l10n(var_group);
 CREATE INDEX config_l10n_item_index ON config_l10n(lang, var_group, var_name);
+CREATE INDEX notificationevent_creation_date_index ON notificationevent(creation_date);
+CREATE INDEX whistleblowertip__receipt_hash_index ON whistleblowertip(receipt_hash);
+CREATE INDEX internaltip__expiration_date_index ON internaltip(expiration_date);
+CREATE INDEX internaltip__wb_last_access_index ON internaltip(wb_last_access);
+CREATE INDEX receivertip__receiver_id_index ON receivertip(receiver_id, internaltip_id);
+CREATE INDEX receivertip__internaltip_id_index ON receivertip(internaltip_id);
+CREATE INDEX internalfile__internaltip_id_index ON internalfile(internaltip_id);
+CREATE INDEX receiverfile__receivertip_id_index ON receiverfile(receivertip_id);
+CREATE INDEX receiverfile__internalfile_id_index ON receiverfile(internalfile_id);
+CREATE INDEX whistleblowerfile__receivertip_id_index ON whistleblowerfile(receivertip_id);
+CREATE INDEX comment__internaltip_id_index ON comment(internaltip_id);
+CREATE INDEX message__receivertip_id_index ON message(receivertip_id);
+CREATE INDEX identityaccessrequest__receivertip_id_index ON identityaccessrequest(receivertip_id);
+CREATE INDEX fieldanswer__fieldanswergroup_id_index ON fieldanswer(fieldanswergroup_id);
+CREATE INDEX fieldanswergroup__fieldanswer_id_index ON fieldanswergroup(fieldanswer_id);
+CREATE INDEX securefiledelete__filepath_index ON securefiledelete(filepath);
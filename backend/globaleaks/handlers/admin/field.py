@@ -330,7 +330,7 @@ class FieldTemplatesCollection(BaseHandler):
         response = yield GLApiCache.get('fieldtemplates', self.request.language,
                                         get_fieldtemplate_list, self.request.language, self.request.request_type)
 
-        self.write(response)
+        self.write_cached(response)
 
     @BaseHandler.transport_security_check('admin')
     @BaseHandler.authenticated('admin')
@@ -388,7 +388,7 @@ class FieldTemplateInstance(BaseHandler):
                                       self.request.language,
                                       self.request.request_type)
 
-        GLApiCache.invalidate()
+        GLApiCache.invalidate_dependencies('field')
 
         self.set_status(202) # Updated
         self.write(response)
@@ -405,7 +405,7 @@ class FieldTemplateInstance(BaseHandler):
         """
         yield delete_field(field_id)
 
-        GLApiCache.invalidate()
+        GLApiCache.invalidate_dependencies('field')
 
 
 class FieldCollection(BaseHandler):
@@ -432,7 +432,7 @@ class FieldCollection(BaseHandler):
                                       self.request.language,
                                       self.request.request_type)
 
-        GLApiCache.invalidate()
+        GLApiCache.invalidate_dependencies('field')
 
         self.set_status(201)
         self.write(response)
@@ -461,7 +461,7 @@ class FieldInstance(BaseHandler):
                                    self.request.language,
                                    self.request.request_type)
 
-        GLApiCache.invalidate()
+        GLApiCache.invalidate_dependencies('field')
 
         self.write(response)
 
@@ -486,7 +486,7 @@ class FieldInstance(BaseHandler):
                                       self.request.language,
                                       self.request.request_type)
 
-        GLApiCache.invalidate()
+        GLApiCache.invalidate_dependencies('field')
 
         self.set_status(202) # Updated
         self.write(response)
@@ -504,4 +504,4 @@ class FieldInstance(BaseHandler):
         """
         yield delete_field(field_id)
 
-        GLApiCache.invalidate()
+        GLApiCache.invalidate_dependencies('field')
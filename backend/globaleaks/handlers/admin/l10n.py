@@ -61,7 +61,7 @@ class AdminL10NHandler(BaseHandler):
 
         yield update_custom_texts(lang, request)
 
-        GLApiCache.invalidate()
+        GLApiCache.invalidate_dependencies('l10n')
 
         self.set_status(202)  # Updated
 
@@ -71,4 +71,4 @@ class AdminL10NHandler(BaseHandler):
     def delete(self, lang):
         yield delete_custom_texts(lang)
 
-        GLApiCache.invalidate()
+        GLApiCache.invalidate_dependencies('l10n')
@@ -7,8 +7,10 @@
 from twisted.internet.defer import inlineCallbacks
 
 from globaleaks import models
-from globaleaks.handlers.base import BaseHandler
-from globaleaks.orm import transact
+from globaleaks.handlers.base import BaseHandler, GLSessions, GLUploads
+from globaleaks.jobs.secure_delete_sched import db_get_secure_delete_queue_depth
+from globaleaks.orm import transact, transact_ro
+from globaleaks.settings import GLSettings
 from globaleaks.utils.structures import Rosetta
 from globaleaks.utils.utility import datetime_to_ISO8601
 
@@ -17,20 +19,24 @@ from globaleaks.utils.utility import datetime_to_ISO8601
 def collect_tip_overview(store, language):
     tip_description_list = []
 
-    all_itips = store.find(models.InternalTip)
-    for itip in all_itips:
-        tip_description = {
-            'id': itip.id,
-            'creation_date': datetime_to_ISO8601(itip.creation_date),
-            'expiration_date': datetime_to_ISO8601(itip.expiration_date),
-            'context_id': itip.context_id
-        }
-
-        mo = Rosetta(itip.context.localized_keys)
-        mo.acquire_storm_object(itip.context)
-        tip_description['context_name'] = mo.dump_localized_key('name', language)
-
-        tip_description_list.append(tip_description)
+    context_names = {}
+    for context in store.find(models.Context):
+        mo = Rosetta(context.localized_keys)
+        mo.acquire_storm_object(context)
+        context_names[context.id] = mo.dump_localized_key('name', language)
+
+    for itip_id, creation_date, expiration_date, context_id in \
+        store.find((models.InternalTip.id,
+                    models.InternalTip.creation_date,
+                    models.InternalTip.expiration_date,
+                    models.InternalTip.context_id)):
+        tip_description_list.append({
+            'id': itip_id,
+            'creation_date': datetime_to_ISO8601(creation_date),
+            'expiration_date': datetime_to_ISO8601(expiration_date),
+            'context_id': context_id,
+            'context_name': context_names[context_id]
+        })
 
     return tip_description_list
 
@@ -39,28 +45,39 @@ def collect_tip_overview(store, language):
 def collect_files_overview(store):
     file_description_list = []
 
-    for ifile in store.find(models.InternalFile):
-        file_desc = {
-            'id': ifile.id,
-            'itip': ifile.internaltip_id,
-            'path': ifile.file_path,
-            'size': ifile.size
-        }
-
-        file_description_list.append(file_desc)
-
-    for rfile in store.find(models.ReceiverFile):
-        file_desc = {
-            'id': rfile.internalfile_id,
-            'itip': rfile.internalfile.internaltip_id,
-            'path': rfile.file_path,
-            'size': rfile.size
+    for ifile_id, itip_id, file_path, size in \
+        store.find((models.InternalFile.id,
+                    models.InternalFile.internaltip_id,
+                    models.InternalFile.file_path,
+                    models.InternalFile.size)):
+        file_description_list.append({
+            'id': ifile_id,
+            'itip': itip_id,
+            'path': file_path,
+            'size': size
+        })
+
+    for ifile_id, itip_id, file_path, size in \
+        store.find((models.ReceiverFile.internalfile_id,
+                    models.InternalFile.internaltip_id,
+                    models.ReceiverFile.file_path,
+                    models.ReceiverFile.size),
+                   models.ReceiverFile.internalfile_id == models.InternalFile.id):
+        file_description_list.append({
+            'id': ifile_id,
+            'itip': itip_id,
+            'path': file_path,
+            'size': size
+        })
 
-        }
+    return file_description_list
 
-        file_description_list.append(file_desc)
 
-    return file_description_list
+@transact_ro
+def get_secure_delete_overview(store):
+    return {
+        'queue_depth': db_get_secure_delete_queue_depth(store)
+    }
 
 
 class Tips(BaseHandler):
@@ -103,3 +120,74 @@ class Files(BaseHandler):
         file_complete_list = yield collect_files_overview()
 
         self.write(file_complete_list)
+
+
+class Uploads(BaseHandler):
+    """
+    /admin/overview/uploads
+    Return the metrics of the uploads in progress
+    """
+
+    @BaseHandler.transport_security_check('admin')
+    @BaseHandler.authenticated('admin')
+    def get(self):
+        """
+        Parameters: None
+        Response: UploadsOverviewDesc
+        Errors: None
+        """
+        self.write(GLUploads.get_stats())
+
+
+class Sessions(BaseHandler):
+    """
+    /admin/overview/sessions
+    Return the number of the active sessions by role
+    """
+
+    @BaseHandler.transport_security_check('admin')
+    @BaseHandler.authenticated('admin')
+    def get(self):
+        """
+        Parameters: None
+        Response: SessionsOverviewDesc
+        Errors: None
+        """
+        self.write(GLSessions.get_stats())
+
+
+class SecureDelete(BaseHandler):
+    """
+    /admin/overview/secure_delete
+    Return the number of the files waiting for secure deletion
+    """
+
+    @BaseHandler.transport_security_check('admin')
+    @BaseHandler.authenticated('admin')
+    @inlineCallbacks
+    def get(self):
+        """
+        Parameters: None
+        Response: SecureDeleteOverviewDesc
+        Errors: None
+        """
+        secure_delete_overview = yield get_secure_delete_overview()
+
+        self.write(secure_delete_overview)
+
+
+class HTTPSWorkers(BaseHandler):
+    """
+    /admin/overview/https_workers
+    Return the metrics reported by the https workers
+    """
+
+    @BaseHandler.transport_security_check('admin')
+    @BaseHandler.authenticated('admin')
+    def get(self):
+        """
+        Parameters: None
+        Response: HTTPSWorkersOverviewDesc
+        Errors: None
+        """
+        self.write(GLSettings.state.process_supervisor.get_workers_stats())
@@ -181,7 +181,7 @@ class QuestionnairesCollection(BaseHandler):
         response = yield GLApiCache.get('questionnaires', self.request.language,
                                         get_questionnaire_list, self.request.language)
 
-        self.write(response)
+        self.write_cached(response)
 
     @BaseHandler.transport_security_check('admin')
     @BaseHandler.authenticated('admin')
@@ -200,7 +200,7 @@ class QuestionnairesCollection(BaseHandler):
 
         response = yield create_questionnaire(request, self.request.language)
 
-        GLApiCache.invalidate()
+        GLApiCache.invalidate_dependencies('questionnaire')
 
         self.set_status(201)
         self.write(response)
@@ -241,7 +241,7 @@ class QuestionnaireInstance(BaseHandler):
 
         response = yield update_questionnaire(questionnaire_id, request, self.request.language)
 
-        GLApiCache.invalidate()
+        GLApiCache.invalidate_dependencies('questionnaire')
 
         self.set_status(202)
         self.write(response)
@@ -258,4 +258,4 @@ class QuestionnaireInstance(BaseHandler):
         Errors: InvalidInputFormat, QuestionnaireIdNotFound
         """
         yield delete_questionnaire(questionnaire_id)
-        GLApiCache.invalidate()
+        GLApiCache.invalidate_dependencies('questionnaire')
@@ -10,7 +10,7 @@ from datetime import timedelta
 from storm.expr import Desc, And
 from twisted.internet.defer import inlineCallbacks
 
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.event import EventTrackQueue, events_monitored
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.models import Stats, Anomalies
@@ -30,7 +30,7 @@ def weekmap_to_heatmap(week_map):
 
     return retlist
 
-@transact
+@transact_ro
 def get_stats(store, week_delta):
     """
     :param week_delta: commonly is 0, mean that you're taking this
@@ -249,7 +249,8 @@ class JobsTiming(BaseHandler):
         for job in GLSettings.jobs:
             response.append({
               'name': job.name,
-              'timings': job.last_executions
+              'timings': job.last_executions,
+              'stats': job.stats
             })
 
         self.write(response)
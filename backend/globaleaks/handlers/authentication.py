@@ -6,13 +6,13 @@
 # Files collection handlers and utils
 
 from storm.expr import And
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, returnValue
 
 from globaleaks import security
 from globaleaks.handlers.base import BaseHandler, GLSessions, GLSession
 from globaleaks.models import User
 from globaleaks.models import WhistleblowerTip
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import errors, requests
 from globaleaks.settings import GLSettings
 from globaleaks.utils.utility import datetime_now, deferred_sleep, log, randint
@@ -48,13 +48,9 @@ def random_login_delay():
 
 
 @transact
-def login_whistleblower(store, receipt, using_tor2web):
-    """
-    login_whistleblower returns the WhistleblowerTip.id
-    """
-    hashed_receipt = security.hash_password(receipt, GLSettings.memory_copy.private.receipt_salt)
+def db_login_whistleblower(store, receipt_hash, using_tor2web):
     wbtip = store.find(WhistleblowerTip,
-                       WhistleblowerTip.receipt_hash == unicode(hashed_receipt)).one()
+                       WhistleblowerTip.receipt_hash == unicode(receipt_hash)).one()
 
     if not wbtip:
         log.debug("Whistleblower login: Invalid receipt")
@@ -72,15 +68,43 @@ def login_whistleblower(store, receipt, using_tor2web):
     return wbtip.id
 
 
-@transact
-def login(store, username, password, using_tor2web):
+@inlineCallbacks
+def login_whistleblower(receipt, using_tor2web):
     """
-    login returns a tuple (user_id, state, pcn)
+    login_whistleblower returns the WhistleblowerTip.id
+
+    The receipt is hashed on the KDF thread pool so that the transaction
+    performs only the lookup of the tip and the update of its last access.
+    """
+    receipt_hash = yield security.deferred_hash_password(receipt, GLSettings.memory_copy.private.receipt_salt)
+
+    wbtip_id = yield db_login_whistleblower(receipt_hash, using_tor2web)
+
+    returnValue(wbtip_id)
+
+
+@transact_ro
+def get_user_credentials(store, username):
+    """
+    @return: a tuple (user_id, salt, password_hash) or None if the user does not exist
     """
     user = store.find(User, And(User.username == username,
                                 User.state != u'disabled')).one()
 
-    if not user or not security.check_password(password,  user.salt, user.password):
+    if not user:
+        return None
+
+    return user.id, user.salt, user.password
+
+
+@transact
+def db_login(store, user_id, password_hash, using_tor2web):
+    user = store.find(User, And(User.id == user_id,
+                                User.password == password_hash,
+                                User.state != u'disabled')).one()
+
+    if not user:
+        # the user has been disabled or its password changed meanwhile
         log.debug("Login: Invalid credentials")
         GLSettings.failed_login_attempts += 1
         raise errors.InvalidAuthentication
@@ -96,6 +120,30 @@ def login(store, username, password, using_tor2web):
     return user.id, user.state, user.role, user.password_change_needed
 
 
+@inlineCallbacks
+def login(username, password, using_tor2web):
+    """
+    login returns a tuple (user_id, state, role, pcn)
+
+    The password is checked on the KDF thread pool between the read-only
+    lookup of the user and the transaction updating its last login.
+    """
+    credentials = yield get_user_credentials(username)
+
+    if credentials is not None:
+        user_id, salt, password_hash = credentials
+        valid = yield security.deferred_check_password(password, salt, password_hash)
+
+    if credentials is None or not valid:
+        log.debug("Login: Invalid credentials")
+        GLSettings.failed_login_attempts += 1
+        raise errors.InvalidAuthentication
+
+    ret = yield db_login(user_id, password_hash, using_tor2web)
+
+    returnValue(ret)
+
+
 class AuthenticationHandler(BaseHandler):
     """
     Login handler for admins and recipents and custodians
@@ -5,6 +5,8 @@ our needs.
 """
 import base64
 import collections
+import email.utils
+import errno
 import json
 import mimetypes
 import os
@@ -16,7 +18,7 @@ import urlparse
 
 from cyclone import web, template
 from cyclone.web import RequestHandler, HTTPError, HTTPAuthenticationRequired, RedirectHandler
-from twisted.internet import fdesc
+from twisted.internet import defer, fdesc, interfaces, tcp
 from twisted.internet.defer import inlineCallbacks
 from twisted.python.failure import Failure
 
@@ -25,21 +27,192 @@ from globaleaks.rest import errors, requests
 from globaleaks.security import GLSecureTemporaryFile, directory_traversal_check, generateRandomKey
 from globaleaks.settings import GLSettings
 from globaleaks.utils.mailutils import mail_exception_handler, send_exception_email
+from globaleaks.utils.staticfiles import GLStaticFiles
 from globaleaks.utils.tempdict import TempDict
 from globaleaks.utils.utility import log, datetime_now, deferred_sleep
 
+try:
+    from os import sendfile
+except ImportError:
+    try:
+        from sendfile import sendfile # pysendfile, optional on python 2
+    except ImportError:
+        sendfile = None
+
 HANDLER_EXEC_TIME_THRESHOLD = 30
 
-GLUploads = {}
+# size of the blocks used to append the uploaded chunks
+UPLOAD_CHUNK_COPY_SIZE = 64 * 1024
+
+# maximum number of ranges served in a multipart/byteranges response
+MAX_BYTE_RANGES = 16
+
+# range of a download resumed from an offset up to the end of the file
+RESUME_RANGE_REGEXP = re.compile(r'^\s*bytes\s*=\s*\d+\s*-\s*$')
+
+# maximum number of bytes copied with a single sendfile call
+SENDFILE_MAX_SIZE = 4 * 1024 * 1024
+
+# cache headers of the static files whose name includes the digest of the content
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class GLUpload(object):
+    """
+    An upload in progress composed by one or more chunks
+    """
+    def __init__(self, flow_identifier, f):
+        self.id = flow_identifier
+        self.file = f
+        self.size = 0
+        self.expireCall = None
+
+
+class GLUploadsFactory(TempDict):
+    """
+    Registry of the uploads in progress.
+
+    The uploads not receiving new chunks for GLSettings.upload_idle_timeout
+    seconds expire and their files are deleted. The number of the files open
+    and the bytes of the uploads in progress, including the request bodies
+    being streamed, are bounded; when a limit is reached the uploads are
+    rejected asking the client to retry later.
+    """
+    def __init__(self):
+        TempDict.__init__(self)
+        self.size = 0
+        self.streams = 0
+        self.streams_size = 0
+
+    def get_timeout(self):
+        return GLSettings.upload_idle_timeout
+
+    def expireCallback(self, upload):
+        log.debug("Upload %s expired" % upload.id)
+        self.size -= upload.size
+        upload.file.close()
+
+    def is_full(self, size=0):
+        return len(self) + self.streams >= GLSettings.uploads_limit or \
+               self.size + self.streams_size + size > GLSettings.uploads_size_limit
+
+    def stream_begin(self, size):
+        """
+        Reserve the resources for a request body streamed to disk
+
+        @return: False if the limits do not allow to accept the body
+        """
+        if self.is_full(size):
+            return False
+
+        self.streams += 1
+        self.streams_size += size
+
+        return True
+
+    def stream_end(self, size):
+        self.streams -= 1
+        self.streams_size -= size
+
+    def append(self, flow_identifier, chunk_file, chunk_size):
+        """
+        Append a chunk to an upload; the first chunk becomes the file of the upload
+        """
+        upload = self.get(flow_identifier)
+        if upload is None:
+            if self.is_full(chunk_size):
+                raise errors.UploadsLimitReached(GLSettings.upload_retry_after)
+
+            upload = GLUpload(flow_identifier, chunk_file)
+            self.set(flow_identifier, upload)
+        else:
+            append_upload_chunk(upload.file, chunk_file)
+
+        upload.size += chunk_size
+        self.size += chunk_size
+
+        return upload
+
+    def complete(self, flow_identifier):
+        """
+        Remove a completed upload from the registry without deleting its file
+        """
+        upload = self.pop(flow_identifier)
+        upload.expireCall.cancel()
+        self.size -= upload.size
+
+        return upload
+
+    def get_stats(self):
+        return {
+            'active_uploads': len(self),
+            'active_streams': self.streams,
+            'bytes_in_flight': self.size + self.streams_size
+        }
+
+
+GLUploads = GLUploadsFactory()
+
 
 class GLSessionsFactory(TempDict):
-  '''Extends TempDict to provide session management functions ontop of temp session keys'''
+    """
+    Extends TempDict to provide session management functions ontop of temp session keys
 
-  def revoke_all_sessions(self, user_id):
-      for other_session in GLSessions.values():
-          if other_session.user_id == user_id:
-              log.debug("Revoking old session for %s" % user_id)
-              GLSessions.delete(other_session.id)
+    The sessions are indexed by user and by role; the indexes are kept
+    updated on every insertion and removal, including the expirations.
+    """
+    def __init__(self, *args, **kwds):
+        self.user_sessions = {}
+        self.role_count = {}
+        TempDict.__init__(self, *args, **kwds)
+
+    def __setitem__(self, key, session):
+        if key in self:
+            del self[key]
+
+        TempDict.__setitem__(self, key, session)
+
+        self.user_sessions.setdefault(session.user_id, collections.OrderedDict())[key] = None
+        self.role_count[session.user_role] = self.role_count.get(session.user_role, 0) + 1
+
+    def __delitem__(self, key):
+        session = self[key]
+
+        TempDict.__delitem__(self, key)
+
+        user_sessions = self.user_sessions[session.user_id]
+        del user_sessions[key]
+        if not user_sessions:
+            del self.user_sessions[session.user_id]
+
+        self.role_count[session.user_role] -= 1
+
+    def clear(self):
+        TempDict.clear(self)
+        self.user_sessions = {}
+        self.role_count = {}
+
+    def set(self, key, session):
+        # the oldest sessions of the user exceeding the limit are revoked
+        user_sessions = self.user_sessions.get(session.user_id, {})
+        while len(user_sessions) >= GLSettings.sessions_per_user_limit:
+            self.delete(next(iter(user_sessions)))
+
+        TempDict.set(self, key, session)
+
+    def get_user_sessions(self, user_id):
+        return [self[session_id] for session_id in self.user_sessions.get(user_id, {})]
+
+    def revoke_all_sessions(self, user_id):
+        for session_id in list(self.user_sessions.get(user_id, {})):
+            log.debug("Revoking old session for %s" % user_id)
+            self.delete(session_id)
+
+    def get_stats(self):
+        return {
+            'sessions': len(self),
+            'sessions_per_role': {role: count for role, count in self.role_count.iteritems() if count}
+        }
 
 GLSessions = GLSessionsFactory(timeout=GLSettings.authentication_lifetime)
 
@@ -97,6 +270,22 @@ def write_upload_plaintext_to_disk(uploaded_file, destination):
     return uploaded_file
 
 
+def append_upload_chunk(f, chunk_file):
+    """
+    Append to the file of an upload the content of one of its chunks
+
+    @param f: the GLSecureTemporaryFile of the upload
+    @param chunk_file: the GLSecureTemporaryFile of the chunk
+    """
+    try:
+        data = chunk_file.read(UPLOAD_CHUNK_COPY_SIZE)
+        while data != '':
+            f.write(data)
+            data = chunk_file.read(UPLOAD_CHUNK_COPY_SIZE)
+    finally:
+        chunk_file.close()
+
+
 def write_upload_encrypted_to_disk(uploaded_file, destination):
     """
     @param uploaded_file: uploaded_file data struct
@@ -118,32 +307,116 @@ def write_upload_encrypted_to_disk(uploaded_file, destination):
 
 
 
+def parse_range_header(range_header, size):
+    """
+    Parse the value of a Range header of a request for a file of the given size
+
+    @return: the list of the (start, end) byte ranges requested, None if the
+             header is not valid and has to be ignored, or an empty list if
+             none of the ranges is satisfiable
+    """
+    unit, sep, ranges_spec = range_header.partition('=')
+    if unit.strip() != 'bytes' or not sep:
+        return None
+
+    ranges = []
+    for spec in ranges_spec.split(','):
+        start, sep, end = spec.strip().partition('-')
+        if not sep:
+            return None
+
+        try:
+            if start == '':
+                # suffix range: the last N bytes
+                length = int(end)
+                if length < 0:
+                    return None
+                elif length == 0:
+                    continue
+
+                start, end = max(0, size - length), size - 1
+            else:
+                start = int(start)
+                end = int(end) if end != '' else None
+                if start < 0 or (end is not None and end < start):
+                    return None
+
+                if end is None or end >= size:
+                    end = size - 1
+        except ValueError:
+            return None
+
+        if start < size:
+            ranges.append((start, end))
+
+    if len(ranges) > MAX_BYTE_RANGES:
+        return None
+
+    return ranges
+
+
 class StaticFileProducer(object):
     """Streaming producter for files
 
     @ivar handler: The L{IRequest} to write the contents of the file to.
     @ivar fileObject: The file the contents of which to write to the request.
+    @ivar parts: The strings and the (offset, length) ranges of the file to write.
     """
     bufferSize = GLSettings.file_chunk_size
 
-    def __init__(self, handler, fileObject):
+    def __init__(self, handler, fileObject, parts=None):
         self.handler = handler
         self.fileObject = fileObject
+        self.parts = collections.deque(parts if parts is not None else [(0, None)])
+        self.remaining = 0
+        self.completed = False
+        self.deferred = defer.Deferred()
 
     def start(self):
+        """
+        @return: a Deferred firing with True if all the data has been written
+        """
         self.handler.request.connection.transport.registerProducer(self, False)
 
+        return self.deferred
+
+    def read(self):
+        while self.remaining == 0:
+            if not self.parts:
+                return ''
+
+            part = self.parts.popleft()
+            if isinstance(part, str):
+                return part
+
+            offset, self.remaining = part
+            self.fileObject.seek(offset)
+
+        data = self.fileObject.read(self.bufferSize if self.remaining is None else min(self.bufferSize, self.remaining))
+
+        if self.remaining is None:
+            if not data:
+                self.remaining = 0
+                return self.read()
+        elif not data:
+            raise Exception("Unexpected end of file %s" % self.fileObject.name)
+        else:
+            self.remaining -= len(data)
+
+        return data
+
     def resumeProducing(self):
         try:
             if not self.handler:
                 return
-            data = self.fileObject.read(self.bufferSize)
+            data = self.read()
             if data:
                 self.handler.write(data)
                 self.handler.flush()
             else:
                 self.handler.request.connection.transport.unregisterProducer()
                 self.handler.finish()
+                self.completed = True
                 self.stopProducing()
         except:
             self.handler.finish()
@@ -153,6 +426,98 @@ class StaticFileProducer(object):
         self.fileObject.close()
         self.handler = None
 
+        if not self.deferred.called:
+            self.deferred.callback(self.completed)
+
+
+class SendfileProducer(StaticFileProducer):
+    """Streaming producer for plaintext files based on sendfile(2)
+
+    The contents of the file are copied by the kernel directly to the socket
+    of the connection. The producer is registered as a pull producer: apart
+    from the pull done by registerProducer, when the headers are still
+    buffered, the transport resumes it only once its buffer has been
+    entirely written, so that the data of the file is never reordered with
+    the headers and the strings of the parts.
+    """
+    def __init__(self, handler, fileObject, parts=None):
+        StaticFileProducer.__init__(self, handler, fileObject, parts)
+        self.offset = 0
+        self.registering = False
+
+    def start(self):
+        # the headers are buffered by the transport that pulls the producer
+        # again once they have been written
+        self.handler.flush()
+
+        self.registering = True
+        try:
+            return StaticFileProducer.start(self)
+        finally:
+            self.registering = False
+
+    def send(self, transport):
+        """
+        @return: False if there is no more data to be sent
+        """
+        while self.remaining == 0:
+            if not self.parts:
+                return False
+
+            part = self.parts.popleft()
+            if isinstance(part, str):
+                self.handler.write(part)
+                self.handler.flush()
+                return True
+
+            self.offset, self.remaining = part
+
+        try:
+            sent = sendfile(transport.fileno(), self.fileObject.fileno(), self.offset,
+                            min(self.remaining, SENDFILE_MAX_SIZE))
+        except (IOError, OSError) as excep:
+            if excep.errno not in (errno.EAGAIN, errno.EINTR):
+                raise
+
+            sent = None
+        else:
+            if sent == 0:
+                raise Exception("Unexpected end of file %s" % self.fileObject.name)
+
+            self.offset += sent
+            self.remaining -= sent
+
+        # the transport pulls the producer once the socket is writable again
+        transport.startWriting()
+
+        return True
+
+    def resumeProducing(self):
+        try:
+            if not self.handler or self.registering:
+                return
+
+            transport = self.handler.request.connection.transport
+
+            if not self.send(transport):
+                transport.unregisterProducer()
+                self.handler.finish()
+                self.completed = True
+                self.stopProducing()
+        except:
+            self.handler.finish()
+            raise
+
+    @staticmethod
+    def supports(transport, fileObject):
+        """
+        @return: True if the file could be sent directly on the transport
+        """
+        return sendfile is not None and \
+               isinstance(fileObject, file) and \
+               isinstance(transport, tcp.Connection) and \
+               not interfaces.ISSLTransport.providedBy(transport)
+
 
 class GLSession(object):
     expireCall = None # attached to object by tempDict
@@ -541,6 +906,11 @@ class BaseHandler(RequestHandler):
         if not self.filehandler:
             track_handler(self)
 
+        # release the uploaded chunks that have not been consumed
+        for f in self.request.files.get('file', []):
+            if isinstance(f.get('body'), GLSecureTemporaryFile):
+                f['body'].close()
+
         self.handler_time_analysis_end()
         self.handler_request_logging_end()
 
@@ -571,30 +941,146 @@ class BaseHandler(RequestHandler):
             else:
                 error_dict.update({'arguments': []})
 
+            if hasattr(exception, 'retry_after'):
+                self.set_header('Retry-After', str(exception.retry_after))
+
             self.set_status(status_code)
             self.write(error_dict)
         else:
             RequestHandler.write_error(self, status_code, **kw)
 
-    def write_file(self, filepath):
+    def write_cached(self, entry):
+        """
+        Write a response precomputed by the GLApiCache answering
+        with 304 in case the client already has the same version.
+
+        The body is served compressed with the preferred content
+        coding accepted by the client.
+        """
+        encoding, body, etag = entry.get_variant(self.request.headers.get('Accept-Encoding'))
+
+        self.set_header('Content-Type', 'application/json')
+        self.set_header('Etag', etag)
+        self.set_header('Vary', 'Accept-Encoding')
+
+        inm = self.request.headers.get('If-None-Match')
+        if inm is not None and etag in inm:
+            self.set_status(304)
+            return
+
+        if encoding is not None:
+            self.set_header('Content-Encoding', encoding)
+
+        self.write(body)
+
+    def serve_file(self, fileObject, size, mtime, content_type, etag=None):
+        """
+        Serve a file supporting conditional requests and byte ranges
+
+        The file object needs to support seek() and read(); encrypted files
+        are served seeking in the plaintext while the plaintext files are
+        sent with sendfile(2) when supported by the transport.
+
+        @return: a Deferred firing with True if the response completed the
+                 download of the file and it has been completely written
+        """
+        if etag is None:
+            etag = '"%x-%x"' % (int(mtime), size)
+
+        last_modified = email.utils.formatdate(mtime, usegmt=True)
+
+        self.set_header('Accept-Ranges', 'bytes')
+        self.set_header('Etag', etag)
+        self.set_header('Last-Modified', last_modified)
+
+        inm = self.request.headers.get('If-None-Match')
+        if inm is not None and (inm.strip() == '*' or etag in inm):
+            fileObject.close()
+            self.set_status(304)
+            self.finish()
+            return defer.succeed(False)
+
+        ranges = None
+
+        range_header = self.request.headers.get('Range')
+        if range_header is not None:
+            if_range = self.request.headers.get('If-Range')
+            if if_range is None or if_range.strip() in (etag, last_modified):
+                ranges = parse_range_header(range_header, size)
+
+        if ranges is None:
+            self.set_header('Content-Type', content_type)
+            self.set_header('Content-Length', size)
+            parts = [(0, size)]
+        elif not ranges:
+            fileObject.close()
+            self.set_status(416)
+            self.set_header('Content-Range', 'bytes */%d' % size)
+            self.finish()
+            return defer.succeed(False)
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.set_status(206)
+            self.set_header('Content-Type', content_type)
+            self.set_header('Content-Range', 'bytes %d-%d/%d' % (start, end, size))
+            self.set_header('Content-Length', end - start + 1)
+            parts = [(start, end - start + 1)]
+        else:
+            boundary = generateRandomKey(32)
+
+            parts = []
+            for start, end in ranges:
+                parts.append('\r\n--%s\r\n'
+                             'Content-Type: %s\r\n'
+                             'Content-Range: bytes %d-%d/%d\r\n\r\n' % (boundary, content_type, start, end, size))
+                parts.append((start, end - start + 1))
+
+            parts.append('\r\n--%s--\r\n' % boundary)
+
+            self.set_status(206)
+            self.set_header('Content-Type', 'multipart/byteranges; boundary=%s' % boundary)
+            self.set_header('Content-Length', sum(len(p) if isinstance(p, str) else p[1] for p in parts))
+
+        # the download is completed by the responses including the entire
+        # file or resuming it from an offset up to its end, assuming that the
+        # client already received the preceding bytes; the suffix and the
+        # closed ranges requested for example to probe the file are ignored
+        completes_download = ranges is None or \
+                             (len(ranges) == 1 and RESUME_RANGE_REGEXP.match(range_header) is not None)
+
+        if SendfileProducer.supports(self.request.connection.transport, fileObject):
+            producer = SendfileProducer(self, fileObject, parts)
+        else:
+            producer = StaticFileProducer(self, fileObject, parts)
+
+        d = producer.start()
+        d.addCallback(lambda completed: completed and completes_download)
+
+        return d
+
+    def open_file(self, filepath):
         if not os.path.exists(filepath) or not os.path.isfile(filepath):
           raise HTTPError(404)
 
+        fileObject = open(filepath, "rb")
+        stat = os.fstat(fileObject.fileno())
+
+        return fileObject, stat.st_size, stat.st_mtime
+
+    def write_file(self, filepath):
+        fileObject, size, mtime = self.open_file(filepath)
+
         mime_type, encoding = mimetypes.guess_type(filepath)
-        if mime_type:
-            self.set_header("Content-Type", mime_type)
 
-        StaticFileProducer(self, open(filepath, "rb")).start()
+        return self.serve_file(fileObject, size, mtime, mime_type or 'application/octet-stream')
 
     def force_file_download(self, filename, filepath):
-        if not os.path.exists(filepath) or not os.path.isfile(filepath):
-          raise HTTPError(404)
+        fileObject, size, mtime = self.open_file(filepath)
 
         self.set_header('X-Download-Options', 'noopen')
-        self.set_header('Content-Type', 'application/octet-stream')
         self.set_header('Content-Disposition', 'attachment; filename=\"%s\"' % filename)
 
-        StaticFileProducer(self, open(filepath, "rb")).start()
+        return self.serve_file(fileObject, size, mtime, 'application/octet-stream')
 
     @inlineCallbacks
     def uniform_answers_delay(self):
@@ -629,7 +1115,16 @@ class BaseHandler(RequestHandler):
             if len(self.request.files) != 1:
                 raise errors.InvalidInputFormat("cannot accept more than a file upload at once")
 
-            chunk_size = len(self.request.files['file'][0]['body'])
+            chunk = self.request.files['file'][0]
+
+            if isinstance(chunk['body'], str):
+                # bodies not streamed to disk while received
+                chunk_file = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
+                chunk_file.write(chunk['body'])
+                chunk['size'] = len(chunk['body'])
+                chunk['body'] = chunk_file
+
+            chunk_size = chunk['size']
             total_file_size = int(self.request.arguments['flowTotalSize'][0]) if 'flowTotalSize' in self.request.arguments else chunk_size
             flow_identifier = self.request.arguments['flowIdentifier'][0] if 'flowIdentifier' in self.request.arguments else generateRandomKey(10)
 
@@ -638,21 +1133,19 @@ class BaseHandler(RequestHandler):
                 log.err("File upload request rejected: file too big")
                 raise errors.FileTooBig(GLSettings.memory_copy.maximum_filesize)
 
-            if flow_identifier not in GLUploads:
-                f = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
-                GLUploads[flow_identifier] = f
-            else:
-                f = GLUploads[flow_identifier]
+            f = GLUploads.append(flow_identifier, chunk['body'], chunk_size).file
 
-            f.write(self.request.files['file'][0]['body'])
+            chunk['body'] = None
 
             if 'flowChunkNumber' in self.request.arguments and 'flowTotalChunks' in self.request.arguments:
                 if self.request.arguments['flowChunkNumber'][0] != self.request.arguments['flowTotalChunks'][0]:
                     return None
 
+            GLUploads.complete(flow_identifier)
+
             uploaded_file = {
-                'name': self.request.files['file'][0]['filename'],
-                'type': self.request.files['file'][0]['content_type'],
+                'name': chunk['filename'],
+                'type': chunk['content_type'],
                 'size': total_file_size,
                 'path': f.filepath,
                 'body': f,
@@ -664,7 +1157,7 @@ class BaseHandler(RequestHandler):
 
             return uploaded_file
 
-        except errors.FileTooBig:
+        except (errors.FileTooBig, errors.UploadsLimitReached):
             raise  # propagate the exception
 
         except Exception as exc:
@@ -754,7 +1247,35 @@ class BaseStaticFileHandler(BaseHandler):
 
         directory_traversal_check(self.root, abspath)
 
-        self.write_file(abspath)
+        staticfile = GLStaticFiles.get(abspath)
+        if staticfile is None:
+            self.write_file(abspath)
+        else:
+            self.write_static_file(staticfile)
+
+    def write_static_file(self, staticfile):
+        """
+        Serve a file of the client indexed at startup selecting the variant
+        compressed with the preferred content coding accepted by the client
+        """
+        variant = staticfile.get_variant(self.request.headers.get('Accept-Encoding'))
+
+        fileObject, size, _ = self.open_file(variant.path)
+
+        if len(staticfile.variants) > 1:
+            self.set_header('Vary', 'Accept-Encoding')
+
+        if variant.encoding is not None:
+            self.set_header('Content-Encoding', variant.encoding)
+
+        if staticfile.immutable:
+            self.set_header('Cache-Control', IMMUTABLE_CACHE_CONTROL)
+            self.clear_header('Pragma')
+            self.clear_header('Expires')
+
+        mime_type, encoding = mimetypes.guess_type(staticfile.path)
+
+        self.serve_file(fileObject, size, staticfile.mtime, mime_type or 'application/octet-stream', variant.etag)
 
 
 class BaseRedirectHandler(BaseHandler, RedirectHandler):
@@ -36,6 +36,9 @@ def get_l10n(store, lang):
     return texts
 
 
+GLApiCache.register_warmup('l10n', get_l10n)
+
+
 class L10NHandler(BaseHandler):
     """
     This class is used to return the custom translation files;
@@ -45,9 +48,9 @@ class L10NHandler(BaseHandler):
     @BaseHandler.unauthenticated
     @inlineCallbacks
     def get(self, lang):
-        self.set_header('Content-Type', 'application/json')
-
         l10n = yield GLApiCache.get('l10n', self.request.language,
                                     get_l10n, self.request.language)
 
-        self.write(l10n)
+        # translations are not confidential and thus can be revalidated
+        self.set_header('Cache-control', 'no-cache')
+        self.write_cached(l10n)
@@ -13,7 +13,7 @@ from globaleaks.handlers.base import BaseHandler
 from globaleaks.models import l10n
 from globaleaks.models.config import NodeFactory
 from globaleaks.models.l10n import NodeL10NFactory
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest.apicache import GLApiCache
 from globaleaks.settings import GLSettings
 from globaleaks.utils.sets import disjoint_union
@@ -272,7 +272,7 @@ def db_get_public_receiver_list(store, language):
     return receiver_list
 
 
-@transact
+@transact_ro
 def get_public_resources(store, language):
     return {
         'node': db_serialize_node(store, language),
@@ -281,6 +281,9 @@ def get_public_resources(store, language):
     }
 
 
+GLApiCache.register_warmup('public', get_public_resources)
+
+
 class PublicResource(BaseHandler):
     @BaseHandler.transport_security_check("unauth")
     @BaseHandler.unauthenticated
@@ -291,4 +294,7 @@ class PublicResource(BaseHandler):
         """
         ret = yield GLApiCache.get('public', self.request.language,
                                    get_public_resources, self.request.language)
-        self.write(ret)
+
+        # public resources are not confidential and thus can be revalidated
+        self.set_header('Cache-control', 'no-cache')
+        self.write_cached(ret)
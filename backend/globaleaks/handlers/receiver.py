@@ -5,7 +5,7 @@
 # Implement the classes handling the requests performed to /receiver/* URI PATH
 # Used by receivers to update personal preferences and access to personal data
 
-from storm.expr import And, In
+from storm.expr import And, Count, In
 from twisted.internet.defer import inlineCallbacks
 
 from globaleaks.handlers.base import BaseHandler
@@ -13,8 +13,9 @@ from globaleaks.handlers.rtip import db_postpone_expiration_date, db_delete_rtip
 from globaleaks.handlers.submission import db_get_archived_preview_schema
 from globaleaks.handlers.user import db_user_update_user
 from globaleaks.handlers.user import user_serialize_user
-from globaleaks.models import Receiver, ReceiverTip
-from globaleaks.orm import transact
+from globaleaks.models import Comment, Context, InternalFile, InternalTip, \
+    Message, Receiver, ReceiverTip
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import requests, errors
 from globaleaks.rest.apicache import GLApiCache
 from globaleaks.settings import GLSettings
@@ -62,32 +63,62 @@ def update_receiver_settings(store, receiver_id, request, language):
     return receiver_serialize_receiver(receiver, language)
 
 
-@transact
+def db_get_counters(store, key, *clauses):
+    """
+    Count with a single aggregate query the objects matching the
+    specified clauses grouping them by the specified key
+    """
+    return dict(store.find((key, Count()), *clauses).group_by(key))
+
+
+@transact_ro
 def get_receivertip_list(store, receiver_id, language):
     rtip_summary_list = []
 
-    for rtip in store.find(ReceiverTip, ReceiverTip.receiver_id == receiver_id):
-        mo = Rosetta(rtip.internaltip.context.localized_keys)
-        mo.acquire_storm_object(rtip.internaltip.context)
+    context_names = {}
+    for context in store.find(Context):
+        mo = Rosetta(context.localized_keys)
+        mo.acquire_storm_object(context)
+        context_names[context.id] = mo.dump_localized_key('name', language)
+
+    file_counters = db_get_counters(store, InternalFile.internaltip_id,
+                                    InternalFile.internaltip_id == ReceiverTip.internaltip_id,
+                                    ReceiverTip.receiver_id == receiver_id)
+
+    comment_counters = db_get_counters(store, Comment.internaltip_id,
+                                       Comment.internaltip_id == ReceiverTip.internaltip_id,
+                                       ReceiverTip.receiver_id == receiver_id)
+
+    message_counters = db_get_counters(store, Message.receivertip_id,
+                                       Message.receivertip_id == ReceiverTip.id,
+                                       ReceiverTip.receiver_id == receiver_id)
+
+    preview_schemas = {}
+
+    for rtip, itip in store.find((ReceiverTip, InternalTip),
+                                 ReceiverTip.receiver_id == receiver_id,
+                                 ReceiverTip.internaltip_id == InternalTip.id):
+        if itip.questionnaire_hash not in preview_schemas:
+            preview_schemas[itip.questionnaire_hash] = db_get_archived_preview_schema(store, itip.questionnaire_hash, language)
 
         rtip_summary_list.append({
             'id': rtip.id,
-            'creation_date': datetime_to_ISO8601(rtip.internaltip.creation_date),
+            'creation_date': datetime_to_ISO8601(itip.creation_date),
             'last_access': datetime_to_ISO8601(rtip.last_access),
-            'update_date': datetime_to_ISO8601(rtip.internaltip.update_date),
-            'expiration_date': datetime_to_ISO8601(rtip.internaltip.expiration_date),
-            'progressive': rtip.internaltip.progressive,
-            'new': rtip.access_counter == 0 or rtip.last_access < rtip.internaltip.update_date,
-            'context_name': mo.dump_localized_key('name', language),
+            'update_date': datetime_to_ISO8601(itip.update_date),
+            'expiration_date': datetime_to_ISO8601(itip.expiration_date),
+            'progressive': itip.progressive,
+            'new': rtip.access_counter == 0 or rtip.last_access < itip.update_date,
+            'context_name': context_names[itip.context_id],
             'access_counter': rtip.access_counter,
-            'file_counter': rtip.internaltip.internalfiles.count(),
-            'comment_counter': rtip.internaltip.comments.count(),
-            'message_counter': rtip.messages.count(),
-            'tor2web': rtip.internaltip.tor2web,
-            'questionnaire_hash': rtip.internaltip.questionnaire_hash,
-            'preview_schema': db_get_archived_preview_schema(store, rtip.internaltip.questionnaire_hash, language),
-            'preview': rtip.internaltip.preview,
-            'total_score': rtip.internaltip.total_score,
+            'file_counter': file_counters.get(itip.id, 0),
+            'comment_counter': comment_counters.get(itip.id, 0),
+            'message_counter': message_counters.get(rtip.id, 0),
+            'tor2web': itip.tor2web,
+            'questionnaire_hash': itip.questionnaire_hash,
+            'preview_schema': preview_schemas[itip.questionnaire_hash],
+            'preview': itip.preview,
+            'total_score': itip.total_score,
             'label': rtip.label
         })
 
@@ -160,7 +191,7 @@ class ReceiverInstance(BaseHandler):
                                                          request,
                                                          self.request.language)
 
-        GLApiCache.invalidate()
+        GLApiCache.invalidate_dependencies('receiver')
 
         self.write(receiver_status)
 
@@ -18,7 +18,7 @@ from globaleaks.handlers.base import BaseHandler, \
     directory_traversal_check, write_upload_plaintext_to_disk
 from globaleaks.handlers.custodian import serialize_identityaccessrequest
 from globaleaks.handlers.submission import serialize_usertip
-from globaleaks.models import serializers, \
+from globaleaks.models import serializers, db_add_notification_event, \
     ArchivedSchema, \
     Comment, Message, \
     InternalTip, \
@@ -361,6 +361,8 @@ def create_comment(store, user_id, rtip_id, request):
 
     rtip.internaltip.comments.add(comment)
 
+    db_add_notification_event(store, comment)
+
     return serialize_comment(comment)
 
 
@@ -595,10 +597,19 @@ class WhistleblowerFileInstanceHandler(BaseHandler):
         if wbfile is None or not self.user_can_access(wbfile):
             raise errors.FileIdNotFound
 
-        self.access_wbfile(wbfile)
-
         return serializers.serialize_wbfile(wbfile)
 
+    @transact
+    def register_wbfile_download(self, store, file_id):
+        """
+        Account a download once the file has been completely sent
+        """
+        wbfile = store.find(WhistleblowerFile,
+                            WhistleblowerFile.id == file_id).one()
+
+        if wbfile is not None:
+            self.access_wbfile(wbfile)
+
     @inlineCallbacks
     @asynchronous
     def _get(self, wbfile_id):
@@ -608,7 +619,9 @@ class WhistleblowerFileInstanceHandler(BaseHandler):
 
         directory_traversal_check(GLSettings.submission_path, filelocation)
 
-        self.force_file_download(wbfile['name'], filelocation)
+        d = self.force_file_download(wbfile['name'], filelocation)
+        d.addCallback(lambda completed: self.register_wbfile_download(wbfile_id) if completed else None)
+        d.addErrback(lambda fail: log.err("Unable to serve wbfile %s: %s" % (wbfile_id, fail.value)))
 
 
 class RTipWBFileInstanceHandler(WhistleblowerFileInstanceHandler):
@@ -649,12 +662,23 @@ class ReceiverFileDownload(BaseHandler):
         if not rfile:
             raise errors.FileIdNotFound
 
-        log.debug("Download of file %s by receiver %s (%d)" %
-                  (rfile.internalfile_id, rfile.receivertip.receiver_id, rfile.downloads))
+        return serializers.serialize_rfile(rfile)
+
+    @transact
+    def register_rfile_download(self, store, file_id):
+        """
+        Account a download once the file has been completely sent
+
+        A download resumed with range requests is accounted only once,
+        by the request resuming it up to the end of the file.
+        """
+        rfile = store.find(ReceiverFile, ReceiverFile.id == file_id).one()
 
-        rfile.downloads += 1
+        if rfile is not None:
+            log.debug("Download of file %s by receiver %s (%d)" %
+                      (rfile.internalfile_id, rfile.receivertip.receiver_id, rfile.downloads))
 
-        return serializers.serialize_rfile(rfile)
+            rfile.downloads += 1
 
     @BaseHandler.transport_security_check('receiver')
     @BaseHandler.authenticated('receiver')
@@ -667,7 +691,9 @@ class ReceiverFileDownload(BaseHandler):
 
         directory_traversal_check(GLSettings.submission_path, filelocation)
 
-        self.force_file_download(rfile['name'], filelocation)
+        d = self.force_file_download(rfile['name'], filelocation)
+        d.addCallback(lambda completed: self.register_rfile_download(rfile_id) if completed else None)
+        d.addErrback(lambda fail: log.err("Unable to serve rfile %s: %s" % (rfile_id, fail.value)))
 
 
 class IdentityAccessRequestsCollection(BaseHandler):
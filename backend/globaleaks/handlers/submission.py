@@ -17,9 +17,10 @@ from globaleaks.handlers.admin.context import db_get_context_steps
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.orm import transact
 from globaleaks.rest import errors, requests
-from globaleaks.security import hash_password, sha256, generateRandomReceipt
+from globaleaks.security import deferred_hash_password, sha256, generateRandomReceipt
 from globaleaks.settings import GLSettings
 from globaleaks.utils.structures import Rosetta, get_localized_values
+from globaleaks.utils.lrucache import LRUCache
 from globaleaks.utils.token import TokenList
 from globaleaks.utils.utility import log, get_expiration, \
     datetime_now, datetime_never, datetime_to_ISO8601
@@ -69,16 +70,29 @@ def _db_get_archived_field_recursively(field, language):
     return get_localized_values(field, field, models.Field.localized_keys, language)
 
 
+# Archived schemas are immutable and identified by their hash; their
+# localized versions are then cached and shared between all the callers
+# that must not modify them.
+ArchivedSchemaCache = LRUCache(GLSettings.archived_schema_cache_size)
+
+
 def _db_get_archived_questionnaire_schema(store, hash, type, language):
+    # the localization falls back on the default language for missing texts
+    key = (hash, type, language, GLSettings.memory_copy.default_language)
+
+    questionnaire = ArchivedSchemaCache.get(key)
+    if questionnaire is not None:
+        return questionnaire
+
     aqs = store.find(models.ArchivedSchema,
                      models.ArchivedSchema.hash == hash,
                      models.ArchivedSchema.type == type).one()
 
     if not aqs:
         log.err("Unable to find questionnaire schema with hash %s" % hash)
-        questionnaire = []
-    else:
-        questionnaire = copy.deepcopy(aqs.schema)
+        return []
+
+    questionnaire = copy.deepcopy(aqs.schema)
 
     if type == 'questionnaire':
         for step in questionnaire:
@@ -91,6 +105,8 @@ def _db_get_archived_questionnaire_schema(store, hash, type, language):
         for field in questionnaire:
             _db_get_archived_field_recursively(field, language)
 
+    ArchivedSchemaCache.set(key, questionnaire)
+
     return questionnaire
 
 
@@ -263,29 +279,24 @@ def db_create_receivertip(store, receiver, internaltip):
 
     store.add(receivertip)
 
+    models.db_add_notification_event(store, receivertip)
+
     return receivertip.id
 
-def db_create_whistleblowertip(store, internaltip):
+def db_create_whistleblowertip(store, internaltip, receipt_hash):
     """
-    The plaintext receipt is returned only now, and then is
-    stored hashed in the WBtip table
+    The plaintext receipt is returned only to the whistleblower
+    and it is stored hashed in the WBtip table
     """
-    receipt = unicode(generateRandomReceipt())
-
     wbtip = models.WhistleblowerTip()
     wbtip.id = internaltip.id
-    wbtip.receipt_hash = hash_password(receipt, GLSettings.memory_copy.private.receipt_salt)
+    wbtip.receipt_hash = receipt_hash
     store.add(wbtip)
 
-    return receipt, wbtip
+    return wbtip
 
 
-@transact
-def create_whistleblowertip(*args):
-    return db_create_whistleblowertip(*args)[0] # here is exported only the receipt
-
-
-def db_create_submission(store, request, uploaded_files, t2w, language):
+def db_create_submission(store, request, uploaded_files, t2w, language, receipt, receipt_hash):
     answers = request['answers']
 
     context = store.find(models.Context, models.Context.id == request['context_id']).one()
@@ -355,7 +366,7 @@ def db_create_submission(store, request, uploaded_files, t2w, language):
         log.err("Submission create: unable to create db entry for files: %s" % excep)
         raise excep
 
-    receipt, wbtip = db_create_whistleblowertip(store, submission)
+    wbtip = db_create_whistleblowertip(store, submission, receipt_hash)
 
     if submission.context.maximum_selectable_receivers > 0 and \
                     len(request['receivers']) > submission.context.maximum_selectable_receivers:
@@ -384,8 +395,22 @@ def db_create_submission(store, request, uploaded_files, t2w, language):
 
 
 @transact
-def create_submission(store, request, uploaded_files, t2w, language):
-    return db_create_submission(store, request, uploaded_files, t2w, language)
+def save_submission(store, request, uploaded_files, t2w, language, receipt, receipt_hash):
+    return db_create_submission(store, request, uploaded_files, t2w, language, receipt, receipt_hash)
+
+
+@defer.inlineCallbacks
+def create_submission(request, uploaded_files, t2w, language):
+    """
+    The receipt is hashed on the KDF thread pool before
+    the transaction saving the submission
+    """
+    receipt = unicode(generateRandomReceipt())
+    receipt_hash = yield deferred_hash_password(receipt, GLSettings.memory_copy.private.receipt_salt)
+
+    submission = yield save_submission(request, uploaded_files, t2w, language, receipt, unicode(receipt_hash))
+
+    defer.returnValue(submission)
 
 
 class SubmissionInstance(BaseHandler):
@@ -12,7 +12,7 @@ from globaleaks.handlers.base import BaseHandler
 from globaleaks.handlers.rtip import serialize_comment, serialize_message, db_get_itip_comment_list, WhistleblowerFileInstanceHandler
 from globaleaks.handlers.submission import serialize_usertip, \
     db_save_questionnaire_answers, db_get_archived_questionnaire_schema
-from globaleaks.models import InternalFile, WhistleblowerFile, \
+from globaleaks.models import db_add_notification_event, InternalFile, WhistleblowerFile, \
     ReceiverTip, WhistleblowerTip, Comment, Message
 from globaleaks.orm import transact
 from globaleaks.rest import errors, requests
@@ -108,6 +108,8 @@ def create_comment(store, wbtip_id, request):
 
     wbtip.internaltip.comments.add(comment)
 
+    db_add_notification_event(store, comment)
+
     return serialize_comment(comment)
 
 
@@ -146,6 +148,8 @@ def create_message(store, wbtip_id, receiver_id, request):
 
     store.add(msg)
 
+    db_add_notification_event(store, msg)
+
     return serialize_message(msg)
 
 
@@ -250,7 +254,7 @@ class WBTipWBFileInstanceHandler(WhistleblowerFileInstanceHandler):
 
     def access_wbfile(self, wbfile):
         log.debug("Download of file %s by whistleblower %s" %
-                  (wbfile.id, self.current_user.user_id))
+                  (wbfile.id, wbfile.receivertip.internaltip_id))
         wbfile.downloads += 1
 
     @BaseHandler.transport_security_check('whistleblower')
@@ -4,6 +4,7 @@ from globaleaks.jobs import exit_nodes_refresh_sched, \
                             notification_sched, \
                             delivery_sched, \
                             cleaning_sched, \
+                            secure_delete_sched, \
                             pgp_check_sched
 
 jobs_list = [
@@ -13,6 +14,7 @@ jobs_list = [
     notification_sched.NotificationSchedule,
     session_management_sched.SessionManagementSchedule,
     cleaning_sched.CleaningSchedule,
+    secure_delete_sched.SecureDeleteSchedule,
     pgp_check_sched.PGPCheckSchedule,
     statistics_sched.StatisticsSchedule
 ]
@@ -24,6 +26,7 @@ __all__ = [
     'notification_sched',
     'statistics_sched',
     'cleaning_sched',
+    'secure_delete_sched',
     'session_management_sched',
     'pgp_check_sched'
 ]
@@ -35,6 +35,9 @@ class GLJob(task.LoopingCall):
         self.job = task.LoopingCall.__init__(self, self.run)
         self.clock = reactor if test_reactor is None else test_reactor
 
+        # job specific metrics of the latest execution
+        self.stats = {}
+
     def _errback(self, loopingCall):
         error = "Job %s died with runtime %.4f [low: %.4f, high: %.4f]" % \
                       (self.name, self.mean_time, self.low_time, self.high_time)
@@ -6,13 +6,19 @@
 # Call also the FileProcess working point, in order to verify which
 # kind of file has been submitted.
 
+import Queue
 import os
+import threading
+import time
+
+from twisted.internet import defer, reactor, threads
+from twisted.internet.threads import deferToThreadPool
 
 from globaleaks.handlers.admin.receiver import admin_serialize_receiver
 from globaleaks.jobs.base import GLJob
-from globaleaks.models import InternalFile, ReceiverFile
+from globaleaks.models import db_add_notification_event, InternalFile, ReceiverFile
 from globaleaks.orm import transact_sync
-from globaleaks.security import GLBPGP, GLSecureFile, generateRandomKey
+from globaleaks.security import GLBPGPKeyring, GLSecureFile, generateRandomKey
 from globaleaks.settings import GLSettings
 from globaleaks.utils.utility import log
 
@@ -21,6 +27,16 @@ __all__ = ['DeliverySchedule']
 
 INTERNALFILES_HANDLE_RETRY_MAX = 3
 
+# size of the chunks read from the AES files and fed to all the receivers sinks
+DELIVERY_CHUNK_SIZE = 64 * 1024
+
+# number of chunks buffered for each encryptor
+DELIVERY_STREAM_QUEUE_SIZE = 16
+
+
+# keyring shared by all the encryptions performed by the delivery
+delivery_keyring = GLBPGPKeyring()
+
 
 @transact_sync
 def receiverfile_planning(store):
@@ -65,6 +81,9 @@ def receiverfile_planning(store):
 
             store.add(receiverfile)
 
+            if receiverfile.new:
+                db_add_notification_event(store, receiverfile)
+
             if ifile.id not in receiverfiles_maps:
                 receiverfiles_maps[ifile.id] = {
                   'plaintext_file_needed': False,
@@ -85,113 +104,261 @@ def receiverfile_planning(store):
     return receiverfiles_maps
 
 
-def fsops_pgp_encrypt(fpath, recipient_pgp):
+class DeliveryStream(object):
+    """
+    File like object feeding an encryptor with the chunks of a file that
+    is read only once and delivered to many receivers.
+
+    Like a pipe, read() returns the data as soon as it is available and
+    never more than the requested size.
+    """
+    def __init__(self):
+        self.queue = Queue.Queue(DELIVERY_STREAM_QUEUE_SIZE)
+        self.chunk = ''
+        self.offset = 0
+        self.eof = False
+
+        # set when the consumer terminates; further writes are discarded
+        self.closed = False
+
+    def write(self, data):
+        while not self.closed:
+            try:
+                self.queue.put(data, timeout=1)
+                return
+            except Queue.Full:
+                pass
+
+    def end(self):
+        self.write('')
+
+    def read(self, size=-1):
+        if self.offset >= len(self.chunk) and not self.eof:
+            self.chunk = self.queue.get()
+            self.offset = 0
+            if not self.chunk:
+                self.eof = True
+
+        end = len(self.chunk) if size < 0 else self.offset + size
+
+        data = self.chunk[self.offset:end]
+        self.offset += len(data)
+
+        return data
+
+
+class DeliveryEncryptor(threading.Thread):
+    """
+    Thread encrypting with the receiver PGP key the data written to its stream
     """
-    return
-        path of encrypted file,
-        length of the encrypted file
+    def __init__(self, rfileinfo):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.receiver = rfileinfo['receiver']
+        self.stream = DeliveryStream()
+        self.path = os.path.join(os.path.abspath(GLSettings.submission_path), "pgp_encrypted-%s" % generateRandomKey(16))
+        self.size = 0
+        self.error = None
+
+    def run(self):
+        try:
+            delivery_keyring.load_key(self.receiver['pgp_key_public'])
+            _, self.size = delivery_keyring.encrypt_file(self.receiver['pgp_key_fingerprint'], self.stream, self.path)
+        except Exception as excep:
+            self.error = excep
+        finally:
+            self.stream.closed = True
 
-    this function is used to encrypt a file for a specific recipient.
-    commonly 'receiver_desc' is expected as second argument;
-    anyhow a simpler dict can be used.
 
-    required keys are checked on top
+def fsops_remove(path):
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError as ose:
+        log.err("Unable to remove %s: %s" % (path, ose.message))
+
+
+def deliver_file(ifile_path, ifile_size, encryptors, plain_path=None):
+    """
+    Read and decrypt the AES file once feeding every chunk to the
+    encryptors and, when a path is specified, to a plaintext file
+
+    @return: a tuple (read_size, read_error)
     """
-    gpoj = GLBPGP()
+    read_size = 0
+    read_error = None
+
+    for encryptor in encryptors:
+        encryptor.start()
 
     try:
-        gpoj.load_key(recipient_pgp['pgp_key_public'])
+        with GLSecureFile(ifile_path) as encrypted_file:
+            plaintext_f = open(plain_path, "wb") if plain_path is not None else None
 
-        filepath = os.path.join(GLSettings.submission_path, fpath)
+            try:
+                while True:
+                    chunk = encrypted_file.read(DELIVERY_CHUNK_SIZE)
+                    if len(chunk) == 0:
+                        break
 
-        with GLSecureFile(filepath) as f:
-            encrypted_file_path = os.path.join(os.path.abspath(GLSettings.submission_path), "pgp_encrypted-%s" % generateRandomKey(16))
-            _, encrypted_file_size = gpoj.encrypt_file(recipient_pgp['pgp_key_fingerprint'], f, encrypted_file_path)
+                    read_size += len(chunk)
 
-    except:
-        raise
+                    for encryptor in encryptors:
+                        encryptor.stream.write(chunk)
 
+                    if plaintext_f is not None:
+                        plaintext_f.write(chunk)
+            finally:
+                if plaintext_f is not None:
+                    plaintext_f.close()
+
+        if read_size != ifile_size:
+            log.err("Integrity error on rfile write for ifile %s; ifile_size(%d), rfile_size(%d)" %
+                    (ifile_path, ifile_size, read_size))
+    except Exception as excep:
+        read_error = excep
+        log.err("Unable to read the submission file %s: %s" % (ifile_path, excep))
     finally:
-        # the finally statement is always called also if
-        # except contains a return or a raise
-        gpoj.destroy_environment()
+        for encryptor in encryptors:
+            encryptor.stream.end()
 
-    return encrypted_file_path, encrypted_file_size
+        for encryptor in encryptors:
+            encryptor.join()
 
+    return read_size, read_error
 
-def process_files(receiverfiles_maps):
+
+def process_file(receiverfiles_map):
     """
-    @param receiverfiles_maps: the mapping of ifile/rfiles to be created on filesystem
-    @return: return None
+    Deliver an InternalFile to all its receivers.
+
+    The AES encrypted file is read and decrypted once for every group of
+    receivers; each chunk is written to the plaintext file, when needed,
+    and fed at the same time to a PGP encryptor for each receiver with
+    a PGP key.
+
+    @param receiverfiles_map: the mapping of the ifile/rfiles to be created on filesystem
+    @return: the amount of bytes processed
     """
-    for ifile_id, receiverfiles_map in receiverfiles_maps.iteritems():
-        ifile_path = receiverfiles_map['ifile_path']
-        ifile_name = os.path.basename(ifile_path).split('.')[0]
-        plain_path = os.path.join(GLSettings.submission_path, "%s.plain" % ifile_name)
-
-        receiverfiles_map['plaintext_file_needed'] = False
-        for rcounter, rfileinfo in enumerate(receiverfiles_map['rfiles']):
-            if len(rfileinfo['receiver']['pgp_key_public']):
-                try:
-                    new_path, new_size = fsops_pgp_encrypt(rfileinfo['path'], rfileinfo['receiver'])
-
-                    log.debug("%d# Switch on Receiver File for %s path %s => %s size %d => %d" %
-                              (rcounter,  rfileinfo['receiver']['name'], rfileinfo['path'],
-                               new_path, rfileinfo['size'], new_size))
-
-                    rfileinfo['path'] = new_path
-                    rfileinfo['size'] = new_size
-                    rfileinfo['status'] = u'encrypted'
-                except Exception as excep:
-                    log.err("%d# Unable to complete PGP encrypt for %s on %s: %s. marking the file as unavailable." % (
-                            rcounter, rfileinfo['receiver']['name'], rfileinfo['path'], excep)
-                    )
-                    rfileinfo['status'] = u'unavailable'
-            elif GLSettings.memory_copy.allow_unencrypted:
-                receiverfiles_map['plaintext_file_needed'] = True
-                rfileinfo['status'] = u'reference'
-                rfileinfo['path'] = plain_path
-            else:
-                rfileinfo['status'] = u'nokey'
-
-        if receiverfiles_map['plaintext_file_needed']:
-            log.debug(":( NOT all receivers support PGP and the system allows plaintext version of files: %s saved as plaintext file %s" %
-                      (ifile_path, plain_path))
+    ifile_path = receiverfiles_map['ifile_path']
+    ifile_name = os.path.basename(ifile_path).split('.')[0]
+    plain_path = os.path.join(GLSettings.submission_path, "%s.plain" % ifile_name)
+
+    encryptors = []
+
+    receiverfiles_map['plaintext_file_needed'] = False
+    for rfileinfo in receiverfiles_map['rfiles']:
+        if len(rfileinfo['receiver']['pgp_key_public']):
+            encryptors.append((rfileinfo, DeliveryEncryptor(rfileinfo)))
+        elif GLSettings.memory_copy.allow_unencrypted:
+            receiverfiles_map['plaintext_file_needed'] = True
+            rfileinfo['status'] = u'reference'
+            rfileinfo['path'] = plain_path
+        else:
+            rfileinfo['status'] = u'nokey'
 
-            try:
-                with open(plain_path, "wb") as plaintext_f, GLSecureFile(ifile_path) as encrypted_file:
-                    chunk_size = 4096
-                    written_size = 0
-                    while True:
-                        chunk = encrypted_file.read(chunk_size)
-                        if len(chunk) == 0:
-                            if written_size != receiverfiles_map['ifile_size']:
-                                log.err("Integrity error on rfile write for ifile %s; ifile_size(%d), rfile_size(%d)" %
-                                        (ifile_id, receiverfiles_map['ifile_size'], written_size))
-                            break
-                        written_size += len(chunk)
-                        plaintext_f.write(chunk)
+    if receiverfiles_map['plaintext_file_needed']:
+        log.debug(":( NOT all receivers support PGP and the system allows plaintext version of files: %s saved as plaintext file %s" %
+                  (ifile_path, plain_path))
+    else:
+        log.debug("All Receivers support PGP or the system denies plaintext version of files: marking internalfile as removed")
+
+    # the encryptors run in groups of at most GLSettings.pgp_encryptors_limit
+    # threads; the file is read once for each group
+    limit = GLSettings.pgp_encryptors_limit
+    groups = [[encryptor for _, encryptor in encryptors[i:i + limit]] for i in range(0, len(encryptors), limit)]
+
+    if receiverfiles_map['plaintext_file_needed'] and not groups:
+        groups = [[]]
+
+    read_size = 0
+    read_error = None
+
+    for i, group in enumerate(groups):
+        plaintext_needed = receiverfiles_map['plaintext_file_needed'] and i == 0
+
+        read_size, error = deliver_file(ifile_path,
+                                        receiverfiles_map['ifile_size'],
+                                        group,
+                                        plain_path if plaintext_needed else None)
+
+        for encryptor in group:
+            if encryptor.error is None:
+                encryptor.error = error
+
+        if plaintext_needed:
+            read_error = error
 
-                receiverfiles_map['ifile_path'] = plain_path
-            except Exception as excep:
-                log.err("Unable to create plaintext file %s: %s" % (plain_path, excep))
+    processed_size = 0
+
+    for rfileinfo, encryptor in encryptors:
+        error = encryptor.error
+        if error is None:
+            log.debug("Switch on Receiver File for %s path %s => %s size %d => %d" %
+                      (rfileinfo['receiver']['name'], rfileinfo['path'],
+                       encryptor.path, rfileinfo['size'], encryptor.size))
+
+            processed_size += read_size
+
+            rfileinfo['path'] = encryptor.path
+            rfileinfo['size'] = encryptor.size
+            rfileinfo['status'] = u'encrypted'
         else:
-            log.debug("All Receivers support PGP or the system denies plaintext version of files: marking internalfile as removed")
+            log.err("Unable to complete PGP encrypt for %s on %s: %s. marking the file as unavailable." % (
+                    rfileinfo['receiver']['name'], rfileinfo['path'], error)
+            )
+            rfileinfo['status'] = u'unavailable'
+            fsops_remove(encryptor.path)
+
+    if receiverfiles_map['plaintext_file_needed']:
+        if read_error is None:
+            processed_size += read_size
+            receiverfiles_map['ifile_path'] = plain_path
+        else:
+            log.err("Unable to create plaintext file %s: %s" % (plain_path, read_error))
+            fsops_remove(plain_path)
 
-        # the original AES file should always be deleted
-        log.debug("Deleting the submission AES encrypted file: %s" % ifile_path)
+    # the original AES file should always be deleted
+    log.debug("Deleting the submission AES encrypted file: %s" % ifile_path)
 
-        # Remove the AES file
-        try:
-            os.remove(ifile_path)
-        except OSError as ose:
-            log.err("Unable to remove %s: %s" % (ifile_path, ose.message))
+    # Remove the AES file
+    fsops_remove(ifile_path)
 
-        # Remove the AES file key
-        try:
-            os.remove(os.path.join(GLSettings.ramdisk_path, ("%s%s" % (GLSettings.AES_keyfile_prefix, ifile_name))))
-        except OSError as ose:
-            log.err("Unable to remove keyfile associated with %s: %s" % (ifile_path, ose.message))
+    # Remove the AES file key
+    fsops_remove(os.path.join(GLSettings.ramdisk_path, ("%s%s" % (GLSettings.AES_keyfile_prefix, ifile_name))))
+
+    return processed_size
+
+
+def process_files_parallel(receiverfiles_maps):
+    """
+    Process the files on the pgp thread pool
+
+    @return: a DeferredList firing with the results of the processing
+    """
+    return defer.DeferredList([deferToThreadPool(reactor,
+                                                 GLSettings.pgp_tp,
+                                                 process_file,
+                                                 receiverfiles_map) for receiverfiles_map in receiverfiles_maps.itervalues()],
+                              consumeErrors=True)
+
+
+def process_files(receiverfiles_maps):
+    """
+    @param receiverfiles_maps: the mapping of ifile/rfiles to be created on filesystem
+    @return: the amount of bytes processed
+    """
+    processed_size = 0
+
+    results = threads.blockingCallFromThread(reactor, process_files_parallel, receiverfiles_maps)
+
+    for success, result in results:
+        if success:
+            processed_size += result
+        else:
+            log.err("Unable to process the submission file: %s" % result.value)
+
+    return processed_size
 
 
 @transact_sync
@@ -228,5 +395,16 @@ class DeliverySchedule(GLJob):
         receiverfiles_maps = receiverfile_planning()
 
         if len(receiverfiles_maps):
-            process_files(receiverfiles_maps)
+            start_time = time.time()
+
+            processed_size = process_files(receiverfiles_maps)
+
+            elapsed_time = max(time.time() - start_time, 0.001)
+
+            # throughput in MB/s of the latest execution that processed files
+            self.stats['throughput'] = processed_size / (1024.0 * 1024.0) / elapsed_time
+
+            log.debug("Delivery processed %d bytes in %.3f seconds (%.2f MB/s)" %
+                      (processed_size, elapsed_time, self.stats['throughput']))
+
             update_internalfile_and_store_receiverfiles(receiverfiles_maps)
@@ -2,22 +2,26 @@
 # Implement the notification of new submissions
 
 import copy
+import time
 
-from twisted.internet import reactor, threads
+from storm.expr import In
+from twisted.internet import defer, reactor, threads
 
 from globaleaks import models
 from globaleaks.handlers.admin.context import admin_serialize_context
 from globaleaks.handlers.admin.node import db_admin_serialize_node
 from globaleaks.handlers.admin.notification import db_get_notification
 from globaleaks.handlers.admin.receiver import admin_serialize_receiver
-from globaleaks.handlers.rtip import serialize_rtip, serialize_message, serialize_comment
+from globaleaks.handlers.rtip import serialize_message, serialize_comment
+from globaleaks.handlers.submission import db_get_archived_questionnaire_schema, \
+    db_serialize_questionnaire_answers, get_submission_sequence_number
 from globaleaks.jobs.base import GLJob
-from globaleaks.orm import transact, transact_sync
+from globaleaks.orm import transact_sync
 from globaleaks.security import GLBPGP
 from globaleaks.settings import GLSettings
 from globaleaks.utils.mailutils import sendmail
 from globaleaks.utils.templating import Templating
-from globaleaks.utils.utility import log
+from globaleaks.utils.utility import log, datetime_to_ISO8601
 
 
 trigger_template_map = {
@@ -53,6 +57,44 @@ class MailGenerator(object):
 
         return self.cache[cache_key]
 
+    def questionnaire_answers_needed(self, store, language):
+        """
+        Check if any of the mail templates makes use of the answers
+        """
+        cache_key = 'answers-' + language
+
+        if cache_key not in self.cache:
+            notification = self.serialize_config(store, 'notification', language)
+
+            self.cache[cache_key] = any('%QuestionnaireAnswers%' in value
+                                        for key, value in notification.iteritems()
+                                        if key.endswith('_mail_template') and isinstance(value, basestring))
+
+        return self.cache[cache_key]
+
+    def serialize_tip(self, store, rtip, language):
+        """
+        Serialize only the tip data used by the notification templates
+        """
+        itip = rtip.internaltip
+
+        ret = {
+            'id': rtip.id,
+            'sequence_number': get_submission_sequence_number(itip),
+            'label': rtip.label,
+            'creation_date': datetime_to_ISO8601(itip.creation_date),
+            'expiration_date': datetime_to_ISO8601(itip.expiration_date),
+            'enable_notifications': bool(rtip.enable_notifications),
+            'questionnaire': [],
+            'answers': {}
+        }
+
+        if self.questionnaire_answers_needed(store, language):
+            ret['questionnaire'] = db_get_archived_questionnaire_schema(store, itip.questionnaire_hash, language)
+            ret['answers'] = db_serialize_questionnaire_answers(store, rtip)
+
+        return ret
+
     def serialize_obj(self, store, key, obj, language):
         obj_id = obj.id
 
@@ -60,7 +102,7 @@ class MailGenerator(object):
 
         if cache_key not in self.cache:
             if key == 'tip':
-                cache_obj = serialize_rtip(store, obj, language)
+                cache_obj = self.serialize_tip(store, obj, language)
             elif key == 'context':
                 cache_obj = admin_serialize_context(store, obj, language)
             elif key == 'receiver':
@@ -189,32 +231,61 @@ class MailGenerator(object):
 
 
     @transact_sync
-    def generate(self, store):
-        for trigger in ['ReceiverTip', 'Comment', 'Message', 'ReceiverFile']:
-            model = trigger_model_map[trigger]
-
-            elements = store.find(model, model.new == True)
-            for element in elements:
-                element.new = False
-
-                if GLSettings.memory_copy.notif.disable_receiver_notification_emails:
+    def process_events(self, store):
+        """
+        Consume a batch of notification events
+
+        @return: the number of events consumed
+        """
+        events = store.find(models.NotificationEvent).order_by(models.NotificationEvent.creation_date)
+        events = [(event.id, event.type, event.object_id) for event in
+                  events[:GLSettings.notification_events_batch_size]]
+
+        if not events:
+            return 0
+
+        if not GLSettings.memory_copy.notif.disable_receiver_notification_emails:
+            for trigger in ['ReceiverTip', 'Comment', 'Message', 'ReceiverFile']:
+                ids = [object_id for _, event_type, object_id in events if event_type == trigger]
+                if not ids:
                     continue
 
-                data = {
-                    'type': trigger_template_map[trigger]
-                }
+                # objects deleted in the meantime are simply not found
+                model = trigger_model_map[trigger]
+                for element in store.find(model, In(model.id, ids)):
+                    data = {
+                        'type': trigger_template_map[trigger]
+                    }
 
-                getattr(self, 'process_%s' % trigger)(store, element, data)
+                    getattr(self, 'process_%s' % trigger)(store, element, data)
 
-            count = elements.count()
-            if count > 0:
                 log.debug("Notification: generated %d notifications of type %s" %
-                          (count, trigger))
+                          (len(ids), trigger))
+
+        store.find(models.NotificationEvent,
+                   In(models.NotificationEvent.id, [event_id for event_id, _, _ in events])).remove()
+
+        return len(events)
+
+    def generate(self):
+        """
+        Consume all the pending notification events, one batch per transaction
 
+        @return: the number of events consumed
+        """
+        count = 0
 
-@transact
-def delete_sent_mail(store, result, mail_id):
-    store.find(models.Mail, models.Mail.id == mail_id).remove()
+        while True:
+            processed = self.process_events()
+            count += processed
+
+            if processed < GLSettings.notification_events_batch_size:
+                return count
+
+
+@transact_sync
+def delete_sent_mails(store, mail_ids):
+    store.find(models.Mail, In(models.Mail.id, mail_ids)).remove()
 
 
 @transact_sync
@@ -243,17 +314,46 @@ class NotificationSchedule(GLJob):
     interval = 5
     monitor_interval = 3 * 60
 
-    def sendmail(self, mail):
-        d = sendmail(mail['address'], mail['subject'], mail['body'])
-        d.addCallback(delete_sent_mail, mail['id'])
+    def sendmail(self, to_address, subject, body):
+        return sendmail(to_address, subject, body)
+
+    def sendmails(self, mails):
+        """
+        Send all the mails at once leaving to the mail dispatcher
+        their distribution over the pool of SMTP sessions
+
+        @return: a deferred firing with the ids of the mails sent
+        """
+        d = defer.DeferredList([defer.maybeDeferred(self.sendmail,
+                                                    mail['address'],
+                                                    mail['subject'],
+                                                    mail['body']) for mail in mails],
+                               consumeErrors=True)
+        d.addCallback(lambda results: [mail['id'] for mail, (success, _) in zip(mails, results) if success])
         return d
 
     def spool_emails(self):
         mails = get_mails_from_the_pool()
-        for mail in mails:
-            threads.blockingCallFromThread(reactor, self.sendmail, mail)
+        if not mails:
+            return
+
+        sent_mail_ids = threads.blockingCallFromThread(reactor, self.sendmails, mails)
+
+        if sent_mail_ids:
+            delete_sent_mails(sent_mail_ids)
+
+        log.debug("Notification: sent %d mails out of %d" % (len(sent_mail_ids), len(mails)))
 
     def operation(self):
-        MailGenerator().generate()
+        start_time = time.time()
+
+        events_count = MailGenerator().generate()
+
+        self.stats['events'] = events_count
+        self.stats['generation_time'] = time.time() - start_time
+
+        if events_count:
+            log.debug("Notification: processed %d events in %.3f seconds" %
+                      (events_count, self.stats['generation_time']))
 
         self.spool_emails()
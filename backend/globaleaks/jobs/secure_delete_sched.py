@@ -0,0 +1,115 @@
+# -*- encoding: utf-8 -*-
+# Implementation of the secure deletion of the files queued with SecureFileDelete.
+#
+# The queue is persistent: the entries are removed only after the files
+# have been wiped so that the work interrupted by a restart is resumed.
+
+import os
+import time
+
+from twisted.internet import defer, reactor, threads
+from twisted.internet.threads import deferToThreadPool
+from storm.expr import Not
+
+from globaleaks import models
+from globaleaks.jobs.base import GLJob
+from globaleaks.orm import transact_sync
+from globaleaks.security import overwrite_and_remove
+from globaleaks.settings import GLSettings
+from globaleaks.utils.utility import log
+
+
+__all__ = ['SecureDeleteSchedule']
+
+
+def secure_delete_file(filepath):
+    """
+    @return: the number of bytes written to wipe the file
+    """
+    if not os.path.isfile(filepath):
+        # the file has been already removed before a restart
+        return 0
+
+    return overwrite_and_remove(filepath)
+
+
+def secure_delete_files_parallel(files_to_delete):
+    """
+    Overwrite and remove the files on the secure delete thread pool
+
+    @return: a DeferredList firing with the bytes written for each file
+    """
+    return defer.DeferredList([deferToThreadPool(reactor,
+                                                 GLSettings.secure_delete_tp,
+                                                 secure_delete_file,
+                                                 file_to_delete) for file_to_delete in files_to_delete],
+                              consumeErrors=True)
+
+
+def db_get_secure_delete_queue_depth(store):
+    return store.find(models.SecureFileDelete).count()
+
+
+@transact_sync
+def claim_files_to_secure_delete(store, limit, exclude=()):
+    """
+    @param exclude: the files whose deletion already failed in this run
+    """
+    files = store.find(models.SecureFileDelete.filepath,
+                       Not(models.SecureFileDelete.filepath.is_in(exclude))).config(distinct=True)
+
+    return list(files[:limit])
+
+
+@transact_sync
+def commit_files_deletion(store, filepaths):
+    store.find(models.SecureFileDelete, models.SecureFileDelete.filepath.is_in(filepaths)).remove()
+
+
+class SecureDeleteSchedule(GLJob):
+    name = "Secure Delete"
+    interval = 10
+    monitor_interval = 5 * 60
+
+    def operation(self):
+        """
+        Wipe the queued files in batches of GLSettings.secure_delete_batch_size
+
+        The files whose deletion fails are kept in the queue and retried
+        at the next run.
+        """
+        start_time = time.time()
+        wiped_files = 0
+        wiped_size = 0
+        failed_files = set()
+
+        while True:
+            files_to_delete = claim_files_to_secure_delete(GLSettings.secure_delete_batch_size, failed_files)
+            if not files_to_delete:
+                break
+
+            results = threads.blockingCallFromThread(reactor, secure_delete_files_parallel, files_to_delete)
+
+            wiped = []
+            for file_to_delete, (success, result) in zip(files_to_delete, results):
+                if success:
+                    wiped.append(file_to_delete)
+                    wiped_size += result
+                else:
+                    failed_files.add(file_to_delete)
+                    log.err("Unable to perform secure delete of file %s: %s" % (file_to_delete, result.value))
+
+            if wiped:
+                commit_files_deletion(wiped)
+
+            wiped_files += len(wiped)
+
+        wipe_time = time.time() - start_time
+
+        self.stats['files'] = wiped_files
+        self.stats['bytes'] = wiped_size
+        self.stats['rate'] = int(wiped_size / wipe_time) if wipe_time else 0
+
+        if wiped_files:
+            log.debug("Secure deleted %d files (%d bytes written in %.2f seconds)" %
+                      (wiped_files, wiped_size, wipe_time))
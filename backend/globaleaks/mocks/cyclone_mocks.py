@@ -3,11 +3,14 @@
 from StringIO import StringIO
 
 from cyclone import httputil
-from cyclone.escape import native_str, utf8
+from cyclone.escape import native_str
 from cyclone.httpserver import HTTPConnection, HTTPRequest, _BadRequestException
 from cyclone.web import RequestHandler
+from twisted.internet import reactor
 
+from globaleaks.handlers.base import GLUploads
 from globaleaks.settings import GLSettings
+from globaleaks.utils.multipart import MultipartError, MultipartStreamParser, get_multipart_boundary
 from globaleaks.utils.utility import log, datetime_now
 
 
@@ -83,7 +86,29 @@ def mock_HTTPConnection_on_headers(self, data):
             if content_length > maximum_request_size:
                 raise _BadRequestException("Request exceeded size limit %d" % maximum_request_size)
 
-            self._contentbuffer = StringIO()
+            content_type = headers.get("Content-Type", "")
+            if method in ("POST", "PATCH", "PUT") and content_type.startswith("multipart/form-data"):
+                # the files uploaded are streamed to disk while they are received
+                boundary = get_multipart_boundary(content_type)
+                if boundary is None:
+                    raise _BadRequestException("Invalid multipart/form-data")
+
+                if not GLUploads.stream_begin(content_length):
+                    log.msg("Upload from %s rejected: too many uploads in progress" % self._remote_ip)
+                    self.transport.write("HTTP/1.1 503 Service Unavailable\r\n"
+                                         "Retry-After: %d\r\n"
+                                         "Content-Length: 0\r\n"
+                                         "Connection: close\r\n\r\n" % GLSettings.upload_retry_after)
+                    self.transport.loseConnection()
+                    return
+
+                self._contentbuffer = MultipartStreamParser(boundary, GLSettings.tmp_upload_path)
+                self._upload_size = content_length
+                self._upload_idle_call = reactor.callLater(GLSettings.upload_idle_timeout,
+                                                           self.transport.loseConnection)
+            else:
+                self._contentbuffer = StringIO()
+
             self.content_length = content_length
             self.setRawMode()
             return
@@ -94,31 +119,107 @@ def mock_HTTPConnection_on_headers(self, data):
         self.transport.loseConnection()
 
 
+def mock_HTTPConnection_rawDataReceived(self, data):
+    """
+    This mock is required to feed the multipart/form-data bodies
+    to the streaming parser as soon as they are received.
+    """
+    if self.content_length is not None:
+        data, rest = data[:self.content_length], data[self.content_length:]
+        self.content_length -= len(data)
+    else:
+        rest = ''
+
+    try:
+        self._contentbuffer.write(data)
+    except MultipartError as e:
+        log.msg("Exception while handling HTTP request from %s: %s" % (self._remote_ip, e))
+        self._contentbuffer.close()
+        self._contentbuffer = None
+        self._end_upload_stream()
+        self.transport.loseConnection()
+        return
+
+    if self._upload_idle_call is not None:
+        self._upload_idle_call.reset(GLSettings.upload_idle_timeout)
+
+    if self.content_length == 0:
+        body = self._contentbuffer
+        self.content_length = self._contentbuffer = None
+
+        if isinstance(body, MultipartStreamParser):
+            self._end_upload_stream()
+            self._on_multipart_request_body(body)
+        else:
+            body.seek(0, 0)
+            self._on_request_body(body.read())
+
+        self.setLineMode(rest)
+
+
 def mock_HTTPConnection_on_request_body(self, data):
     """
     This mock is required to remove all the content parsing
-    but 'multipart/form-data' on all handlers included the
-    internal error handlers of cyclone.
+    on all handlers included the internal error handlers of cyclone;
+    'multipart/form-data' bodies are parsed while they are received.
     """
     self._request.body = data
-    content_type = self._request.headers.get("Content-Type", "")
-    if self._request.method in ("POST", "PATCH", "PUT"):
-        if content_type.startswith("multipart/form-data"):
-            fields = content_type.split(";")
-            for field in fields:
-                k, sep, v, = field.strip().partition("=")
-                if k == "boundary" and v:
-                    httputil.parse_multipart_form_data(
-                        utf8(v), data,
-                        self._request.arguments,
-                        self._request.files)
-                    break
-            else:
-                log.msg("Invalid multipart/form-data")
 
     self.request_callback(self._request)
 
 
+def mock_HTTPConnection_on_multipart_request_body(self, parser):
+    self._request.body = ''
+
+    try:
+        parser.finish()
+    except MultipartError as e:
+        log.msg(e)
+        parser.close()
+    else:
+        self._request.arguments.update(parser.arguments)
+        self._request.files.update(parser.files)
+
+    self.request_callback(self._request)
+
+
+def mock_HTTPConnection_end_upload_stream(self):
+    """
+    Release the resources reserved for the upload streamed by the connection
+    """
+    if self._upload_idle_call is None:
+        return
+
+    if self._upload_idle_call.active():
+        self._upload_idle_call.cancel()
+
+    self._upload_idle_call = None
+
+    GLUploads.stream_end(self._upload_size)
+
+
+HTTPConnection_connectionLost = HTTPConnection.connectionLost
+
+
+def mock_HTTPConnection_connectionLost(self, reason):
+    """
+    This mock is required to release the files of the
+    multipart/form-data bodies received only partially.
+    """
+    if isinstance(self._contentbuffer, MultipartStreamParser):
+        self._contentbuffer.close()
+        self._contentbuffer = None
+        self._end_upload_stream()
+
+    HTTPConnection_connectionLost(self, reason)
+
+
 RequestHandler.set_default_headers = mock_RequestHandler_set_default_headers
 HTTPConnection._on_headers = mock_HTTPConnection_on_headers
 HTTPConnection._on_request_body = mock_HTTPConnection_on_request_body
+HTTPConnection._on_multipart_request_body = mock_HTTPConnection_on_multipart_request_body
+HTTPConnection._end_upload_stream = mock_HTTPConnection_end_upload_stream
+HTTPConnection._upload_idle_call = None
+HTTPConnection._upload_size = 0
+HTTPConnection.rawDataReceived = mock_HTTPConnection_rawDataReceived
+HTTPConnection.connectionLost = mock_HTTPConnection_connectionLost
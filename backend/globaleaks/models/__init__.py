@@ -30,6 +30,16 @@ def forge_obj(store, mock_class, mock_fields):
     return db_forge_obj(store, mock_class, mock_fields)
 
 
+def db_add_notification_event(store, obj):
+    """
+    Record the creation of an object that should be notified
+    """
+    store.add(NotificationEvent({
+        'type': unicode(obj.__class__.__name__),
+        'object_id': obj.id
+    }))
+
+
 class Model(Storm):
     """
     Globaleaks's most basic model.
@@ -445,6 +455,21 @@ class Mail(ModelWithID):
     unicode_keys = ['address', 'subject', 'body']
 
 
+class NotificationEvent(ModelWithID):
+    """
+    This model keeps track of the events to be notified.
+
+    The events are written in the same transaction of the objects that
+    trigger them and are consumed in batches by the notification job.
+    """
+    creation_date = DateTime(default_factory=datetime_now)
+
+    type = Unicode()
+    object_id = Unicode()
+
+    unicode_keys = ['type', 'object_id']
+
+
 class Receiver(ModelWithID):
     """
     This model keeps track of receivers settings.
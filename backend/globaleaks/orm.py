@@ -35,7 +35,10 @@ class SQLite(storm.databases.sqlite.Database):
             raw_connection.execute("PRAGMA synchronous = %s" %
                                    (self._synchronous,))
 
-        if self._journal_mode is not None:
+        # the journal mode is applied only to already initialized databases
+        # because on empty databases it would prevent the setup of auto_vacuum
+        if self._journal_mode is not None and \
+                raw_connection.execute("PRAGMA page_count").fetchone()[0] > 0:
             raw_connection.execute("PRAGMA journal_mode = %s" %
                                    (self._journal_mode,))
 
@@ -55,6 +58,78 @@ def get_store():
     return Store(create_database(GLSettings.db_uri))
 
 
+class StorePool(object):
+    """
+    Pool of long lived stores.
+
+    Each thread keeps its own store that is checked out at the beginning of
+    a transaction and returned at its end; this avoids reopening the database
+    file and reapplying the connection PRAGMAs at every transaction.
+    """
+    def __init__(self):
+        self.local = threading.local()
+        self.generation = 0
+
+    def stamp(self):
+        return (self.generation, GLSettings.db_uri)
+
+    def checkout(self):
+        store = getattr(self.local, 'store', None)
+        self.local.store = None
+
+        if store is not None:
+            if store.gl_stamp == self.stamp():
+                return store
+
+            store.close()
+
+        store = Store(create_database(GLSettings.db_uri))
+        store.gl_stamp = self.stamp()
+
+        return store
+
+    def checkin(self, store, healthy=True):
+        store.reset()
+
+        if not healthy or \
+           store.gl_stamp != self.stamp() or \
+           getattr(self.local, 'store', None) is not None:
+            store.close()
+            return
+
+        self.local.store = store
+
+    @staticmethod
+    def check(store):
+        """
+        Verify that the connection of a store is still usable
+        """
+        try:
+            store.rollback()
+            store.execute("SELECT 1").get_one()
+            store.rollback()
+        except Exception:
+            return False
+
+        return True
+
+    def recycle(self):
+        """
+        Invalidate all the pooled stores (e.g. after a schema migration);
+        stores held by other threads are closed when they are next used.
+        """
+        self.generation += 1
+
+        store = getattr(self.local, 'store', None)
+        self.local.store = None
+
+        if store is not None:
+            store.close()
+
+
+store_pool = StorePool()
+
+
 transact_lock = threading.Lock()
 
 
@@ -91,7 +166,8 @@ class transact(object):
         passing the store to it.
         """
         with transact_lock:
-            store = Store(create_database(GLSettings.db_uri))
+            store = store_pool.checkout()
+            healthy = True
 
             try:
                 if self.instance:
@@ -102,14 +178,47 @@ class transact(object):
                 store.commit()
             except:
                 store.rollback()
+                healthy = store_pool.check(store)
                 raise
             else:
                 return result
             finally:
-                store.reset()
-                store.close()
+                store_pool.checkin(store, healthy)
 
 
 class transact_sync(transact):
     def run(self, function, *args, **kwargs):
         return function(*args, **kwargs)
+
+
+class transact_ro(transact):
+    """
+    Class decorator for managing read only transactions.
+
+    Read only transactions run on a dedicated thread pool and do not acquire
+    the transact_lock; the database is opened in WAL mode so that readers
+    can proceed concurrently with the single writer.
+    """
+    def run(self, function, *args, **kwargs):
+        return deferToThreadPool(reactor,
+                                 GLSettings.orm_tp_ro,
+                                 function,
+                                 *args,
+                                 **kwargs)
+
+    def _wrap(self, function, *args, **kwargs):
+        store = store_pool.checkout()
+        healthy = True
+
+        try:
+            if self.instance:
+                return function(self.instance, store, *args, **kwargs)
+            else:
+                return function(store, *args, **kwargs)
+        except:
+            healthy = store_pool.check(store)
+            raise
+        finally:
+            # changes performed by a read only transaction are always discarded
+            store.rollback()
+            store_pool.checkin(store, healthy)
@@ -129,6 +129,10 @@ spec = [
     (r'/admin/staticfiles/(.+)', admin_staticfiles.StaticFileInstance),
     (r'/admin/overview/tips', admin_overview.Tips),
     (r'/admin/overview/files', admin_overview.Files),
+    (r'/admin/overview/uploads', admin_overview.Uploads),
+    (r'/admin/overview/sessions', admin_overview.Sessions),
+    (r'/admin/overview/secure_delete', admin_overview.SecureDelete),
+    (r'/admin/overview/https_workers', admin_overview.HTTPSWorkers),
     (r'/wizard', wizard.Wizard),
 
     ## Special Files Handlers##
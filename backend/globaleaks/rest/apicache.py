@@ -1,9 +1,68 @@
+import hashlib
+
+from cyclone.escape import json_encode
+from twisted.internet import reactor, threads
 from twisted.internet.defer import inlineCallbacks, returnValue
 
+from globaleaks.settings import GLSettings
+from globaleaks.utils.compression import compress, select_content_encoding
+from globaleaks.utils.utility import log
+
+
+class GLApiCacheEntry(object):
+    """
+    A cached resource kept in the final encoded form served to the clients
+
+    The resource is compressed once with each of the supported content
+    codings; each representation has its own strong ETag.
+
+    The encoding is blocking and it is intended to be run in a thread.
+    """
+    def __init__(self, value):
+        self.body = json_encode(value)
+        self.etag = '"%s"' % hashlib.sha256(self.body).hexdigest()
+
+        self.variants = {None: (self.body, self.etag)}
+        for encoding, body in compress(self.body, fast=True).iteritems():
+            self.variants[encoding] = (body, '"%s-%s"' % (self.etag[1:-1], encoding))
+
+    def get_variant(self, accept_encoding):
+        """
+        @return: a tuple (encoding, body, etag) of the representation
+                 preferred by a client sending such Accept-Encoding
+        """
+        encoding = select_content_encoding(accept_encoding, self.variants)
+
+        return (encoding,) + self.variants[encoding]
+
 
 class GLApiCache(object):
     memory_cache_dict = {}
 
+    # incremented at every invalidation in order to prevent
+    # the caching of values computed before the invalidation
+    version = 0
+
+    # functions used to precompute the resources for all the enabled languages
+    warmup_functions = {}
+    warmup_enabled = False
+    warmup_call = None
+
+    # map each type of object to the list of cached
+    # resources that depend on it and that need to be invalidated
+    # when an object of such type is created, updated or deleted
+    dependencies = {
+        'node': ['public'],
+        'l10n': ['l10n'],
+        'context': ['public'],
+        'questionnaire': ['public', 'questionnaires'],
+        'step': ['public', 'questionnaires'],
+        'field': ['public', 'questionnaires', 'fieldtemplates'],
+        'receiver': ['public'],
+        'user': ['public'],
+        'file': ['public']
+    }
+
     @classmethod
     @inlineCallbacks
     def get(cls, resource_name, language, function, *args, **kwargs):
@@ -11,18 +70,29 @@ class GLApiCache(object):
                 and language in cls.memory_cache_dict[resource_name]:
             returnValue(cls.memory_cache_dict[resource_name][language])
 
+        version = cls.version
+
         value = yield function(*args, **kwargs)
-        if resource_name not in cls.memory_cache_dict:
-            cls.memory_cache_dict[resource_name] = {}
-        cls.memory_cache_dict[resource_name][language] = value
-        returnValue(value)
+
+        entry = yield threads.deferToThread(GLApiCacheEntry, value)
+
+        if version != cls.version:
+            returnValue(entry)
+
+        returnValue(cls.set_entry(resource_name, language, entry))
 
     @classmethod
     def set(cls, resource_name, language, value):
-        if resource_name not in GLApiCache.memory_cache_dict:
+        return cls.set_entry(resource_name, language, GLApiCacheEntry(value))
+
+    @classmethod
+    def set_entry(cls, resource_name, language, entry):
+        if resource_name not in cls.memory_cache_dict:
             cls.memory_cache_dict[resource_name] = {}
 
-        cls.memory_cache_dict[resource_name][language] = value
+        cls.memory_cache_dict[resource_name][language] = entry
+
+        return entry
 
     @classmethod
     def invalidate(cls, resource_name=None):
@@ -30,7 +100,47 @@ class GLApiCache(object):
         When a function has an update, all the languages need to be
         invalidated, because the change is still effective
         """
+        cls.version += 1
+
         if resource_name is None:
             cls.memory_cache_dict = {}
         else:
             cls.memory_cache_dict.pop(resource_name, None)
+
+        cls.schedule_warmup()
+
+    @classmethod
+    def invalidate_dependencies(cls, *object_types):
+        """
+        Invalidate only the resources that depend on the specified
+        types of objects
+        """
+        for object_type in object_types:
+            for resource_name in cls.dependencies[object_type]:
+                cls.invalidate(resource_name)
+
+    @classmethod
+    def register_warmup(cls, resource_name, function):
+        """
+        Register the function used to compute a resource that should be
+        precomputed for every enabled language; the function receives
+        the language as its only argument.
+        """
+        cls.warmup_functions[resource_name] = function
+
+    @classmethod
+    def schedule_warmup(cls):
+        if cls.warmup_enabled and cls.warmup_call is None:
+            cls.warmup_call = reactor.callLater(0, cls.warmup)
+
+    @classmethod
+    @inlineCallbacks
+    def warmup(cls):
+        cls.warmup_call = None
+
+        for resource_name, function in cls.warmup_functions.iteritems():
+            for language in GLSettings.memory_copy.languages_enabled:
+                try:
+                    yield cls.get(resource_name, language, function, language)
+                except Exception as excep:
+                    log.err("Failed cache warm up of %s (%s): %s" % (resource_name, language, excep))
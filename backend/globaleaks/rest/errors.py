@@ -361,7 +361,20 @@ class SubmissionDisabled(GLException):
     status_code = 503  # Service not available
 
 
-# UNUSED ERROR CODE 53, 54, 55, 56, 57 HERE!
+class UploadsLimitReached(GLException):
+    """
+    The node is not accepting new uploads because of too many uploads in progress
+    """
+    reason = "Too many uploads in progress, retry later"
+    error_code = 54
+    status_code = 503  # Service not available
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        self.arguments = [retry_after]
+
+
+# UNUSED ERROR CODE 55, 56, 57 HERE!
 
 
 class FieldIdNotFound(GLException):
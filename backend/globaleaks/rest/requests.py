@@ -469,6 +469,32 @@ CustodianIdentityAccessRequestDesc = {
 
 FilesOverviewDesc = [FileOverviewDesc]
 
+UploadsOverviewDesc = {
+    'active_uploads': int,
+    'active_streams': int,
+    'bytes_in_flight': int
+}
+
+SessionsOverviewDesc = {
+    'sessions': int,
+    'sessions_per_role': dict
+}
+
+SecureDeleteOverviewDesc = {
+    'queue_depth': int
+}
+
+HTTPSWorkersOverviewDesc = {
+    'workers': int,
+    'proxy_requests': int,
+    'proxy_connections': int,
+    'proxy_idle_connections': int,
+    'proxy_connection_reuse_ratio': float,
+    'tls_handshakes': int,
+    'tls_resumed_sessions': int,
+    'tls_session_resumption_ratio': float
+}
+
 StatsDesc = {
     'file_uploaded': int,
     'new_submission': int,
@@ -12,6 +12,8 @@ import os
 import random
 import shutil
 import string
+import struct
+import threading
 import time
 from tempfile import _TemporaryFileWrapper
 
@@ -21,6 +23,8 @@ from cryptography.hazmat.primitives import constant_time, hashes
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from datetime import datetime
 from gnupg import GPG
+from twisted.internet import reactor
+from twisted.internet.threads import deferToThreadPool
 
 from globaleaks.rest import errors
 from globaleaks.settings import GLSettings
@@ -68,64 +72,118 @@ def generateRandomPassword():
     return generateRandomKey(10)
 
 
-def _overwrite(absolutefpath, pattern):
-    filesize = os.path.getsize(absolutefpath)
+# size of the buffers used by the secure deletion
+SECURE_DELETE_BUFFER_SIZE = 1024 * 1024
+
+SECURE_DELETE_ZEROS = '\x00' * SECURE_DELETE_BUFFER_SIZE
+SECURE_DELETE_ONES = '\xff' * SECURE_DELETE_BUFFER_SIZE
+
+
+def _overwrite(fd, filesize, pattern, rate_limit=0):
+    """
+    Overwrite in place the first filesize bytes of the file with the
+    pattern repeated, throttling the writes to rate_limit bytes per second.
+
+    @return: the number of bytes written
+    """
+    start_time = time.time()
     bytecnt = 0
-    with open(absolutefpath, 'w+') as f:
-        f.seek(0)
-        while bytecnt < filesize:
-            f.write(pattern)
-            bytecnt += len(pattern)
 
+    os.lseek(fd, 0, os.SEEK_SET)
+
+    while bytecnt < filesize:
+        bytecnt += os.write(fd, buffer(pattern, 0, min(len(pattern), filesize - bytecnt)))
 
-def overwrite_and_remove(absolutefpath, iterations_number=1):
+        if rate_limit:
+            delay = float(bytecnt) / rate_limit - (time.time() - start_time)
+            if delay > 0:
+                time.sleep(delay)
+
+    # the pass is completed only when the data has reached the disk
+    os.fsync(fd)
+
+    return bytecnt
+
+
+def overwrite_and_remove(absolutefpath, iterations_number=None):
     """
     Overwrite the file with all_zeros, all_ones, random patterns
 
-    Note: At each iteration the original size of the file is altered.
+    The passes use large buffers preallocated or generated with os.urandom
+    and are written in place with os.write followed by an fsync.
+
+    The file is removed only after all the passes have been completed;
+    if the overwrite fails the error is raised and the file is left in
+    place so that its deletion can be retried.
+
+    @return: the number of bytes written
     """
+    if iterations_number is None:
+        iterations_number = GLSettings.secure_delete_iterations
 
     if random.randint(1, 5) == 3:
         iterations_number += 1
 
     log.debug("Starting secure deletion of file %s" % absolutefpath)
 
+    bytecnt = 0
+
+    fd = os.open(absolutefpath, os.O_WRONLY)
     try:
-        # in the following loop, the file is open and closed on purpose, to trigger flush operations
-        all_zeros = "\0\0\0\0" * 1024               # 4kb of zeros
-        all_ones = "FFFFFFFF".decode("hex") * 1024  # 4kb of ones
+        filesize = os.fstat(fd).st_size
 
         for iteration in xrange(iterations_number):
-            OPTIMIZATION_RANDOM_BLOCK = 4096 + random.randint(1, 4096)
-
-            random_pattern = ""
-            for _ in xrange(OPTIMIZATION_RANDOM_BLOCK):
-                random_pattern += str(random.randrange(256))
-
             log.debug("Excecuting rewrite iteration (%d out of %d)" %
                       (iteration, iterations_number))
 
-            _overwrite(absolutefpath, all_zeros)
-            log.debug("Overwritten file %s with all zeros pattern" % absolutefpath)
+            random_pattern = os.urandom(min(filesize, SECURE_DELETE_BUFFER_SIZE))
+
+            for pattern in [SECURE_DELETE_ZEROS, SECURE_DELETE_ONES, random_pattern]:
+                bytecnt += _overwrite(fd, filesize, pattern, GLSettings.secure_delete_rate_limit)
+
+            log.debug("Overwritten file %s with zeros, ones and random patterns" % absolutefpath)
+    finally:
+        os.close(fd)
+
+    os.remove(absolutefpath)
 
-            _overwrite(absolutefpath, all_ones)
-            log.debug("Overwritten file %s with all ones pattern" % absolutefpath)
+    log.debug("Performed deletion of file: %s" % absolutefpath)
+
+    return bytecnt
 
-            _overwrite(absolutefpath, random_pattern)
-            log.debug("Overwritten file %s with random pattern" % absolutefpath)
 
+def overwrite_and_remove_or_unlink(absolutefpath):
+    """
+    Overwrite and remove the file, falling back to its plain removal when
+    the overwrite fails; to be used where the deletion cannot be retried.
+    """
+    try:
+        overwrite_and_remove(absolutefpath)
     except Exception as e:
         log.err("Unable to perform secure overwrite for file %s: %s" %
                 (absolutefpath, e))
 
-    finally:
         try:
             os.remove(absolutefpath)
         except OSError as remove_ose:
             log.err("Unable to perform unlink operation on file %s: %s" %
                     (absolutefpath, remove_ose))
 
-    log.debug("Performed deletion of file: %s" % absolutefpath)
+
+# GLSecureFile format version 1
+#
+# header: magic, version, segment size, nonce prefix
+# segments: AES-GCM ciphertext of segment size bytes of plaintext followed by
+#           the GCM tag; the last segment is shorter and possibly empty.
+#
+# Each segment is encrypted with the nonce prefix followed by the index of the
+# segment and authenticated together with the header and a flag marking the
+# last segment so that segments could not be reordered, removed or truncated.
+GLSF_MAGIC = 'GLSF'
+GLSF_VERSION = 1
+GLSF_HEADER = struct.Struct('>4sBI8s')
+GLSF_SEGMENT_SIZE = 64 * 1024
+GLSF_TAG_SIZE = 16
 
 
 class GLSecureTemporaryFile(_TemporaryFileWrapper):
@@ -133,8 +191,12 @@ class GLSecureTemporaryFile(_TemporaryFileWrapper):
     WARNING!
     You can't use this File object like a normal file object,
     check .read and .write!
+
+    The file is written sequentially; after the first read or seek
+    the file is finalized and allows random access only for reading.
     """
     last_action = 'init'
+    legacy = False
 
     def __init__(self, filedir):
         """
@@ -155,10 +217,19 @@ class GLSecureTemporaryFile(_TemporaryFileWrapper):
         # last argument is 'True' because the file has to be deleted on .close()
         _TemporaryFileWrapper.__init__(self, self.file, self.filepath, True)
 
-    def initialize_cipher(self):
-        self.cipher = Cipher(algorithms.AES(self.key), modes.CTR(self.key_counter_nonce), backend=crypto_backend)
-        self.encryptor = self.cipher.encryptor()
-        self.decryptor = self.cipher.decryptor()
+        self.initialize_cipher(os.urandom(8), GLSF_SEGMENT_SIZE)
+        self.file.write(self.header)
+
+        self.write_buffer = ''
+
+    def initialize_cipher(self, nonce_prefix, segment_size):
+        self.nonce_prefix = nonce_prefix
+        self.segment_size = segment_size
+        self.header = GLSF_HEADER.pack(GLSF_MAGIC, GLSF_VERSION, segment_size, nonce_prefix)
+
+        self.segment_index = 0
+        self.position = 0
+        self.segment = None
 
     def create_key(self):
         """
@@ -175,12 +246,9 @@ class GLSecureTemporaryFile(_TemporaryFileWrapper):
             self.keypath = os.path.join(GLSettings.ramdisk_path, "%s%s" %
                                         (GLSettings.AES_keyfile_prefix, self.key_id))
 
-        self.key_counter_nonce = os.urandom(GLSettings.AES_counter_nonce)
-        self.initialize_cipher()
-
         key_json = {
             'key': base64.b64encode(self.key),
-            'key_counter_nonce': base64.b64encode(self.key_counter_nonce)
+            'version': GLSF_VERSION
         }
 
         log.debug("Key initialization at %s" % self.keypath)
@@ -196,6 +264,22 @@ class GLSecureTemporaryFile(_TemporaryFileWrapper):
         log.debug("Avoid delete on: %s " % self.filepath)
         self.delete = False
 
+    def get_segment_cipher(self, index, final, tag=None):
+        nonce = self.nonce_prefix + struct.pack('>I', index)
+
+        return Cipher(algorithms.AES(self.key), modes.GCM(nonce, tag), backend=crypto_backend), \
+               self.header + ('\x01' if final else '\x00')
+
+    def write_segment(self, data, final):
+        cipher, aad = self.get_segment_cipher(self.segment_index, final)
+        encryptor = cipher.encryptor()
+        encryptor.authenticate_additional_data(aad)
+
+        self.file.write(encryptor.update(data))
+        encryptor.finalize()
+        self.file.write(encryptor.tag)
+        self.segment_index += 1
+
     def write(self, data):
         """
         The last action is kept track because the internal status
@@ -209,53 +293,149 @@ class GLSecureTemporaryFile(_TemporaryFileWrapper):
             if isinstance(data, unicode):
                 data = data.encode('utf-8')
 
-            self.file.write(self.encryptor.update(data))
+            if self.write_buffer:
+                data = self.write_buffer + data
+
+            offset = 0
+            while len(data) - offset >= self.segment_size:
+                self.write_segment(data[offset:offset + self.segment_size], False)
+                offset += self.segment_size
+
+            self.write_buffer = data[offset:]
         except Exception as wer:
             log.err("Unable to write() in GLSecureTemporaryFile: %s" % wer.message)
             raise wer
 
+    def finalize_write(self):
+        if not self.encryptor_finalized:
+            self.encryptor_finalized = True
+            self.write_segment(self.write_buffer, True)
+            self.write_buffer = ''
+            self.file.flush()
+
     def close(self):
         if not self.close_called:
             try:
-                if any(x in self.file.mode for x in 'wa') and not self.encryptor_finalized:
-                    self.encryptor_finalized = True
-                    self.file.write(self.encryptor.finalize())
+                if any(x in self.file.mode for x in 'wa'):
+                    self.finalize_write()
 
             except:
                 pass
 
             finally:
                 if self.delete:
-                    overwrite_and_remove(self.keypath)
+                    overwrite_and_remove_or_unlink(self.keypath)
 
         try:
             _TemporaryFileWrapper.close(self)
         except:
             pass
 
-    def read(self, c=None):
+    def start_reading(self):
         """
-        The first time 'read' is called after a write, seek(0) is performed
+        The first time 'read' or 'seek' are called after a write the file is finalized
         """
-        if self.last_action == 'write':
-            if any(x in self.file.mode for x in 'wa') and not self.encryptor_finalized:
-                self.encryptor_finalized = True
-                self.file.write(self.encryptor.finalize())
+        if self.last_action != 'read':
+            self.finalize_write()
 
-            self.seek(0, 0)  # this is a trick just to misc write and read
-            self.initialize_cipher()
             log.debug("First seek on %s" % self.filepath)
             self.last_action = 'read'
 
-        if c is None:
-            data = self.file.read()
-        else:
-            data = self.file.read(c)
+            if self.legacy:
+                self.initialize_legacy_cipher(0)
+            else:
+                ciphertext_size = os.fstat(self.file.fileno()).st_size - GLSF_HEADER.size
+                stored_segment_size = self.segment_size + GLSF_TAG_SIZE
+
+                self.segments_count = max(1, (ciphertext_size + stored_segment_size - 1) / stored_segment_size)
+                self.size = ciphertext_size - self.segments_count * GLSF_TAG_SIZE
+
+    def read_segment(self, index):
+        if self.segment is not None and self.segment[0] == index:
+            return self.segment[1]
+
+        stored_segment_size = self.segment_size + GLSF_TAG_SIZE
+
+        self.file.seek(GLSF_HEADER.size + index * stored_segment_size)
+        data = self.file.read(stored_segment_size)
+        if len(data) < GLSF_TAG_SIZE:
+            raise Exception("Truncated secure file %s" % self.filepath)
+
+        cipher, aad = self.get_segment_cipher(index, index == self.segments_count - 1, data[-GLSF_TAG_SIZE:])
+        decryptor = cipher.decryptor()
+        decryptor.authenticate_additional_data(aad)
+
+        self.segment = (index, decryptor.update(data[:-GLSF_TAG_SIZE]) + decryptor.finalize())
+
+        return self.segment[1]
+
+    def read(self, c=None):
+        self.start_reading()
+
+        if self.legacy:
+            return self.read_legacy(c)
 
-        if len(data):
-            return self.decryptor.update(data)
+        end = self.size if c is None else min(self.size, self.position + c)
+
+        chunks = []
+        while self.position < end:
+            index, offset = divmod(self.position, self.segment_size)
+            chunk = self.read_segment(index)[offset:offset + end - self.position]
+            chunks.append(chunk)
+            self.position += len(chunk)
+
+        return ''.join(chunks)
+
+    def seek(self, offset, whence=0):
+        self.start_reading()
+
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += self.get_size()
+
+        if self.legacy:
+            self.initialize_legacy_cipher(offset)
         else:
-            return self.decryptor.finalize()
+            self.position = max(0, offset)
+
+    def tell(self):
+        self.start_reading()
+
+        return self.position
+
+    def get_size(self):
+        """
+        @return: the size of the plaintext
+        """
+        self.start_reading()
+
+        if self.legacy:
+            return os.fstat(self.file.fileno()).st_size
+
+        return self.size
+
+    def initialize_legacy_cipher(self, offset):
+        """
+        Files of the previous format are encrypted with AES-CTR with the
+        counter starting at the nonce; the counter is advanced to the block
+        of the offset allowing random access also to them.
+        """
+        block, skip = divmod(max(0, offset), 16)
+        counter = (int(binascii.hexlify(self.key_counter_nonce), 16) + block) % (1 << 128)
+        counter = binascii.unhexlify('%032x' % counter)
+
+        self.decryptor = Cipher(algorithms.AES(self.key), modes.CTR(counter), backend=crypto_backend).decryptor()
+        self.file.seek(block * 16)
+        self.decryptor.update(self.file.read(skip))
+        self.position = max(0, offset)
+
+    def read_legacy(self, c):
+        data = self.file.read() if c is None else self.file.read(c)
+
+        self.position += len(data)
+
+        return self.decryptor.update(data)
 
 
 class GLSecureFile(GLSecureTemporaryFile):
@@ -271,6 +451,9 @@ class GLSecureFile(GLSecureTemporaryFile):
         # last argument is 'False' because the file has not to be deleted on .close()
         _TemporaryFileWrapper.__init__(self, self.file, self.filepath, False)
 
+        # the file is accessed only for reading
+        self.encryptor_finalized = True
+
         self.load_key()
 
     def load_key(self):
@@ -284,14 +467,30 @@ class GLSecureFile(GLSecureTemporaryFile):
                 key_json = json.load(kf)
 
             self.key = base64.b64decode(key_json['key'])
-            self.key_counter_nonce = base64.b64decode(key_json['key_counter_nonce'])
-            self.initialize_cipher()
+
+            if 'key_counter_nonce' in key_json:
+                # file encrypted with the previous AES-CTR format
+                self.legacy = True
+                self.key_counter_nonce = base64.b64decode(key_json['key_counter_nonce'])
+            else:
+                self.load_header()
 
         except Exception as axa:
             # I'm sorry, that file is a dead file!
             log.err("The file %s has been encrypted with a lost/invalid key (%s)" % (self.keypath, axa.message))
             raise axa
 
+    def load_header(self):
+        header = self.file.read(GLSF_HEADER.size)
+        if len(header) != GLSF_HEADER.size:
+            raise Exception("Invalid secure file header")
+
+        magic, version, segment_size, nonce_prefix = GLSF_HEADER.unpack(header)
+        if magic != GLSF_MAGIC or version != GLSF_VERSION or segment_size == 0:
+            raise Exception("Unsupported secure file format")
+
+        self.initialize_cipher(nonce_prefix, segment_size)
+
 
 def directory_traversal_check(trusted_absolute_prefix, untrusted_path):
     """
@@ -327,6 +526,25 @@ def hash_password(password, salt):
 def check_password(guessed_password, salt, password_hash):
     return constant_time.bytes_eq(hash_password(guessed_password, salt), bytes(password_hash))
 
+
+def deferred_hash_password(password, salt):
+    """
+    Compute hash_password on the KDF thread pool; scrypt releases the GIL
+    so that the hashes are computed in parallel and without blocking the
+    database threads.
+
+    @return: a Deferred firing with the hash of the password
+    """
+    return deferToThreadPool(reactor, GLSettings.kdf_tp, hash_password, password, salt)
+
+
+def deferred_check_password(guessed_password, salt, password_hash):
+    """
+    @return: a Deferred firing with the result of check_password computed on the KDF thread pool
+    """
+    return deferToThreadPool(reactor, GLSettings.kdf_tp, check_password, guessed_password, salt, password_hash)
+
+
 def change_password(old_password_hash, old_password, new_password, salt):
     """
     @param old_password_hash: the stored password hash.
@@ -430,6 +648,58 @@ class GLBPGP(object):
             log.err("Unable to clean temporary PGP environment: %s: %s" % (self.gnupg.gnupghome, excep))
 
 
+class GLBPGPKeyring(GLBPGP):
+    """
+    Persistent PGP keyring.
+
+    The keys are imported only the first time they are used and are kept
+    for the following operations; a lock serializes the imports while the
+    encryptions, each one performed by a separate gpg process, can run
+    concurrently.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.gnupg = None
+        self.keys = {}
+
+    def setup(self):
+        gnupghome = os.path.join(GLSettings.pgproot, 'keyring')
+
+        if self.gnupg is not None and \
+           self.gnupg.gnupghome == gnupghome and \
+           os.path.exists(gnupghome):
+            return
+
+        self.keys = {}
+
+        try:
+            if not os.path.exists(gnupghome):
+                os.makedirs(gnupghome, mode=0700)
+
+            self.gnupg = GPG(gnupghome=gnupghome, options=['--trust-model', 'always'])
+            self.gnupg.encoding = "UTF-8"
+        except Exception as excep:
+            self.gnupg = None
+            log.err("Unable to instance PGP keyring: %s" % excep)
+            raise
+
+    def load_key(self, key):
+        with self.lock:
+            self.setup()
+
+            if key not in self.keys:
+                self.keys[key] = GLBPGP.load_key(self, key)
+
+            return self.keys[key]
+
+    def destroy_environment(self):
+        with self.lock:
+            if self.gnupg is not None:
+                GLBPGP.destroy_environment(self)
+                self.gnupg = None
+                self.keys = {}
+
+
 def parse_pgp_key(key):
     """
     Used for parsing a PGP key
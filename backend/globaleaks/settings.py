@@ -7,6 +7,7 @@ import getpass
 import glob
 import grp
 import logging
+import multiprocessing
 import os
 import pwd
 import re
@@ -71,6 +72,28 @@ class GLSettingsClass(object):
         # thread pool size of 1
         self.orm_tp = ThreadPool(1, 1)
 
+        # thread pool used by read only transactions;
+        # thanks to the WAL journal mode readers do not block the single writer.
+        # the readers mostly hold the GIL and more threads than CPUs only
+        # slow down the writer thread
+        self.orm_tp_ro_size = min(4, multiprocessing.cpu_count())
+        self.orm_tp_ro = ThreadPool(1, self.orm_tp_ro_size)
+
+        # thread pool used by the delivery to process many files in parallel
+        self.pgp_tp_size = 4
+        self.pgp_tp = ThreadPool(1, self.pgp_tp_size)
+
+        # PGP encryptor threads run for each file processed by the delivery
+        self.pgp_encryptors_limit = 4
+
+        # thread pool used to overwrite the files to be deleted
+        self.secure_delete_tp_size = 2
+        self.secure_delete_tp = ThreadPool(1, self.secure_delete_tp_size)
+
+        # thread pool used to compute the scrypt hashes of the passwords and the receipts
+        self.kdf_tp_size = multiprocessing.cpu_count()
+        self.kdf_tp = ThreadPool(1, self.kdf_tp_size)
+
         self.bind_address = '0.0.0.0'
 
         # bind_port is the original port the service is bound on - notice bind_ports
@@ -103,6 +126,7 @@ class GLSettingsClass(object):
         self.set_ramdisk_path()
 
         self.authentication_lifetime = 3600
+        self.sessions_per_user_limit = 10
 
         self.jobs = []
         self.jobs_monitor = None
@@ -193,7 +217,6 @@ class GLSettingsClass(object):
 
         self.AES_key_size = 32
         self.AES_key_id_regexp = u'[A-Za-z0-9]{16}'
-        self.AES_counter_nonce = 128 / 8
         self.AES_file_regexp = r'(.*)\.aes'
         self.AES_file_regexp_comp = re.compile(self.AES_file_regexp)
         self.AES_keyfile_prefix = "aeskey-"
@@ -207,12 +230,35 @@ class GLSettingsClass(object):
 
         self.enable_input_length_checks = True
 
+        # number of localized questionnaire schemas kept in memory
+        self.archived_schema_cache_size = 256
+
         self.submission_minimum_delay = 3 # seconds
         self.submission_maximum_ttl = 3600 # 1 hour
 
         self.mail_counters = {}
         self.mail_timeout = 15 # seconds
+        self.mail_sessions_limit = 3 # concurrent SMTP sessions
+        self.mail_session_messages_limit = 100 # mails per SMTP session
+        self.mail_session_idle_timeout = 30 # seconds
+        self.mail_session_retry_delay = 5 # seconds before reconnecting after a failed session
+        self.mail_session_retry_max_delay = 300 # seconds
         self.mail_attempts_limit = 3 # per mail limit
+        self.notification_events_batch_size = 100 # events per transaction
+
+        self.uploads_limit = 100 # concurrent uploads
+        self.uploads_size_limit = 2 * 1024 * 1024 * 1024 # bytes of the uploads in progress
+        self.upload_idle_timeout = 300 # seconds
+        self.upload_retry_after = 30 # seconds
+
+        self.secure_delete_iterations = 1 # each made of a zeros, a ones and a random pass
+        self.secure_delete_rate_limit = 0 # bytes per second per file; 0 means unlimited
+        self.secure_delete_batch_size = 100 # files claimed at once from the queue
+
+        self.https_proxy_pool_size = 8 # idle backend connections kept by each https worker
+        self.https_proxy_pool_timeout = 60 # seconds an idle backend connection is kept open
+        self.https_workers_stats_interval = 10 # seconds between the stats reports of the https workers
+        self.https_tls_session_timeout = 300 # seconds during which a TLS session can be resumed
 
         self.https_socks = []
         self.http_socks = []
@@ -247,6 +293,7 @@ class GLSettingsClass(object):
         self.submission_path = os.path.abspath(os.path.join(self.files_path, 'submission'))
         self.tmp_upload_path = os.path.abspath(os.path.join(self.files_path, 'tmp'))
         self.static_path = os.path.abspath(os.path.join(self.files_path, 'static'))
+        self.client_cache_path = os.path.abspath(os.path.join(self.working_path, 'cache', 'client'))
         self.static_db_source = os.path.abspath(os.path.join(self.root_path, 'globaleaks', 'db'))
         self.torhs_path = os.path.abspath(os.path.join(self.working_path, 'torhs'))
         self.ssl_file_path = os.path.abspath(os.path.join(self.files_path, 'ssl'))
@@ -453,7 +500,9 @@ class GLSettingsClass(object):
                         self.torhs_path,
                         self.log_path,
                         self.ramdisk_path,
-                        self.static_path]:
+                        self.static_path,
+                        os.path.dirname(self.client_cache_path),
+                        self.client_cache_path]:
             self.create_directory(dirpath)
 
     def check_directories(self):
@@ -563,7 +612,7 @@ class GLSettingsClass(object):
 
     @staticmethod
     def make_db_uri(db_file_path):
-        return 'sqlite:' + db_file_path + '?foreign_keys=ON'
+        return 'sqlite:' + db_file_path + '?foreign_keys=ON&journal_mode=WAL'
 
     def start_jobs(self):
         from globaleaks.jobs import jobs_list
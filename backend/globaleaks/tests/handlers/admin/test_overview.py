@@ -46,3 +46,49 @@ class TestFilesOverviewDesc(helpers.TestHandlerWithPopulatedDB):
         self.assertTrue(isinstance(self.responses, list))
         self.assertEqual(len(self.responses), 1)
         self._handler.validate_message(json.dumps(self.responses[0]), requests.FilesOverviewDesc)
+
+
+class TestUploadsOverviewDesc(helpers.TestHandler):
+    _handler = overview.Uploads
+
+    def test_get(self):
+        handler = self.request({}, role='admin')
+        handler.get()
+
+        self.assertEqual(len(self.responses), 1)
+        self._handler.validate_message(json.dumps(self.responses[0]), requests.UploadsOverviewDesc)
+
+
+class TestSessionsOverviewDesc(helpers.TestHandler):
+    _handler = overview.Sessions
+
+    def test_get(self):
+        handler = self.request({}, role='admin')
+        handler.get()
+
+        self.assertEqual(len(self.responses), 1)
+        self._handler.validate_message(json.dumps(self.responses[0]), requests.SessionsOverviewDesc)
+        self.assertEqual(self.responses[0]['sessions_per_role']['admin'], 1)
+
+
+class TestSecureDeleteOverviewDesc(helpers.TestHandler):
+    _handler = overview.SecureDelete
+
+    @inlineCallbacks
+    def test_get(self):
+        handler = self.request({}, role='admin')
+        yield handler.get()
+
+        self.assertEqual(len(self.responses), 1)
+        self._handler.validate_message(json.dumps(self.responses[0]), requests.SecureDeleteOverviewDesc)
+
+
+class TestHTTPSWorkersOverviewDesc(helpers.TestHandler):
+    _handler = overview.HTTPSWorkers
+
+    def test_get(self):
+        handler = self.request({}, role='admin')
+        handler.get()
+
+        self.assertEqual(len(self.responses), 1)
+        self._handler.validate_message(json.dumps(self.responses[0]), requests.HTTPSWorkersOverviewDesc)
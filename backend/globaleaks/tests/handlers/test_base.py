@@ -1,13 +1,24 @@
 # -*- coding: utf-8 -*-
+import gzip
 import json
+import mimetypes
+import os
+import shutil
+from StringIO import StringIO
 
+from cyclone import web
 from cyclone.web import HTTPError, HTTPAuthenticationRequired
+from twisted.internet import defer, protocol, reactor
 from twisted.internet.defer import inlineCallbacks
 
-from globaleaks.handlers.base import GLSession, GLSessions, BaseHandler, BaseStaticFileHandler
-from globaleaks.rest.errors import InvalidInputFormat
+from globaleaks.handlers import base
+from globaleaks.handlers.base import GLSession, GLSessions, GLUploadsFactory, BaseHandler, BaseStaticFileHandler, \
+    parse_range_header
+from globaleaks.rest.errors import InvalidInputFormat, UploadsLimitReached
+from globaleaks.security import GLSecureTemporaryFile
 from globaleaks.settings import GLSettings
 from globaleaks.tests import helpers
+from globaleaks.utils.staticfiles import GLStaticFiles, StaticFilesIndex
 
 FUTURE = 100
 
@@ -179,3 +190,301 @@ class TestBaseStaticFileHandler(helpers.TestHandler):
     def test_get_unexistent(self):
         handler = self.request(kwargs={'path': GLSettings.client_path})
         self.assertRaises(HTTPError, handler.get, 'unexistent')
+
+    def get_static_file(self, path, headers):
+        root_path = os.path.join(GLSettings.working_path, 'client')
+        if os.path.exists(root_path):
+            shutil.rmtree(root_path)
+
+        os.mkdir(root_path)
+        with open(os.path.join(root_path, path), 'w') as f:
+            f.write(self.content)
+
+        index = StaticFilesIndex()
+        index.load(root_path, GLSettings.client_cache_path)
+        self.patch(GLStaticFiles, 'files', index.files)
+
+        self.responses = []
+        handler = self.request(headers=headers, kwargs={'path': root_path})
+        handler.get(path)
+
+        transport = handler.request.connection.transport
+        while transport.producer is not None:
+            transport.producer.resumeProducing()
+
+        return handler, ''.join(self.responses)
+
+    content = 'var a = 1;\n' * 1000
+
+    def test_get_compressed_variant(self):
+        handler, body = self.get_static_file('scripts.js', {'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(handler._headers['Content-Encoding'], 'gzip')
+        self.assertEqual(handler._headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(handler._headers['Content-Type'], mimetypes.guess_type('scripts.js')[0])
+        self.assertEqual(gzip.GzipFile(fileobj=StringIO(body)).read(), self.content)
+
+        handler, body = self.get_static_file('scripts.js', {})
+        self.assertFalse('Content-Encoding' in handler._headers)
+        self.assertFalse('Cache-Control' in handler._headers)
+        self.assertEqual(body, self.content)
+
+    def test_get_immutable(self):
+        handler, body = self.get_static_file('scripts.0123456789abcdef.js', {})
+        self.assertEqual(handler._headers['Cache-Control'], base.IMMUTABLE_CACHE_CONTROL)
+        self.assertFalse('Pragma' in handler._headers)
+        self.assertEqual(body, self.content)
+
+
+class FileHandlerMock(BaseHandler):
+    pass
+
+
+class TestServeFile(helpers.TestHandler):
+    _handler = FileHandlerMock
+
+    content = os.urandom(100000)
+
+    def setUp(self):
+        d = helpers.TestHandler.setUp(self)
+
+        self.filepath = os.path.join(GLSettings.tmp_upload_path, 'file')
+        with open(self.filepath, 'w') as f:
+            f.write(self.content)
+
+        return d
+
+    def download(self, headers):
+        self.responses = []
+
+        handler = self.request(headers=headers)
+        d = handler.force_file_download('file', self.filepath)
+
+        transport = handler.request.connection.transport
+        while transport.producer is not None:
+            transport.producer.resumeProducing()
+
+        completed = []
+        d.addCallback(completed.append)
+
+        return handler, ''.join(self.responses), completed[0]
+
+    def test_parse_range_header(self):
+        self.assertEqual(parse_range_header('bytes=0-9', 100), [(0, 9)])
+        self.assertEqual(parse_range_header('bytes=90-', 100), [(90, 99)])
+        self.assertEqual(parse_range_header('bytes=-10', 100), [(90, 99)])
+        self.assertEqual(parse_range_header('bytes=0-999', 100), [(0, 99)])
+        self.assertEqual(parse_range_header('bytes=0-0,-1', 100), [(0, 0), (99, 99)])
+        self.assertEqual(parse_range_header('bytes=100-', 100), [])
+        self.assertEqual(parse_range_header('bytes=9-0', 100), None)
+        self.assertEqual(parse_range_header('bytes=a-b', 100), None)
+        self.assertEqual(parse_range_header('items=0-9', 100), None)
+        self.assertEqual(parse_range_header('bytes=' + ','.join(['0-0'] * 17), 100), None)
+
+    def test_full_download(self):
+        handler, body, completed = self.download({})
+        self.assertEqual(handler.get_status(), 200)
+        self.assertEqual(handler._headers['Content-Length'], str(len(self.content)))
+        self.assertEqual(body, self.content)
+        self.assertTrue(completed)
+
+    def test_single_range(self):
+        handler, body, completed = self.download({'Range': 'bytes=1000-70000'})
+        self.assertEqual(handler.get_status(), 206)
+        self.assertEqual(handler._headers['Content-Range'], 'bytes 1000-70000/%d' % len(self.content))
+        self.assertEqual(body, self.content[1000:70001])
+        self.assertFalse(completed)
+
+        # the request completing the download is accounted as completed
+        handler, body, completed = self.download({'Range': 'bytes=70001-'})
+        self.assertEqual(body, self.content[70001:])
+        self.assertTrue(completed)
+
+    def test_multiple_ranges(self):
+        handler, body, completed = self.download({'Range': 'bytes=0-9,-10'})
+        self.assertEqual(handler.get_status(), 206)
+
+        boundary = handler._headers['Content-Type'].split('boundary=')[1]
+        self.assertEqual(handler._headers['Content-Length'], str(len(body)))
+        self.assertTrue('Content-Range: bytes 0-9/%d\r\n\r\n%s' % (len(self.content), self.content[:10]) in body)
+        self.assertTrue(body.endswith('%s\r\n--%s--\r\n' % (self.content[-10:], boundary)))
+        self.assertFalse(completed)
+
+    def test_probing_ranges(self):
+        # the ranges including the last byte without resuming the download are not accounted
+        for range_header in ['bytes=-1', 'bytes=%d-%d' % (len(self.content) - 1, len(self.content) - 1)]:
+            handler, body, completed = self.download({'Range': range_header})
+            self.assertEqual(handler.get_status(), 206)
+            self.assertEqual(body, self.content[-1:])
+            self.assertFalse(completed)
+
+    def test_unsatisfiable_range(self):
+        handler, body, completed = self.download({'Range': 'bytes=%d-' % len(self.content)})
+        self.assertEqual(handler.get_status(), 416)
+        self.assertEqual(handler._headers['Content-Range'], 'bytes */%d' % len(self.content))
+        self.assertFalse(completed)
+
+    def test_conditional_requests(self):
+        handler, body, completed = self.download({})
+        etag = handler._headers['Etag']
+
+        handler, body, completed = self.download({'If-None-Match': etag})
+        self.assertEqual(handler.get_status(), 304)
+
+        # ranges are ignored if the file has changed
+        handler, body, completed = self.download({'Range': 'bytes=0-9', 'If-Range': '"changed"'})
+        self.assertEqual(handler.get_status(), 200)
+
+        handler, body, completed = self.download({'Range': 'bytes=0-9', 'If-Range': etag})
+        self.assertEqual(handler.get_status(), 206)
+
+
+def emulated_sendfile(out_fd, in_fd, offset, count):
+    os.lseek(in_fd, offset, os.SEEK_SET)
+    return os.write(out_fd, os.read(in_fd, count))
+
+
+class HTTPClientProtocol(protocol.Protocol):
+    def __init__(self):
+        self.data = []
+        self.deferred = defer.Deferred()
+
+    def dataReceived(self, data):
+        self.data.append(data)
+
+    def connectionLost(self, reason):
+        self.deferred.callback(''.join(self.data))
+
+
+class TestSendfileProducer(helpers.TestGL):
+    # larger than the socket buffers in order to fill them
+    content = os.urandom(8 * 1024 * 1024)
+
+    def setUp(self):
+        d = helpers.TestGL.setUp(self)
+
+        with open(os.path.join(GLSettings.tmp_upload_path, 'file'), 'w') as f:
+            f.write(self.content)
+
+        self.sendfile_calls = 0
+
+        def sendfile(*args):
+            self.sendfile_calls += 1
+            return emulated_sendfile(*args)
+
+        self.patch(base, 'sendfile', sendfile)
+
+        application = web.Application([(r'/(.*)', BaseStaticFileHandler, {'path': GLSettings.tmp_upload_path})])
+        self.port = reactor.listenTCP(0, application, interface='127.0.0.1')
+
+        return d
+
+    @inlineCallbacks
+    def tearDown(self):
+        yield self.port.stopListening()
+        yield helpers.TestGL.tearDown(self)
+
+    @inlineCallbacks
+    def get(self, headers):
+        client = yield protocol.ClientCreator(reactor, HTTPClientProtocol).connectTCP('127.0.0.1', self.port.getHost().port)
+
+        client.transport.write('GET /file HTTP/1.0\r\n%s\r\n' % ''.join('%s: %s\r\n' % h for h in headers.items()))
+
+        response = yield client.deferred
+
+        defer.returnValue(response.split('\r\n\r\n', 1))
+
+    @inlineCallbacks
+    def test_sendfile(self):
+        headers, body = yield self.get({})
+        self.assertTrue(headers.startswith('HTTP/1.0 200'))
+        self.assertEqual(body, self.content)
+        self.assertTrue(self.sendfile_calls > 0)
+
+    @inlineCallbacks
+    def test_sendfile_multiple_ranges(self):
+        headers, body = yield self.get({'Range': 'bytes=0-9,-10'})
+        self.assertTrue(headers.startswith('HTTP/1.0 206'))
+        self.assertTrue('Content-Range: bytes 0-9/%d\r\n\r\n%s\r\n' % (len(self.content), self.content[:10]) in body)
+        self.assertTrue(body.endswith('%s\r\n--' % self.content[-10:] + body.split('\r\n')[1][2:] + '--\r\n'))
+        self.assertEqual(self.sendfile_calls, 2)
+
+
+class TestGLSessions(helpers.TestGL):
+    def test_user_sessions_index(self):
+        sessions = [GLSession('user1', 'receiver', 'enabled') for _ in range(3)]
+        GLSession('user2', 'admin', 'enabled')
+
+        self.assertEqual(GLSessions.get_user_sessions('user1'), sessions)
+        self.assertEqual(GLSessions.get_stats(), {'sessions': 4,
+                                                  'sessions_per_role': {'receiver': 3, 'admin': 1}})
+
+        del GLSessions[sessions[0].id]
+        self.assertEqual(GLSessions.get_user_sessions('user1'), sessions[1:])
+
+        GLSessions.revoke_all_sessions('user1')
+        self.assertEqual(GLSessions.get_user_sessions('user1'), [])
+        self.assertEqual(GLSessions.get_stats(), {'sessions': 1,
+                                                  'sessions_per_role': {'admin': 1}})
+
+        self.test_reactor.advance(GLSettings.authentication_lifetime)
+        self.assertEqual(GLSessions.user_sessions, {})
+        self.assertEqual(GLSessions.get_stats()['sessions'], 0)
+
+    def test_sessions_per_user_limit(self):
+        self.patch(GLSettings, 'sessions_per_user_limit', 2)
+
+        sessions = [GLSession('user', 'receiver', 'enabled') for _ in range(3)]
+
+        self.assertEqual(GLSessions.get_user_sessions('user'), sessions[1:])
+        self.assertTrue(GLSessions.get(sessions[0].id) is None)
+
+
+class TestGLUploads(helpers.TestGL):
+    def get_chunk(self, content):
+        f = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
+        f.write(content)
+        return f
+
+    def test_upload(self):
+        uploads = GLUploadsFactory()
+
+        uploads.append('flow', self.get_chunk('a' * 10), 10)
+        upload = uploads.append('flow', self.get_chunk('b' * 10), 10)
+        self.assertEqual(uploads.get_stats()['bytes_in_flight'], 20)
+
+        self.assertEqual(uploads.complete('flow'), upload)
+        self.assertEqual(uploads.get_stats(), {'active_uploads': 0, 'active_streams': 0, 'bytes_in_flight': 0})
+
+        self.assertEqual(upload.file.read(), 'a' * 10 + 'b' * 10)
+        upload.file.close()
+
+    def test_upload_expiration(self):
+        uploads = GLUploadsFactory()
+
+        upload = uploads.append('flow', self.get_chunk('a'), 1)
+
+        self.test_reactor.advance(GLSettings.upload_idle_timeout - 1)
+        uploads.append('flow', self.get_chunk('b'), 1)
+        self.test_reactor.advance(GLSettings.upload_idle_timeout - 1)
+        self.assertEqual(len(uploads), 1)
+
+        self.test_reactor.advance(1)
+        self.assertEqual(len(uploads), 0)
+        self.assertEqual(uploads.size, 0)
+        self.assertFalse(os.path.exists(upload.file.filepath))
+
+    def test_uploads_limits(self):
+        self.patch(GLSettings, 'uploads_limit', 2)
+        self.patch(GLSettings, 'uploads_size_limit', 100)
+
+        uploads = GLUploadsFactory()
+
+        self.assertTrue(uploads.stream_begin(50))
+        uploads.append('flow1', self.get_chunk('a'), 1)
+        self.assertFalse(uploads.stream_begin(1))
+        self.assertRaises(UploadsLimitReached, uploads.append, 'flow2', self.get_chunk('a'), 1)
+
+        uploads.stream_end(50)
+        self.assertRaises(UploadsLimitReached, uploads.append, 'flow2', self.get_chunk('a'), 100)
+        uploads.append('flow2', self.get_chunk('a'), 1)
+        self.assertEqual(uploads.get_stats(), {'active_uploads': 2, 'active_streams': 0, 'bytes_in_flight': 2})
@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
+import gzip
+import json
+from StringIO import StringIO
+
 from twisted.internet.defer import inlineCallbacks
 
+# handlers imported in order to register their cache warm up functions
+from globaleaks.handlers import l10n, public # pylint: disable=unused-import
 from globaleaks.orm import transact
 from globaleaks.rest.apicache import GLApiCache
+from globaleaks.settings import GLSettings
 from globaleaks.tests import helpers
 
 
@@ -26,25 +33,64 @@ class TestGLApiCache(helpers.TestGL):
         self.assertTrue("passante_di_professione" in GLApiCache.memory_cache_dict)
         self.assertTrue("it" in GLApiCache.memory_cache_dict['passante_di_professione'])
         self.assertTrue("en" in GLApiCache.memory_cache_dict['passante_di_professione'])
-        self.assertEqual(pdp_it, "come una catapulta!")
-        self.assertEqual(pdp_en, "like a catapult!")
+        self.assertEqual(json.loads(pdp_it.body), "come una catapulta!")
+        self.assertEqual(json.loads(pdp_en.body), "like a catapult!")
+        self.assertNotEqual(pdp_it.etag, pdp_en.etag)
+
+    @inlineCallbacks
+    def test_get_variant(self):
+        entry = yield GLApiCache.get("passante_di_professione", "it", self.mario, "come", "una", "catapulta!")
+
+        self.assertEqual(entry.get_variant(None), (None, entry.body, entry.etag))
+
+        encoding, body, etag = entry.get_variant('gzip, deflate')
+        self.assertEqual(encoding, 'gzip')
+        self.assertEqual(gzip.GzipFile(fileobj=StringIO(body)).read(), entry.body)
+        self.assertNotEqual(etag, entry.etag)
 
     @inlineCallbacks
     def test_set(self):
         self.assertTrue("passante_di_professione" not in GLApiCache.memory_cache_dict)
         pdp_it = yield GLApiCache.get("passante_di_professione", "it", self.mario, "come", "una", "catapulta!")
         self.assertTrue("passante_di_professione" in GLApiCache.memory_cache_dict)
-        self.assertTrue(pdp_it == "come una catapulta!")
+        self.assertEqual(json.loads(pdp_it.body), "come una catapulta!")
         yield GLApiCache.set("passante_di_professione", "it", "ma io ho visto tutto!")
         self.assertTrue("passante_di_professione" in GLApiCache.memory_cache_dict)
         pdp_it = yield GLApiCache.get("passante_di_professione", "it", self.mario, "already", "cached")
-        self.assertEqual(pdp_it, "ma io ho visto tutto!")
+        self.assertEqual(json.loads(pdp_it.body), "ma io ho visto tutto!")
 
     @inlineCallbacks
     def test_invalidate(self):
         self.assertTrue("passante_di_professione" not in GLApiCache.memory_cache_dict)
         pdp_it = yield GLApiCache.get("passante_di_professione", "it", self.mario, "come", "una", "catapulta!")
         self.assertTrue("passante_di_professione" in GLApiCache.memory_cache_dict)
-        self.assertEqual(pdp_it, "come una catapulta!")
+        self.assertEqual(json.loads(pdp_it.body), "come una catapulta!")
         yield GLApiCache.invalidate("passante_di_professione")
         self.assertTrue("passante_di_professione" not in GLApiCache.memory_cache_dict)
+
+    def test_invalidate_dependencies(self):
+        GLApiCache.set("public", "en", {})
+        GLApiCache.set("l10n", "en", {})
+
+        GLApiCache.invalidate_dependencies("context")
+
+        self.assertTrue("public" not in GLApiCache.memory_cache_dict)
+        self.assertTrue("l10n" in GLApiCache.memory_cache_dict)
+
+    @inlineCallbacks
+    def test_get_with_concurrent_invalidation(self):
+        def invalidating_function():
+            GLApiCache.invalidate("passante_di_professione")
+            return "come una catapulta!"
+
+        pdp_it = yield GLApiCache.get("passante_di_professione", "it", invalidating_function)
+        self.assertEqual(json.loads(pdp_it.body), "come una catapulta!")
+        self.assertTrue("passante_di_professione" not in GLApiCache.memory_cache_dict)
+
+    @inlineCallbacks
+    def test_warmup(self):
+        yield GLApiCache.warmup()
+
+        for language in GLSettings.memory_copy.languages_enabled:
+            self.assertTrue(language in GLApiCache.memory_cache_dict['public'])
+            self.assertTrue(language in GLApiCache.memory_cache_dict['l10n'])
@@ -25,8 +25,7 @@ class TestExportHandler(helpers.TestHandlerWithPopulatedDB):
     def test_export(self):
         rtips_desc = yield self.get_rtips()
 
-        handler = self.request({}, role='receiver')
-        handler.current_user.user_id = rtips_desc[0]['receiver_id']
+        handler = self.request({}, role='receiver', user_id=rtips_desc[0]['receiver_id'])
 
         # As the handler calls internally the flush() we should
         # mock that function because during tests the flush could not
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
+import gzip
 import json
+from StringIO import StringIO
 
 from twisted.internet.defer import inlineCallbacks
 
@@ -19,3 +21,28 @@ class TestPublicResource(helpers.TestHandlerWithPopulatedDB):
 
         resp_desc = self.ss_serial_desc(config.NodeFactory.public_node, requests.PublicResourcesDesc)
         self._handler.validate_message(json.dumps(self.responses[0]), resp_desc)
+
+    @inlineCallbacks
+    def test_get_not_modified(self):
+        handler = self.request()
+        yield handler.get()
+
+        etag = handler._headers['Etag']
+
+        handler = self.request(headers={'If-None-Match': etag})
+        yield handler.get()
+
+        self.assertEqual(handler.get_status(), 304)
+        self.assertEqual(len(self.responses), 1)
+
+    @inlineCallbacks
+    def test_get_compressed(self):
+        handler = self.request()
+        yield handler.get()
+
+        handler = self.request(headers={'Accept-Encoding': 'gzip, deflate'})
+        yield handler.get()
+
+        self.assertEqual(handler._headers['Content-Encoding'], 'gzip')
+        self.assertEqual(handler._headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(json.loads(gzip.GzipFile(fileobj=StringIO(self.responses[1])).read()), self.responses[0])
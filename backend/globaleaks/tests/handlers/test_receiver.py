@@ -13,6 +13,15 @@ def set_expiration_of_all_rtips_to_unlimited(store):
         rtip.internaltip.expiration_date = datetime_never()
 
 
+@transact
+def get_rtips_counters(store, receiver_id):
+    return {rtip.id: {
+        'file_counter': rtip.internaltip.internalfiles.count(),
+        'comment_counter': rtip.internaltip.comments.count(),
+        'message_counter': rtip.messages.count()
+    } for rtip in store.find(models.ReceiverTip, models.ReceiverTip.receiver_id == receiver_id)}
+
+
 class TestUserInstance(helpers.TestHandlerWithPopulatedDB):
     _handler = receiver.ReceiverInstance
 
@@ -47,6 +56,14 @@ class TestTipsCollection(helpers.TestHandlerWithPopulatedDB):
         handler = self.request(user_id=self.dummyReceiver_1['id'], role='receiver')
         yield handler.get()
 
+        counters = yield get_rtips_counters(self.dummyReceiver_1['id'])
+
+        self.assertEqual(len(self.responses[0]), len(counters))
+
+        for rtip_desc in self.responses[0]:
+            for key, value in counters[rtip_desc['id']].iteritems():
+                self.assertEqual(rtip_desc[key], value)
+
 
 class TestTipsOperations(helpers.TestHandlerWithPopulatedDB):
     _handler = receiver.TipsOperations
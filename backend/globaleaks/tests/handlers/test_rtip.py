@@ -6,6 +6,7 @@ from twisted.internet.defer import inlineCallbacks
 from globaleaks import models
 from globaleaks.handlers import rtip
 from globaleaks.jobs.delivery_sched import DeliverySchedule
+from globaleaks.orm import transact
 from globaleaks.rest import errors
 from globaleaks.settings import GLSettings
 from globaleaks.tests import helpers
@@ -249,6 +250,36 @@ class TestReceiverFileDownload(helpers.TestHandlerWithPopulatedDB):
                 handler = self.request(role='receiver', user_id = rtip_desc['receiver_id'])
                 yield handler.get(rfile_desc['id'])
 
+    @transact
+    def get_rfile_downloads(self, store, rfile_id):
+        return store.find(models.ReceiverFile, models.ReceiverFile.id == rfile_id).one().downloads
+
+    @inlineCallbacks
+    def download_range(self, rtip_desc, rfile_id, range_header):
+        handler = self.request(role='receiver', user_id = rtip_desc['receiver_id'], headers={'Range': range_header})
+        yield handler.get(rfile_id)
+
+        transport = handler.request.connection.transport
+        while transport.producer is not None:
+            transport.producer.resumeProducing()
+
+    @inlineCallbacks
+    def test_get_resumed_download(self):
+        yield self.perform_minimal_submission()
+        yield DeliverySchedule().run()
+
+        rtip_desc = (yield self.get_rtips())[0]
+        rfile_id = (yield self.get_rfiles(rtip_desc['id']))[0]['id']
+
+        yield self.download_range(rtip_desc, rfile_id, 'bytes=0-0')
+        downloads = yield self.get_rfile_downloads(rfile_id)
+        self.assertEqual(downloads, 0)
+
+        # the download is accounted once completed
+        yield self.download_range(rtip_desc, rfile_id, 'bytes=1-')
+        downloads = yield self.get_rfile_downloads(rfile_id)
+        self.assertEqual(downloads, 1)
+
 
 class TestIdentityAccessRequestsCollection(helpers.TestHandlerWithPopulatedDB):
     _handler = rtip.IdentityAccessRequestsCollection
@@ -11,7 +11,7 @@ sys.setdefaultencoding('utf8')
 from globaleaks import db, models, security, event, jobs
 from globaleaks.anomaly import Alarm
 from globaleaks.db.appdata import load_appdata
-from globaleaks.orm import transact
+from globaleaks.orm import transact, store_pool
 from globaleaks.handlers import rtip, wbtip
 from globaleaks.handlers.base import BaseHandler, GLSessions, GLSession, \
     write_upload_encrypted_to_disk
@@ -97,10 +97,16 @@ def init_glsettings_for_unit_tests():
 
     GLSettings.set_ramdisk_path()
 
+    store_pool.recycle()
+
     GLSettings.remove_directories()
     GLSettings.create_directories()
 
     GLSettings.orm_tp = FakeThreadPool()
+    GLSettings.orm_tp_ro = FakeThreadPool()
+    GLSettings.pgp_tp = FakeThreadPool()
+    GLSettings.secure_delete_tp = FakeThreadPool()
+    GLSettings.kdf_tp = FakeThreadPool()
 
     GLSessions.clear()
 
@@ -731,18 +737,28 @@ class TestHandler(TestGLWithPopulatedDB):
                                          connection=connection,
                                          files=fake_files)
 
+        # the handlers streaming files flush the headers on the connection
+        connection._request = request
+
         def mock_write(cls, response=None):
             if response:
+                if isinstance(response, str) and \
+                   cls._headers.get('Content-Type') == 'application/json' and \
+                   'Content-Encoding' not in cls._headers:
+                    # responses precomputed by the GLApiCache are already encoded
+                    response = json.loads(response)
+
                 self.responses.append(response)
 
-        handler_cls.write = mock_write
+        self.patch(handler_cls, 'write', mock_write)
 
         def mock_finish(cls):
             pass
 
-        handler_cls.finish = mock_finish
+        self.patch(handler_cls, 'finish', mock_finish)
 
         handler = handler_cls(application, request, **kwargs)
+        handler._transforms = []
 
         if user_id is None and role is not None:
             if role == 'admin':
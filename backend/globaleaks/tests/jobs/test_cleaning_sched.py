@@ -4,7 +4,7 @@ import os
 from twisted.internet.defer import inlineCallbacks
 
 from globaleaks import models
-from globaleaks.jobs import cleaning_sched
+from globaleaks.jobs import cleaning_sched, secure_delete_sched
 from globaleaks.orm import transact
 from globaleaks.settings import GLSettings
 from globaleaks.tests import helpers
@@ -89,5 +89,8 @@ class TestCleaningSched(helpers.TestGLWithPopulatedDB):
 
         yield cleaning_sched.CleaningSchedule().run()
 
+        # the files are wiped asynchronously by the secure delete job
+        yield secure_delete_sched.SecureDeleteSchedule().run()
+
         # verify cascade deletion when tips expire
         yield self.check0()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+
+from globaleaks import models
+from globaleaks.jobs import delivery_sched
+from globaleaks.orm import transact
+from globaleaks.settings import GLSettings
+from globaleaks.tests import helpers
+
+
+@transact
+def get_receiverfiles_status(store):
+    return set(rfile.status for rfile in store.find(models.ReceiverFile))
+
+
+class TestDeliveryStream(unittest.TestCase):
+    def test_read_write(self):
+        stream = delivery_sched.DeliveryStream()
+
+        chunks = ['a' * 3000, 'b' * 10, 'c' * 2048]
+
+        def producer():
+            for chunk in chunks:
+                stream.write(chunk)
+
+            stream.end()
+
+        t = threading.Thread(target=producer)
+        t.start()
+
+        data = ''
+        while True:
+            x = stream.read(1024)
+            if not x:
+                break
+
+            self.assertTrue(len(x) <= 1024)
+            data += x
+
+        t.join()
+
+        self.assertEqual(data, ''.join(chunks))
+
+    def test_write_after_close(self):
+        stream = delivery_sched.DeliveryStream()
+        stream.closed = True
+
+        # writes to a closed stream are discarded and never block
+        for _ in range(delivery_sched.DELIVERY_STREAM_QUEUE_SIZE * 2):
+            stream.write('x')
+
+        self.assertTrue(stream.queue.empty())
+
+
+class TestDeliverySchedule(helpers.TestGLWithPopulatedDB):
+    encryption_scenario = 'MIXED'
+
+    @inlineCallbacks
+    def test_delivery_schedule(self):
+        yield self.perform_minimal_submission()
+
+        job = delivery_sched.DeliverySchedule()
+
+        yield job.run()
+
+        self.assertTrue(job.stats['throughput'] > 0)
+
+        yield self.test_model_count(models.ReceiverFile, self.population_of_attachments * 2)
+
+
+class TestDeliveryScheduleEncryptorsLimit(helpers.TestGLWithPopulatedDB):
+    encryption_scenario = 'ENCRYPTED'
+
+    @inlineCallbacks
+    def test_delivery_schedule(self):
+        # the file is read once for each receiver
+        self.patch(GLSettings, 'pgp_encryptors_limit', 1)
+
+        yield self.perform_minimal_submission()
+
+        yield delivery_sched.DeliverySchedule().run()
+
+        yield self.test_model_count(models.ReceiverFile, self.population_of_attachments * 2)
+
+        status = yield get_receiverfiles_status()
+        self.assertEqual(status, set([u'encrypted']))
@@ -4,6 +4,7 @@ from globaleaks import models
 from globaleaks.jobs.delivery_sched import DeliverySchedule
 from globaleaks.jobs.notification_sched import NotificationSchedule
 from globaleaks.orm import transact
+from globaleaks.settings import GLSettings
 from globaleaks.tests import helpers
 
 
@@ -17,6 +18,10 @@ class TestNotificationSchedule(helpers.TestGLWithPopulatedDB):
     def get_scheduled_email_count(self, store):
         return store.find(models.Mail).count()
 
+    @transact
+    def get_notification_event_count(self, store):
+        return store.find(models.NotificationEvent).count()
+
     @inlineCallbacks
     def test_notification_schedule_success(self):
         count = yield self.get_scheduled_email_count()
@@ -56,3 +61,30 @@ class TestNotificationSchedule(helpers.TestGLWithPopulatedDB):
 
         count = yield self.get_scheduled_email_count()
         self.assertEqual(count, 0)
+
+    @inlineCallbacks
+    def test_notification_events_batches(self):
+        self.patch(GLSettings, 'notification_events_batch_size', 3)
+
+        yield DeliverySchedule().run()
+
+        events_count = yield self.get_notification_event_count()
+        self.assertTrue(events_count > GLSettings.notification_events_batch_size)
+
+        notification_schedule = NotificationSchedule()
+        notification_schedule.skip_sleep = True
+
+        def sendmail(x, y, z):
+            return fail(True)
+
+        notification_schedule.sendmail = sendmail
+
+        yield notification_schedule.run()
+
+        self.assertEqual(notification_schedule.stats['events'], events_count)
+
+        count = yield self.get_notification_event_count()
+        self.assertEqual(count, 0)
+
+        count = yield self.get_scheduled_email_count()
+        self.assertEqual(count, 40)
@@ -0,0 +1,98 @@
+# -*- encoding: utf-8 -*-
+import os
+import shutil
+import subprocess
+
+from twisted.internet.defer import inlineCallbacks
+
+from globaleaks.db import sync_clean_untracked_files
+from globaleaks.jobs import secure_delete_sched
+from globaleaks.orm import transact
+from globaleaks.settings import GLSettings
+from globaleaks.tests import helpers
+
+
+class TestSecureDeleteSched(helpers.TestGL):
+    @transact
+    def get_queue_depth(self, store):
+        return secure_delete_sched.db_get_secure_delete_queue_depth(store)
+
+    def create_untracked_files(self, count):
+        for i in range(count):
+            with open(os.path.join(GLSettings.submission_path, 'untracked-%d' % i), 'w') as f:
+                f.write(os.urandom(1024))
+
+    @inlineCallbacks
+    def test_secure_delete_untracked_files(self):
+        self.patch(GLSettings, 'secure_delete_batch_size', 3)
+
+        self.create_untracked_files(10)
+
+        # the files are only enqueued at startup
+        sync_clean_untracked_files()
+        sync_clean_untracked_files()
+
+        self.assertEqual(len(os.listdir(GLSettings.submission_path)), 10)
+        queue_depth = yield self.get_queue_depth()
+        self.assertEqual(queue_depth, 10)
+
+        job = secure_delete_sched.SecureDeleteSchedule()
+        yield job.run()
+
+        self.assertEqual(os.listdir(GLSettings.submission_path), [])
+        queue_depth = yield self.get_queue_depth()
+        self.assertEqual(queue_depth, 0)
+
+        self.assertEqual(job.stats['files'], 10)
+        self.assertTrue(job.stats['bytes'] >= 10 * 3 * 1024)
+
+    @inlineCallbacks
+    def test_secure_delete_resumes_missing_files(self):
+        self.create_untracked_files(1)
+
+        sync_clean_untracked_files()
+
+        # a file already removed before a restart is dropped from the queue
+        os.remove(os.path.join(GLSettings.submission_path, 'untracked-0'))
+
+        yield secure_delete_sched.SecureDeleteSchedule().run()
+
+        queue_depth = yield self.get_queue_depth()
+        self.assertEqual(queue_depth, 0)
+
+    @inlineCallbacks
+    def test_secure_delete_keeps_failed_files(self):
+        self.create_untracked_files(2)
+
+        # a running executable cannot be opened for writing (ETXTBSY)
+        busy_path = os.path.join(GLSettings.submission_path, 'busy')
+        shutil.copy('/bin/sleep', busy_path)
+        process = subprocess.Popen([busy_path, '60'])
+
+        def stop_process():
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+        self.addCleanup(stop_process)
+
+        sync_clean_untracked_files()
+
+        job = secure_delete_sched.SecureDeleteSchedule()
+        yield job.run()
+
+        # the file not wiped is kept in the queue to be retried
+        self.assertEqual(os.listdir(GLSettings.submission_path), ['busy'])
+        queue_depth = yield self.get_queue_depth()
+        self.assertEqual(queue_depth, 1)
+        self.assertEqual(job.stats['files'], 2)
+        self.assertEqual(job.stats['bytes'] % (2 * 3 * 1024), 0)
+
+        stop_process()
+
+        yield job.run()
+
+        self.assertEqual(os.listdir(GLSettings.submission_path), [])
+        queue_depth = yield self.get_queue_depth()
+        self.assertEqual(queue_depth, 0)
+        self.assertEqual(job.stats['files'], 1)
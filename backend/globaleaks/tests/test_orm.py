@@ -1,7 +1,7 @@
 from twisted.internet.defer import inlineCallbacks
 
 from globaleaks.models import *
-from globaleaks.orm import get_store
+from globaleaks.orm import get_store, store_pool, transact_ro
 from globaleaks.tests import helpers
 from globaleaks.utils.utility import datetime_null
 
@@ -19,6 +19,7 @@ class TestORM(helpers.TestGL):
         self.assertEqual(store.execute("PRAGMA foreign_keys").get_one()[0], 1)  # ON
         self.assertEqual(store.execute("PRAGMA secure_delete").get_one()[0], 1) # ON
         self.assertEqual(store.execute("PRAGMA auto_vacuum").get_one()[0], 1)   # FULL
+        self.assertEqual(store.execute("PRAGMA journal_mode").get_one()[0], u'wal')
 
     def db_add_receiver(self, store):
         r = self.localization_set(self.dummyReceiver_1, Receiver, 'en')
@@ -48,6 +49,11 @@ class TestORM(helpers.TestGL):
     def _transact_with_success(self, store):
         self.db_add_receiver(store)
 
+    @transact_ro
+    def _transact_ro_with_write(self, store):
+        self.db_add_receiver(store)
+        return store.find(Receiver).count()
+
     @transact
     def _transact_with_exception(self, store):
         self.db_add_receiver(store)
@@ -83,3 +89,39 @@ class TestORM(helpers.TestGL):
             self.assertTrue(getattr(store, 'find'))
 
         yield transaction()
+
+    @inlineCallbacks
+    def test_transact_ro_discards_writes(self):
+        store = get_store()
+        count1 = store.find(Receiver).count()
+
+        count_in_transaction = yield self._transact_ro_with_write()
+        self.assertEqual(count_in_transaction, count1 + 1)
+
+        store = get_store()
+        count2 = store.find(Receiver).count()
+
+        self.assertEqual(count1, count2)
+
+    @inlineCallbacks
+    def test_store_pool_reuse(self):
+        @transact
+        def transaction(store):
+            return store
+
+        store1 = yield transaction()
+        store2 = yield transaction()
+        self.assertIs(store1, store2)
+
+        store_pool.recycle()
+
+        store3 = yield transaction()
+        self.assertIsNot(store1, store3)
+
+    def test_store_pool_check(self):
+        store = store_pool.checkout()
+        self.assertTrue(store_pool.check(store))
+        store_pool.checkin(store)
+
+        store.close()
+        self.assertFalse(store_pool.check(store))
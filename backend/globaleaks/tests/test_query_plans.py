@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Verify that the queries of the main handlers and jobs are served by the
+indexes of the database and never require a full scan of the tables that
+grow with the number of submissions.
+"""
+import re
+import sqlite3
+
+from storm.tracer import install_tracer, remove_tracer
+from twisted.internet.defer import inlineCallbacks, returnValue
+
+from globaleaks.handlers import authentication, receiver, rtip, wbtip
+from globaleaks.jobs.cleaning_sched import CleaningSchedule
+from globaleaks.jobs.delivery_sched import receiverfile_planning
+from globaleaks.settings import GLSettings
+from globaleaks.tests import helpers
+
+# tables whose size grows with the number of submissions
+GROWING_TABLES = frozenset([
+    'comment',
+    'fieldanswer',
+    'fieldanswergroup',
+    'identityaccessrequest',
+    'internalfile',
+    'internaltip',
+    'message',
+    'receiverfile',
+    'receivertip',
+    'securefiledelete',
+    'user',
+    'whistleblowerfile',
+    'whistleblowertip'
+])
+
+FULL_SCAN_REGEXP = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+class StatementsCollector(object):
+    """
+    Storm tracer recording the statements executed with their parameters
+    """
+    def __init__(self):
+        self.statements = []
+
+    def connection_raw_execute(self, connection, raw_cursor, statement, params):
+        if statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            self.statements.append((statement, tuple(connection.to_database(params or ()))))
+
+
+class TestQueryPlans(helpers.TestGLWithPopulatedDB):
+    @inlineCallbacks
+    def setUp(self):
+        yield helpers.TestGLWithPopulatedDB.setUp(self)
+        yield self.perform_full_submission_actions()
+
+    def get_full_scans(self, statements, allowed_tables=()):
+        full_scans = []
+
+        connection = sqlite3.connect(GLSettings.db_file_path)
+        try:
+            for statement, params in statements:
+                for row in connection.execute('EXPLAIN QUERY PLAN ' + statement, params):
+                    match = FULL_SCAN_REGEXP.match(row[-1])
+                    if match and match.group(1) in GROWING_TABLES and \
+                       match.group(1) not in allowed_tables:
+                        full_scans.append('%s: %s' % (row[-1], statement))
+        finally:
+            connection.close()
+
+        return full_scans
+
+    @inlineCallbacks
+    def collect_statements(self, function, *args, **kwargs):
+        collector = StatementsCollector()
+
+        install_tracer(collector)
+        try:
+            yield function(*args, **kwargs)
+        finally:
+            remove_tracer(collector)
+
+        returnValue(collector.statements)
+
+    @inlineCallbacks
+    def assert_no_full_scans(self, function, *args, **kwargs):
+        statements = yield self.collect_statements(function, *args, **kwargs)
+
+        self.assertNotEqual(statements, [])
+        self.assertEqual(self.get_full_scans(statements), [])
+
+    @inlineCallbacks
+    def test_login(self):
+        yield self.assert_no_full_scans(authentication.login,
+                                        unicode(self.dummyReceiverUser_1['username']),
+                                        helpers.VALID_PASSWORD1, False)
+
+    @inlineCallbacks
+    def test_login_whistleblower(self):
+        yield self.assert_no_full_scans(authentication.login_whistleblower,
+                                        self.dummySubmission['receipt'], False)
+
+    @inlineCallbacks
+    def test_receiver_tip_list(self):
+        yield self.assert_no_full_scans(receiver.get_receivertip_list,
+                                        self.dummyReceiver_1['id'], 'en')
+
+    @inlineCallbacks
+    def test_receiver_tip_list_queries(self):
+        # the number of queries does not depend on the number of tips
+        tips_1 = yield receiver.get_receivertip_list(self.dummyReceiver_1['id'], 'en')
+        statements_1 = yield self.collect_statements(receiver.get_receivertip_list,
+                                                     self.dummyReceiver_1['id'], 'en')
+
+        for _ in range(3):
+            yield self.perform_minimal_submission()
+
+        yield self.perform_post_submission_actions()
+
+        tips_2 = yield receiver.get_receivertip_list(self.dummyReceiver_1['id'], 'en')
+        statements_2 = yield self.collect_statements(receiver.get_receivertip_list,
+                                                     self.dummyReceiver_1['id'], 'en')
+
+        self.assertEqual(len(tips_2), len(tips_1) + 3)
+        self.assertNotEqual(statements_1, [])
+        self.assertEqual(len(statements_1), len(statements_2))
+
+    @inlineCallbacks
+    def test_rtip(self):
+        for rtip_desc in self.dummyRTips:
+            yield self.assert_no_full_scans(rtip.get_rtip,
+                                            rtip_desc['receiver_id'], rtip_desc['id'], 'en')
+
+            yield self.assert_no_full_scans(rtip.receiver_get_rfile_list,
+                                            rtip_desc['id'])
+
+    @inlineCallbacks
+    def test_wbtip(self):
+        for wbtip_desc in self.dummyWBTips:
+            yield self.assert_no_full_scans(wbtip.get_wbtip,
+                                            wbtip_desc['id'], 'en')
+
+    @inlineCallbacks
+    def test_cleaning(self):
+        job = CleaningSchedule()
+
+        yield self.assert_no_full_scans(job.clean_expired_wbtips)
+        yield self.assert_no_full_scans(job.clean_expired_itips)
+        yield self.assert_no_full_scans(job.check_for_expiring_submissions)
+
+    @inlineCallbacks
+    def test_delivery(self):
+        # the files to be delivered are selected by the boolean flag new,
+        # which is not worth an index; the scan is done by a background job
+        statements = yield self.collect_statements(receiverfile_planning)
+
+        self.assertNotEqual(statements, [])
+        self.assertEqual(self.get_full_scans(statements, allowed_tables=['internalfile']), [])
@@ -1,14 +1,23 @@
+import base64
 import binascii
+import json
 import os
+import shutil
+import subprocess
 
 import scrypt
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from datetime import datetime
+from twisted.internet.defer import inlineCallbacks
 from twisted.trial import unittest
 
 from globaleaks.rest import errors
 from globaleaks.security import generateRandomSalt, hash_password, check_password, change_password, \
+    deferred_hash_password, deferred_check_password, \
     directory_traversal_check, GLSecureTemporaryFile, GLSecureFile, \
-    GLBPGP
+    GLBPGP, GLBPGPKeyring, overwrite_and_remove, overwrite_and_remove_or_unlink, _overwrite, SECURE_DELETE_BUFFER_SIZE, SECURE_DELETE_ZEROS, \
+    GLSF_HEADER, GLSF_SEGMENT_SIZE, GLSF_TAG_SIZE, crypto_backend, generateRandomKey
 from globaleaks.settings import GLSettings
 from globaleaks.tests import helpers
 
@@ -65,6 +74,21 @@ class TestPasswordManagement(unittest.TestCase):
                           dummy_salt_input)
 
 
+
+class TestKDFThreadPool(helpers.TestGL):
+    @inlineCallbacks
+    def test_deferred_hash_and_check_password(self):
+        salt = generateRandomSalt()
+
+        password_hash = yield deferred_hash_password(helpers.VALID_PASSWORD1, salt)
+        self.assertEqual(password_hash, hash_password(helpers.VALID_PASSWORD1, salt))
+
+        valid = yield deferred_check_password(helpers.VALID_PASSWORD1, salt, password_hash)
+        self.assertTrue(valid)
+
+        valid = yield deferred_check_password(u'invalid', salt, password_hash)
+        self.assertFalse(valid)
+
 class TestFilesystemAccess(helpers.TestGL):
     def test_directory_traversal_failure_on_relative_trusted_path_must_fail(self):
         self.assertRaises(Exception, directory_traversal_check, 'invalid/relative/trusted/path', "valid.txt")
@@ -117,6 +141,66 @@ class TestGLSecureFiles(helpers.TestGL):
         self.assertRaises(IOError, GLSecureFile, a.filepath)
         a.close()
 
+    def write_secure_file(self, content):
+        a = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
+        a.avoid_delete()
+        a.write(content)
+        a.close()
+
+        return a
+
+    def write_legacy_secure_file(self, content):
+        """
+        Write a file in the AES-CTR format used before GLSF_VERSION 1
+        """
+        key, nonce, key_id = os.urandom(32), os.urandom(16), generateRandomKey(16)
+
+        with open(os.path.join(GLSettings.ramdisk_path, GLSettings.AES_keyfile_prefix + key_id), 'w') as kf:
+            json.dump({'key': base64.b64encode(key), 'key_counter_nonce': base64.b64encode(nonce)}, kf)
+
+        filepath = os.path.join(GLSettings.tmp_upload_path, '%s.aes' % key_id)
+        with open(filepath, 'w') as f:
+            encryptor = Cipher(algorithms.AES(key), modes.CTR(nonce), backend=crypto_backend).encryptor()
+            f.write(encryptor.update(content) + encryptor.finalize())
+
+        return filepath
+
+    def test_secure_file_sizes(self):
+        for size in [0, 1, GLSF_SEGMENT_SIZE - 1, GLSF_SEGMENT_SIZE, GLSF_SEGMENT_SIZE + 1, 3 * GLSF_SEGMENT_SIZE]:
+            content = os.urandom(size)
+            b = GLSecureFile(self.write_secure_file(content).filepath)
+            self.assertEqual(b.get_size(), size)
+            self.assertEqual(b.read(), content)
+            self.assertEqual(b.read(), '')
+            b.close()
+
+    def test_secure_file_random_access(self):
+        content = os.urandom(5 * GLSF_SEGMENT_SIZE + 1234)
+
+        for filepath in [self.write_secure_file(content).filepath, self.write_legacy_secure_file(content)]:
+            b = GLSecureFile(filepath)
+
+            for offset in [0, 7, GLSF_SEGMENT_SIZE - 3, 2 * GLSF_SEGMENT_SIZE, len(content) - 10, len(content)]:
+                b.seek(offset)
+                self.assertEqual(b.tell(), offset)
+                self.assertEqual(b.read(GLSF_SEGMENT_SIZE + 5), content[offset:offset + GLSF_SEGMENT_SIZE + 5])
+
+            b.seek(-100, 2)
+            self.assertEqual(b.read(), content[-100:])
+            b.close()
+
+    def test_secure_file_tampering(self):
+        content = os.urandom(2 * GLSF_SEGMENT_SIZE + 1)
+        a = self.write_secure_file(content)
+
+        # removing the last segment must be detected
+        with open(a.filepath, 'r+b') as f:
+            f.truncate(GLSF_HEADER.size + 2 * (GLSF_SEGMENT_SIZE + GLSF_TAG_SIZE))
+
+        b = GLSecureFile(a.filepath)
+        self.assertRaises(InvalidTag, b.read)
+        b.close()
+
 
 class TestPGP(helpers.TestGL):
     secret_content = helpers.PGPKEYS['VALID_PGP_KEY1_PRV']
@@ -173,3 +257,65 @@ class TestPGP(helpers.TestGL):
                          datetime.utcfromtimestamp(1391012793))
 
         pgpobj.destroy_environment()
+
+    def test_keyring(self):
+        keyring = GLBPGPKeyring()
+
+        k1 = keyring.load_key(helpers.PGPKEYS['VALID_PGP_KEY1_PRV'])
+        k2 = keyring.load_key(helpers.PGPKEYS['VALID_PGP_KEY1_PRV'])
+
+        # the key is imported only the first time
+        self.assertTrue(k1 is k2)
+        self.assertEqual(len(keyring.keys), 1)
+
+        encrypted_body = keyring.encrypt_message(k1['fingerprint'], self.secret_content)
+
+        self.assertEqual(str(keyring.gnupg.decrypt(encrypted_body)), self.secret_content)
+
+        keyring.destroy_environment()
+
+        self.assertEqual(len(keyring.keys), 0)
+
+
+class TestSecureDelete(helpers.TestGL):
+    def test_overwrite_and_remove(self):
+        path = os.path.join(GLSettings.submission_path, 'to_delete')
+        with open(path, 'w') as f:
+            f.write('a' * (SECURE_DELETE_BUFFER_SIZE + 1234))
+
+        written = overwrite_and_remove(path, 1)
+
+        self.assertFalse(os.path.exists(path))
+        # each iteration is made of three passes
+        self.assertEqual(written % (3 * (SECURE_DELETE_BUFFER_SIZE + 1234)), 0)
+
+    def test_overwrite_and_remove_failure(self):
+        # a running executable cannot be opened for writing (ETXTBSY)
+        path = os.path.join(GLSettings.submission_path, 'busy')
+        shutil.copy('/bin/sleep', path)
+        process = subprocess.Popen([path, '60'])
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+
+        self.assertRaises(OSError, overwrite_and_remove, path, 1)
+
+        # the file not wiped is not removed so that its deletion can be retried
+        self.assertTrue(os.path.exists(path))
+
+        overwrite_and_remove_or_unlink(path)
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_overwrite_in_place(self):
+        path = os.path.join(GLSettings.submission_path, 'to_overwrite')
+        with open(path, 'w') as f:
+            f.write('a' * 10000)
+
+        fd = os.open(path, os.O_WRONLY)
+        _overwrite(fd, 10000, SECURE_DELETE_ZEROS)
+        os.close(fd)
+
+        with open(path, 'r') as f:
+            self.assertEqual(f.read(), '\0' * 10000)
+
+        os.remove(path)
@@ -0,0 +1,27 @@
+import gzip
+from StringIO import StringIO
+
+from globaleaks.tests import helpers
+from globaleaks.utils.compression import compress, select_content_encoding
+
+
+class TestCompression(helpers.TestGL):
+    def test_compress(self):
+        data = '{"hello": "world"}' * 100
+        variants = compress(data)
+        self.assertEqual(gzip.GzipFile(fileobj=StringIO(variants['gzip'])).read(), data)
+
+        # the output is reproducible
+        self.assertEqual(compress(data)['gzip'], variants['gzip'])
+
+        fast_variants = compress(data, fast=True)
+        self.assertEqual(sorted(fast_variants), sorted(variants))
+        self.assertEqual(gzip.GzipFile(fileobj=StringIO(fast_variants['gzip'])).read(), data)
+
+    def test_select_content_encoding(self):
+        self.assertEqual(select_content_encoding('gzip, deflate, br', ['gzip', 'br']), 'br')
+        self.assertEqual(select_content_encoding('gzip, deflate', ['gzip', 'br']), 'gzip')
+        self.assertEqual(select_content_encoding('gzip;q=0, br;q=0', ['gzip', 'br']), None)
+        self.assertEqual(select_content_encoding('*', ['gzip']), 'gzip')
+        self.assertEqual(select_content_encoding('deflate', ['gzip']), None)
+        self.assertEqual(select_content_encoding(None, ['gzip']), None)
@@ -0,0 +1,238 @@
+import gzip
+import io
+from StringIO import StringIO
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.internet.protocol import Factory, Protocol, connectionDone
+from twisted.web import resource, server, static
+from twisted.web.client import Agent, FileBodyProducer, HTTPConnectionPool, readBody
+from twisted.web.http_headers import Headers
+from twisted.web.test.requesthelper import DummyChannel
+
+from globaleaks.tests import helpers
+from globaleaks.utils.httpsproxy import HTTPStreamFactory, HTTPStreamProxyRequest
+
+
+class ResponseMock(object):
+    def __init__(self, code, headers, body):
+        self.code = code
+        self.headers = Headers(headers)
+        self.length = len(body)
+        self.body = body
+
+    def deliverBody(self, protocol):
+        protocol.dataReceived(self.body)
+        protocol.connectionLost(connectionDone)
+
+
+class TestHTTPStreamProxyRequest(helpers.TestGL):
+    body = '{"hello": "world"}' * 100
+
+    def proxy(self, response, gzip=True):
+        channel = DummyChannel()
+        request = HTTPStreamProxyRequest(channel, False)
+        request.method = 'GET'
+        request.clientproto = 'HTTP/1.1'
+        request.content = io.BytesIO()
+        request.gzip = gzip
+        request.proxySuccess(response)
+
+        return request, channel.transport.written.getvalue().split('\r\n\r\n', 1)[1]
+
+    def test_gzip(self):
+        request, body = self.proxy(ResponseMock(200, {}, self.body))
+        self.assertEqual(request.responseHeaders.getRawHeaders('content-encoding'), ['gzip'])
+        self.assertEqual(request.responseHeaders.getRawHeaders('vary'), ['Accept-Encoding'])
+        self.assertTrue(len(body) < len(self.body))
+
+    def test_pass_through_compressed(self):
+        compressed_body = StringIO()
+        with gzip.GzipFile(fileobj=compressed_body, mode='wb') as f:
+            f.write(self.body)
+
+        compressed_body = compressed_body.getvalue()
+
+        request, body = self.proxy(ResponseMock(200, {'Content-Encoding': ['gzip']}, compressed_body))
+        self.assertEqual(request.responseHeaders.getRawHeaders('content-length'), [str(len(compressed_body))])
+        self.assertEqual(body, compressed_body)
+
+    def test_pass_through_partial_content(self):
+        request, body = self.proxy(ResponseMock(206, {'Content-Range': ['bytes 0-9/100']}, self.body[:10]))
+        self.assertFalse(request.responseHeaders.hasHeader('content-encoding'))
+        self.assertEqual(body, self.body[:10])
+
+
+class UploadResource(resource.Resource):
+    isLeaf = True
+
+    def render_POST(self, request):
+        return str(len(request.content.read()))
+
+
+class TestHTTPStreamFactory(helpers.TestGL):
+    body = 'Hello, world!\n'
+
+    def setUp(self):
+        root = resource.Resource()
+        root.putChild('hello.txt', static.Data(self.body, 'text/plain'))
+        root.putChild('upload', UploadResource())
+
+        self.backend_port = reactor.listenTCP(0, server.Site(root), interface='127.0.0.1')
+
+        proxy_url = 'http://127.0.0.1:%d' % self.backend_port.getHost().port
+        self.proxy_factory = HTTPStreamFactory(proxy_url)
+        self.proxy_port = reactor.listenTCP(0, self.proxy_factory, interface='127.0.0.1')
+
+        return helpers.TestGL.setUp(self)
+
+    @inlineCallbacks
+    def tearDown(self):
+        yield self.proxy_port.stopListening()
+        yield self.backend_port.stopListening()
+        yield self.proxy_factory.pool.closeCachedConnections()
+        helpers.TestGL.tearDown(self)
+
+    @inlineCallbacks
+    def test_backend_connections_reuse(self):
+        # the client agent is not persistent and sends Connection: close
+        agent = Agent(reactor)
+        url = 'http://127.0.0.1:%d/hello.txt' % self.proxy_port.getHost().port
+
+        for _ in range(5):
+            response = yield agent.request('GET', url)
+            body = yield readBody(response)
+            self.assertEqual(body, self.body)
+
+        stats = self.proxy_factory.pool.get_stats()
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['idle_connections'], 1)
+
+    @inlineCallbacks
+    def test_client_connection_reuse_after_upload(self):
+        # the reading of the client is paused while the body is streamed and
+        # it is resumed for the following requests of the connection
+        pool = HTTPConnectionPool(reactor, persistent=True)
+        self.addCleanup(pool.closeCachedConnections)
+
+        agent = Agent(reactor, pool=pool)
+        url = 'http://127.0.0.1:%d/upload' % self.proxy_port.getHost().port
+
+        length = 4 * 1024 * 1024
+        for _ in range(2):
+            producer = FileBodyProducer(StringIO('x' * length))
+            response = yield agent.request('POST', url, bodyProducer=producer)
+            body = yield readBody(response)
+            self.assertEqual(body, str(length))
+
+        self.assertEqual(sum(len(c) for c in pool._connections.values()), 1)
+
+
+class BackendMock(Protocol):
+    """
+    Backend receiving the body of a single request and counting its bytes
+    """
+    length = None
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.head = ''
+
+    def dataReceived(self, data):
+        if self.length is None:
+            self.head += data
+            head, sep, data = self.head.partition('\r\n\r\n')
+            if not sep:
+                return
+
+            headers = dict(line.lower().split(': ', 1) for line in head.split('\r\n')[1:])
+            self.length = int(headers['content-length'])
+
+        self.factory.received += len(data)
+        if self.factory.first_chunk is not None and self.factory.received:
+            self.factory.first_chunk, d = None, self.factory.first_chunk
+            d.callback(None)
+
+        if self.factory.received == self.length:
+            body = str(self.length)
+            self.transport.write('HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body))
+
+
+class BackendMockFactory(Factory):
+    received = 0
+
+    def __init__(self):
+        self.first_chunk = Deferred()
+
+    def buildProtocol(self, addr):
+        return BackendMock(self)
+
+
+class SlowBodyProducer(object):
+    """
+    Body producer sending the second half of the body only after
+    that the backend has received the first one
+    """
+    def __init__(self, first_chunk, chunk):
+        self.first_chunk = first_chunk
+        self.chunk = chunk
+        self.length = 2 * len(chunk)
+
+    @inlineCallbacks
+    def startProducing(self, consumer):
+        consumer.write(self.chunk)
+        yield self.first_chunk
+        consumer.write(self.chunk)
+
+    def pauseProducing(self):
+        pass
+
+    def resumeProducing(self):
+        pass
+
+    def stopProducing(self):
+        pass
+
+
+class TestBodyStreaming(helpers.TestGL):
+    def setUp(self):
+        self.backend_factory = BackendMockFactory()
+        self.backend_port = reactor.listenTCP(0, self.backend_factory, interface='127.0.0.1')
+
+        proxy_url = 'http://127.0.0.1:%d' % self.backend_port.getHost().port
+        self.proxy_factory = HTTPStreamFactory(proxy_url)
+        self.proxy_port = reactor.listenTCP(0, self.proxy_factory, interface='127.0.0.1')
+        self.url = 'http://127.0.0.1:%d/upload' % self.proxy_port.getHost().port
+
+        return helpers.TestGL.setUp(self)
+
+    @inlineCallbacks
+    def tearDown(self):
+        yield self.proxy_port.stopListening()
+        yield self.backend_port.stopListening()
+        yield self.proxy_factory.pool.closeCachedConnections()
+        helpers.TestGL.tearDown(self)
+
+    @inlineCallbacks
+    def test_body_is_streamed(self):
+        # the client waits for the backend to receive the first half of the
+        # body before sending the rest; a buffering proxy would never respond
+        producer = SlowBodyProducer(self.backend_factory.first_chunk, 'x' * 65536)
+
+        response = yield Agent(reactor).request('POST', self.url, bodyProducer=producer)
+        body = yield readBody(response)
+
+        self.assertEqual(response.code, 200)
+        self.assertEqual(body, str(producer.length))
+
+    @inlineCallbacks
+    def test_large_body(self):
+        length = 32 * 1024 * 1024
+        producer = FileBodyProducer(StringIO('x' * length), readSize=256 * 1024)
+
+        response = yield Agent(reactor).request('POST', self.url, bodyProducer=producer)
+        body = yield readBody(response)
+
+        self.assertEqual(body, str(length))
+        self.assertEqual(self.backend_factory.received, length)
@@ -0,0 +1,39 @@
+from twisted.trial import unittest
+
+from globaleaks.utils.lrucache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_size_limit(self):
+        size_limit = 666
+
+        xxx = LRUCache(size_limit)
+
+        for x in range(1, size_limit * 2):
+            xxx.set(x, x)
+            self.assertEqual(len(xxx), min(x, size_limit))
+
+        self.assertEqual(xxx.get(size_limit - 1), None)
+        self.assertEqual(xxx.get(size_limit), size_limit)
+
+    def test_least_recently_used_is_discarded(self):
+        xxx = LRUCache(2)
+
+        xxx.set(1, 1)
+        xxx.set(2, 2)
+        xxx.get(1)
+        xxx.set(3, 3)
+
+        self.assertEqual(xxx.get(1), 1)
+        self.assertEqual(xxx.get(2), None)
+        self.assertEqual(xxx.get(3), 3)
+
+    def test_counters(self):
+        xxx = LRUCache(2)
+
+        xxx.set(1, 1)
+        xxx.get(1)
+        xxx.get(2)
+
+        self.assertEqual(xxx.hits, 1)
+        self.assertEqual(xxx.misses, 1)
@@ -0,0 +1,154 @@
+from StringIO import StringIO
+
+from twisted.internet.error import ConnectionLost
+from twisted.python.failure import Failure
+from twisted.test.proto_helpers import StringTransport
+
+from globaleaks.settings import GLSettings
+from globaleaks.tests import helpers
+from globaleaks.utils.mailutils import GLESMTPSenderFactory, GLMail, MailDispatcher
+
+
+class MailDispatcherMock(MailDispatcher):
+    """
+    Dispatcher connecting its sessions to string transports
+    """
+    def __init__(self):
+        MailDispatcher.__init__(self)
+        self.opened_sessions = []
+
+    def connect(self, key):
+        session = GLESMTPSenderFactory(self, key, None).buildProtocol(None)
+        session.requireTransportSecurity = False
+
+        self.connecting += 1
+        self.opened_sessions.append(session)
+
+        session.makeConnection(StringTransport())
+
+
+class TestMailDispatcher(helpers.TestGL):
+    def setUp(self):
+        self.mail_sessions_limit = GLSettings.mail_sessions_limit
+        GLSettings.mail_sessions_limit = 1
+
+        self.dispatcher = MailDispatcherMock()
+
+        return helpers.TestGL.setUp(self)
+
+    def tearDown(self):
+        GLSettings.mail_sessions_limit = self.mail_sessions_limit
+
+        if self.dispatcher.retry_call is not None:
+            self.dispatcher.retry_call.cancel()
+
+        for session in self.dispatcher.opened_sessions:
+            session.setTimeout(None)
+            if session.idle_call is not None:
+                session.idle_call.cancel()
+
+        return helpers.TestGL.tearDown(self)
+
+    def dispatch(self):
+        mail = GLMail('receiver@example.net', StringIO('Subject: test\n\nHello, world!\n'))
+        self.dispatcher.dispatch(mail)
+        return mail
+
+    def reply(self, session, *lines):
+        session.transport.clear()
+        session.dataReceived(''.join(line + '\r\n' for line in lines))
+        return session.transport.value()
+
+    def authenticate(self, session):
+        self.reply(session, '220 localhost ESMTP')
+        self.reply(session, '250-localhost', '250 AUTH PLAIN')
+        return self.reply(session, '235 Authentication succeeded')
+
+    def deliver(self, session):
+        self.reply(session, '250 Sender OK')
+        self.reply(session, '250 Recipient OK')
+        self.reply(session, '354 Continue')
+
+        # the message is written by a producer pulled by the transport
+        while session.transport.producer is not None:
+            session.transport.producer.resumeProducing()
+
+        self.assertTrue(session.transport.value().endswith('Hello, world!\r\n.\r\n'))
+
+        self.reply(session, '250 Delivered')
+        return self.reply(session, '250 Reset')
+
+    def test_idle_session_reuse(self):
+        mail = self.dispatch()
+        session = self.dispatcher.opened_sessions[0]
+
+        self.assertTrue(self.authenticate(session).startswith('MAIL FROM'))
+        self.deliver(session)
+        self.assertTrue(mail.deferred.called)
+
+        # the session is kept idle waiting for new mails
+        self.assertEqual(self.dispatcher.idle, [session])
+
+        mail = self.dispatch()
+        self.assertEqual(len(self.dispatcher.opened_sessions), 1)
+        self.assertTrue(session.transport.value().startswith('MAIL FROM'))
+        self.deliver(session)
+        self.assertTrue(mail.deferred.called)
+        self.assertEqual(session.processed, 2)
+
+        session.quit()
+        session.connectionLost(Failure(ConnectionLost()))
+        self.assertEqual(self.dispatcher.sessions, set())
+        self.assertIsNone(self.dispatcher.retry_call)
+
+    def test_failure_before_ready(self):
+        mail = self.dispatch()
+        session = self.dispatcher.opened_sessions[0]
+
+        session.connectionLost(Failure(ConnectionLost()))
+
+        # the queued mails are failed and no session is reopened immediately
+        self.assertFailure(mail.deferred, ConnectionLost)
+        self.assertEqual(self.dispatcher.connecting, 0)
+        self.assertIsNotNone(self.dispatcher.retry_call)
+
+        mail = self.dispatch()
+        self.assertEqual(len(self.dispatcher.opened_sessions), 1)
+
+        self.dispatcher.retry_call.cancel()
+        self.dispatcher.retry_expired()
+        self.assertEqual(len(self.dispatcher.opened_sessions), 2)
+
+        session = self.dispatcher.opened_sessions[1]
+        self.authenticate(session)
+        self.deliver(session)
+        self.assertTrue(mail.deferred.called)
+
+    def test_failure_mid_mail(self):
+        mails = [self.dispatch() for _ in range(3)]
+        session = self.dispatcher.opened_sessions[0]
+
+        self.authenticate(session)
+        self.deliver(session)
+        self.assertTrue(mails[0].deferred.called)
+
+        self.reply(session, '250 Sender OK')
+        session.connectionLost(Failure(ConnectionLost()))
+
+        # only the mail in delivery is failed, the others are retried later
+        self.assertFailure(mails[1].deferred, ConnectionLost)
+        self.assertFalse(mails[2].deferred.called)
+        self.assertEqual(list(self.dispatcher.queue), [mails[2]])
+        self.assertIsNotNone(self.dispatcher.retry_call)
+        self.assertEqual(len(self.dispatcher.opened_sessions), 1)
+
+        self.dispatcher.retry_call.cancel()
+        self.dispatcher.retry_expired()
+        self.assertEqual(len(self.dispatcher.opened_sessions), 2)
+
+        session = self.dispatcher.opened_sessions[1]
+        self.authenticate(session)
+        self.deliver(session)
+        self.assertTrue(mails[2].deferred.called)
+
+        return mails[1].deferred
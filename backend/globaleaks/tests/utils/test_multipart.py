@@ -0,0 +1,134 @@
+import os
+
+from cyclone import httpserver
+from twisted.test import proto_helpers
+
+import globaleaks.mocks.cyclone_mocks
+from globaleaks.handlers.base import GLUploads
+from globaleaks.settings import GLSettings
+from globaleaks.tests import helpers
+from globaleaks.utils.multipart import MultipartError, MultipartStreamParser, get_multipart_boundary, \
+    MULTIPART_HEADERS_MAX_SIZE
+
+BOUNDARY = '----GlobaLeaksBoundary'
+
+FILE_CONTENT = os.urandom(256 * 1024)
+
+
+def build_body(fields, files):
+    body = ''
+
+    for name, value in fields:
+        body += '--%s\r\n' % BOUNDARY
+        body += 'Content-Disposition: form-data; name="%s"\r\n\r\n' % name
+        body += value + '\r\n'
+
+    for name, filename, content in files:
+        body += '--%s\r\n' % BOUNDARY
+        body += 'Content-Disposition: form-data; name="%s"; filename="%s"\r\n' % (name, filename)
+        body += 'Content-Type: application/octet-stream\r\n\r\n'
+        body += content + '\r\n'
+
+    return body + '--%s--\r\n' % BOUNDARY
+
+
+class TestMultipartStreamParser(helpers.TestGL):
+    body = build_body([('flowChunkNumber', '1'), ('flowIdentifier', '1234')],
+                      [('file', 'evidence.bin', FILE_CONTENT)])
+
+    def parse(self, body, piece_size):
+        parser = MultipartStreamParser(BOUNDARY, GLSettings.tmp_upload_path)
+
+        max_buffer_size = 0
+        for i in range(0, len(body), piece_size):
+            parser.write(body[i:i + piece_size])
+            max_buffer_size = max(max_buffer_size, len(parser.buffer))
+
+        parser.finish()
+
+        # the data buffered is bounded by the size of the pieces received
+        self.assertTrue(max_buffer_size <= piece_size + MULTIPART_HEADERS_MAX_SIZE)
+
+        return parser
+
+    def test_parse(self):
+        for piece_size in [1, 7, 4096, len(self.body)]:
+            parser = self.parse(self.body, piece_size)
+
+            self.assertEqual(parser.arguments, {'flowChunkNumber': ['1'], 'flowIdentifier': ['1234']})
+
+            f = parser.files['file'][0]
+            self.assertEqual(f['filename'], 'evidence.bin')
+            self.assertEqual(f['content_type'], 'application/octet-stream')
+            self.assertEqual(f['size'], len(FILE_CONTENT))
+            self.assertEqual(f['body'].read(), FILE_CONTENT)
+
+            parser.close()
+            self.assertFalse(os.path.exists(f['body'].filepath))
+
+    def test_get_multipart_boundary(self):
+        self.assertEqual(get_multipart_boundary('multipart/form-data; boundary=%s' % BOUNDARY), BOUNDARY)
+        self.assertEqual(get_multipart_boundary('multipart/form-data; boundary="%s"' % BOUNDARY), BOUNDARY)
+        self.assertEqual(get_multipart_boundary('multipart/form-data'), None)
+
+    def test_missing_final_boundary(self):
+        parser = MultipartStreamParser(BOUNDARY, GLSettings.tmp_upload_path)
+        parser.write(self.body[:-10])
+        self.assertRaises(MultipartError, parser.finish)
+        parser.close()
+
+    def test_too_many_files(self):
+        body = build_body([], [('file', 'a', 'a'), ('file', 'b', 'b')])
+        parser = MultipartStreamParser(BOUNDARY, GLSettings.tmp_upload_path)
+        self.assertRaises(MultipartError, parser.write, body)
+        parser.close()
+
+
+class RequestsCollector(object):
+    settings = {}
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+
+
+class TestHTTPConnection(helpers.TestGL):
+    body = build_body([('flowIdentifier', '1234')], [('file', 'evidence.bin', FILE_CONTENT)])
+
+    def get_connection(self):
+        connection = httpserver.HTTPConnection()
+        connection.factory = RequestsCollector()
+        connection.makeConnection(proto_helpers.StringTransport())
+
+        connection.dataReceived('POST /wbtip/upload HTTP/1.1\r\n'
+                                'Content-Type: multipart/form-data; boundary=%s\r\n'
+                                'Content-Length: %d\r\n\r\n' % (BOUNDARY, len(self.body)))
+
+        return connection
+
+    def test_multipart_upload(self):
+        body = self.body
+
+        connection = self.get_connection()
+
+        for i in range(0, len(body), 4096):
+            connection.dataReceived(body[i:i + 4096])
+
+        requests = connection.factory.requests
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(requests[0].body, '')
+        self.assertEqual(requests[0].arguments['flowIdentifier'], ['1234'])
+        self.assertEqual(requests[0].files['file'][0]['body'].read(), FILE_CONTENT)
+
+        self.assertEqual(GLUploads.streams, 0)
+
+    def test_multipart_upload_rejected(self):
+        self.patch(GLSettings, 'uploads_limit', 0)
+
+        connection = self.get_connection()
+
+        self.assertTrue(connection.transport.value().startswith('HTTP/1.1 503'))
+        self.assertTrue('Retry-After: %d' % GLSettings.upload_retry_after in connection.transport.value())
+        self.assertEqual(connection.factory.requests, [])
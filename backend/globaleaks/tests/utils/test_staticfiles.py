@@ -0,0 +1,59 @@
+import gzip
+import os
+import shutil
+from StringIO import StringIO
+
+from globaleaks.settings import GLSettings
+from globaleaks.tests import helpers
+from globaleaks.utils.staticfiles import StaticFilesIndex
+
+
+class TestStaticFilesIndex(helpers.TestGL):
+    content = 'var a = 1;\n' * 1000
+
+    def setUp(self):
+        d = helpers.TestGL.setUp(self)
+
+        self.root_path = os.path.abspath(os.path.join(GLSettings.working_path, 'client'))
+        if os.path.exists(self.root_path):
+            shutil.rmtree(self.root_path)
+
+        os.mkdir(self.root_path)
+
+        for filename, content in [('scripts.js', self.content),
+                                  ('scripts.0123456789abcdef.js', self.content),
+                                  ('small.js', 'var a = 1;\n'),
+                                  ('image.png', self.content)]:
+            with open(os.path.join(self.root_path, filename), 'wb') as f:
+                f.write(content)
+
+        return d
+
+    def test_load(self):
+        index = StaticFilesIndex()
+        index.load(self.root_path, GLSettings.client_cache_path)
+
+        staticfile = index.get(os.path.join(self.root_path, 'scripts.js'))
+        self.assertFalse(staticfile.immutable)
+        self.assertTrue('gzip' in staticfile.variants)
+
+        variant = staticfile.get_variant('gzip')
+        self.assertEqual(variant.encoding, 'gzip')
+        self.assertNotEqual(variant.etag, staticfile.get_variant('').etag)
+        self.assertEqual(gzip.GzipFile(fileobj=StringIO(open(variant.path, 'rb').read())).read(), self.content)
+
+        staticfile = index.get(os.path.join(self.root_path, 'scripts.0123456789abcdef.js'))
+        self.assertTrue(staticfile.immutable)
+
+        # the variants are shared by the files with the same content
+        self.assertEqual(staticfile.get_variant('gzip').path, variant.path)
+
+        for filename in ['small.js', 'image.png']:
+            staticfile = index.get(os.path.join(self.root_path, filename))
+            self.assertEqual(staticfile.variants.keys(), [None])
+
+        # the variants of the files removed from the client are deleted
+        os.remove(os.path.join(self.root_path, 'scripts.js'))
+        os.remove(os.path.join(self.root_path, 'scripts.0123456789abcdef.js'))
+        index.load(self.root_path, GLSettings.client_cache_path)
+        self.assertFalse(os.path.exists(variant.path))
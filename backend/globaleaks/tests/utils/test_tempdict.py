@@ -53,3 +53,44 @@ class TestTempDict(helpers.TestGL):
                 self.assertEqual(len(xxx), size_limit)
                 self.assertEqual(xxx.get(x - size_limit + 1).id, x - size_limit + 1)
                 self.assertEqual(xxx.get(x - size_limit), None)
+
+    def test_touch(self):
+        timeout = 10
+
+        xxx = TempDict(timeout=timeout)
+        xxx.set(1, TestObject(1))
+
+        for _ in range(0, timeout * 3):
+            self.test_reactor.advance(timeout - 1)
+            self.assertEqual(xxx.get(1).id, 1)
+
+        self.test_reactor.advance(timeout)
+        self.assertEqual(xxx.get(1), None)
+
+    def test_reactor_overhead(self):
+        """
+        Benchmark of the delayed calls scheduled on the reactor with 100k live entries
+        """
+        timeout = 60
+        entries = 100000
+
+        xxx = TempDict(timeout=timeout)
+
+        for x in range(0, entries):
+            xxx.set(x, TestObject(x))
+            if x % (entries / (timeout / 2)) == 0:
+                self.test_reactor.advance(1)
+
+        # a single delayed call drives the expiration of all the entries
+        self.assertEqual(len(xxx), entries)
+        self.assertEqual(len(self.test_reactor.getDelayedCalls()), 1)
+
+        for x in range(0, entries, 2):
+            xxx.get(x)
+
+        self.assertEqual(len(self.test_reactor.getDelayedCalls()), 1)
+
+        self.test_reactor.pump([1] * (timeout * 2))
+
+        self.assertEqual(len(xxx), 0)
+        self.assertEqual(len(self.test_reactor.getDelayedCalls()), 0)
@@ -1,5 +1,6 @@
 import os
 
+from OpenSSL import SSL
 from twisted.trial.unittest import TestCase
 
 from globaleaks.models.config import PrivateFactory
@@ -170,3 +171,74 @@ class TestObjectValidators(TestCase):
         ok, err = chn_v.validate(self.cfg)
         self.assertTrue(ok)
         self.assertIsNone(err)
+
+
+class TestTLSServerContextFactory(TestCase):
+    def setUp(self):
+        cfg = get_valid_setup()
+
+        self.factory = tls.TLSServerContextFactory(cfg['key'],
+                                                   cfg['cert'],
+                                                   cfg['chain'],
+                                                   cfg['dh_params'])
+
+    def transfer(self, src, dst):
+        try:
+            dst.bio_write(src.bio_read(65536))
+        except SSL.WantReadError:
+            pass
+
+    def handshake(self, session=None):
+        client_ctx = SSL.Context(SSL.SSLv23_METHOD)
+        client = SSL.Connection(client_ctx, None)
+        client.set_connect_state()
+        if session is not None:
+            client.set_session(session)
+
+        server = SSL.Connection(self.factory.getContext(), None)
+        server.set_accept_state()
+
+        # exchange the records in memory until both sides complete the handshake
+        completed = False
+        while not completed:
+            completed = True
+            for conn in [client, server]:
+                try:
+                    conn.do_handshake()
+                except SSL.WantReadError:
+                    completed = False
+
+            self.transfer(client, server)
+            self.transfer(server, client)
+
+        # the data exchange makes the client receive the session (TLS 1.3)
+        client.sendall('ping')
+        self.transfer(client, server)
+        self.assertEqual(server.recv(4), 'ping')
+
+        server.sendall('pong')
+        self.transfer(server, client)
+        self.assertEqual(client.recv(4), 'pong')
+
+        # the sessions of the connections not closed cleanly are removed from the cache
+        server.shutdown()
+        self.transfer(server, client)
+
+        return client
+
+    def session_reused(self, client):
+        return tls._lib.SSL_session_reused(client._ssl) == 1
+
+    def test_session_resumption(self):
+        client = self.handshake()
+        self.assertFalse(self.session_reused(client))
+
+        client = self.handshake(client.get_session())
+        self.assertTrue(self.session_reused(client))
+
+        stats = self.factory.get_session_stats()
+        self.assertEqual(stats['handshakes'], 2)
+        self.assertEqual(stats['resumed'], 1)
+
+        # the session tickets are disabled and the session is resumed from the cache
+        self.assertTrue(stats['cached'] >= 1)
@@ -70,6 +70,33 @@ class TestProcessSupervisor(helpers.TestGL):
         self.assertFalse(p_s.is_running())
 
 
+    def test_get_workers_stats(self):
+        p_s = supervisor.ProcessSupervisor([], '127.0.0.1', 43435)
+
+        for requests, connections in [(10, 2), (30, 6)]:
+            pp = process.HTTPSProcProtocol(p_s, p_s.tls_cfg)
+            stats = {'proxy_pool': {'requests': requests, 'connections': connections, 'idle_connections': 1},
+                     'tls_sessions': {'handshakes': connections, 'resumed': connections / 2}}
+            line = process.STATS_PREFIX + json.dumps(stats) + '\n'
+
+            # the reports may be split across multiple reads of the pipe
+            pp.childDataReceived(0, line[:10])
+            pp.childDataReceived(0, line[10:])
+
+            self.assertEqual(pp.stats, stats)
+            p_s.tls_process_pool.append(pp)
+
+        stats = p_s.get_workers_stats()
+        self.assertEqual(stats['workers'], 2)
+        self.assertEqual(stats['proxy_requests'], 40)
+        self.assertEqual(stats['proxy_connections'], 8)
+        self.assertEqual(stats['proxy_idle_connections'], 2)
+        self.assertEqual(stats['proxy_connection_reuse_ratio'], 0.8)
+        self.assertEqual(stats['tls_handshakes'], 8)
+        self.assertEqual(stats['tls_resumed_sessions'], 4)
+        self.assertEqual(stats['tls_session_resumption_ratio'], 0.5)
+
+
 @transact
 def wrap_db_tx(store, f, *args, **kwargs):
     return f(store, *args, **kwargs)
@@ -93,6 +120,10 @@ class TestSubprocessRun(helpers.TestGL):
         valid_cfg = {
             'proxy_ip': '127.0.0.1',
             'proxy_port': 43434,
+            'proxy_pool_size': 8,
+            'proxy_pool_timeout': 60,
+            'stats_interval': 10,
+            'tls_session_timeout': 300,
             'tls_socket_fds': [sock.fileno() for sock in self.https_socks],
             'debug': False,
         }
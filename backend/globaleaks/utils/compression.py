@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+#
+# compression
+# ***********
+#
+# Content codings used to serve the responses compressed once and
+# their negotiation with the Accept-Encoding header of the clients.
+
+import gzip
+from StringIO import StringIO
+
+try:
+    import brotli # optional, used to compute the brotli variants
+except ImportError:
+    brotli = None
+
+__all__ = ['CONTENT_ENCODINGS', 'compress', 'select_content_encoding']
+
+
+def gzip_compress(data, level=9):
+    # the modification time is fixed in order to make the output reproducible
+    out = StringIO()
+    with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=level, mtime=0) as f:
+        f.write(data)
+
+    return out.getvalue()
+
+
+def brotli_compress(data, level=11):
+    return brotli.compress(data, quality=level)
+
+
+# the content codings served, by order of preference
+CONTENT_ENCODINGS_PREFERENCE = ['br', 'gzip']
+
+# the content codings supported with their extension and compressor
+CONTENT_ENCODINGS = [('gzip', 'gz', gzip_compress)]
+
+if brotli is not None:
+    CONTENT_ENCODINGS.insert(0, ('br', 'br', brotli_compress))
+
+# the levels used for the content compressed at runtime (e.g. the api cache);
+# the maximum levels are used only for the static files compressed once
+FAST_COMPRESSION_LEVELS = {'gzip': 6, 'br': 5}
+
+
+def compress(data, fast=False):
+    """
+    @param fast: use the compression levels favoring speed over ratio
+    @return: a dict mapping each supported content coding to the data compressed with it
+    """
+    if fast:
+        return {encoding: compressor(data, FAST_COMPRESSION_LEVELS[encoding])
+                for encoding, _, compressor in CONTENT_ENCODINGS}
+
+    return {encoding: compressor(data) for encoding, _, compressor in CONTENT_ENCODINGS}
+
+
+def parse_accept_encoding(accept_encoding):
+    """
+    @return: a dict mapping the content codings to their quality value
+    """
+    codings = {}
+
+    for item in accept_encoding.split(','):
+        params = item.split(';')
+        coding = params[0].strip().lower()
+        if not coding:
+            continue
+
+        q = 1.0
+        for param in params[1:]:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+
+        codings[coding] = q
+
+    return codings
+
+
+def select_content_encoding(accept_encoding, available):
+    """
+    @param accept_encoding: the value of the Accept-Encoding header
+    @param available: the content codings available for the resource
+    @return: the preferred among the available content codings accepted
+             by the client or None when the identity should be served
+    """
+    if not accept_encoding:
+        return None
+
+    codings = parse_accept_encoding(accept_encoding)
+
+    for encoding in CONTENT_ENCODINGS_PREFERENCE:
+        if encoding in available and codings.get(encoding, codings.get('*', 0)) > 0:
+            return encoding
+
+    return None
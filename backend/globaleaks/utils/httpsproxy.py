@@ -5,13 +5,28 @@ import zlib
 from zope.interface import implements
 
 from twisted.web import http
-from twisted.web.client import Agent
+from twisted.web.client import Agent, HTTPConnectionPool
 from twisted.internet import reactor, protocol, defer
 from twisted.internet.protocol import connectionDone
-from twisted.web.iweb import IBodyProducer
+from twisted.web.iweb import IBodyProducer, UNKNOWN_LENGTH
 from twisted.web.server import NOT_DONE_YET
 
 
+# headers that are meaningful only for a single connection and that are not
+# forwarded to the backend; among them the Connection header of the client
+# that would otherwise prevent the reuse of the pooled backend connections
+HOP_BY_HOP_HEADERS = [
+    'Connection',
+    'Keep-Alive',
+    'Proxy-Authenticate',
+    'Proxy-Authorization',
+    'TE',
+    'Trailer',
+    'Transfer-Encoding',
+    'Upgrade'
+]
+
+
 class BodyStreamer(protocol.Protocol):
     def __init__(self, streamfunction, finished):
         self._finished = finished
@@ -43,109 +58,209 @@ class BodyGzipStreamer(BodyStreamer):
 
 
 class BodyProducer(object):
+    """
+    Producer streaming the body of a client request to the backend as it
+    is received.
+
+    The chunks are written to the backend connection as soon as they are
+    received; while the backend connection is not established or its
+    write buffer is full, the reading from the client is paused so that
+    the data kept in memory is bounded by a few socket reads regardless
+    of the size of the body.
+    """
     implements(IBodyProducer)
 
-    BUF_MAX_SIZE = 64 * 1024 # TODO Use the hardcoded value for buf max size
-    length = 0
-    bytes_written = 0
-
-    deferred = None
-    inp_buf = None
-    rf_buf_fn = None
-    consumer = None
-
-    def __init__(self, inp_buf, rf_buf_fn, length):
-        self.inp_buf = inp_buf
-        self.rf_buf_fn = rf_buf_fn
+    def __init__(self, request, length):
+        self.request = request
         self.length = length
         self.deferred = defer.Deferred()
+        self.consumer = None
+        self.paused = False
+        self.finished = False
+        self.reason = None
+        self.chunks = []
+        self.client_paused = False
+
+    def pause_client(self):
+        # the reading is paused through the channel, which keeps track of
+        # whether its transport can be resumed while a request is processed
+        if not self.client_paused and self.request.channel is not None:
+            self.client_paused = True
+            self.request.channel.pauseProducing()
+
+    def resume_client(self):
+        if self.client_paused and self.request.channel is not None:
+            self.client_paused = False
+            self.request.channel.resumeProducing()
+
+    def write(self, data):
+        if self.deferred is None:
+            # the body is not anymore requested by the backend
+            return
+
+        if self.consumer is None or self.paused:
+            self.chunks.append(data)
+            self.pause_client()
+        else:
+            self.consumer.write(data)
+
+    def finish(self):
+        self.finished = True
+        self.flush()
+
+    def flush(self):
+        if self.consumer is None or self.paused or self.deferred is None:
+            return
+
+        for chunk in self.chunks:
+            self.consumer.write(chunk)
+
+        self.chunks = []
+
+        if self.finished:
+            self.deferred, d = None, self.deferred
+            d.callback(None)
+
+    def abort(self, reason):
+        self.chunks = []
+        self.reason = reason
+
+        if self.deferred is not None:
+            self.deferred, d = None, self.deferred
+            if self.consumer is not None:
+                d.errback(reason)
 
     def startProducing(self, consumer):
+        if self.reason is not None:
+            return defer.fail(self.reason)
+
         self.consumer = consumer
-        return self.resumeProducing()
+        d = self.deferred
+        self.resumeProducing()
+        return d
 
-    def resumeProducing(self):
-        chunk = self.inp_buf.read()
-        n = len(chunk)
-        if n != 0:
-            self.consumer.write(chunk)
-            self.bytes_written += n
-            if self.bytes_written > self.BUF_MAX_SIZE:
-                self.inp_buf = self.rf_buf_fn()
-                self.bytes_written = 0
-        else:
-            self.deferred.callback(None)
+    def pauseProducing(self):
+        self.paused = True
+        self.pause_client()
 
-        return self.deferred
+    def resumeProducing(self):
+        self.paused = False
+        self.flush()
+        self.resume_client()
 
     def stopProducing(self):
         self.deferred = None
-        self.inp_buf.close()
-        self.rf_buf_fn = None
+        self.chunks = []
         self.consumer = None
-
-    def pauseProducing(self):
-        pass
+        self.resume_client()
 
 
 class HTTPStreamProxyRequest(http.Request):
     gzip = False
+    processing = False
+    body_producer = None
+    proxy_d = None
+    proxy_method = None
+    proxy_path = None
 
     def __init__(self, *args, **kwargs):
         http.Request.__init__(self, *args, **kwargs)
 
-    def reset_buffer(self):
-        self.content.seek(0, 0)
-        self.content.truncate(0)
-        return self.content
+    def gotRequestLine(self, method, path):
+        """
+        Record the method and the path of the request line.
 
-    def gotLength(self, length):
-        http.Request.gotLength(self, length)
-        if isinstance(self.content, file):
-            self.content.close()
-            self.content = io.BytesIO()
-            self.reset_buffer()
+        The method and the uri are assigned to the request only when the
+        body is entirely received, too late to stream it to the backend.
+        """
+        self.proxy_method = method
+        self.proxy_path = path
 
-    def process(self):
-        proxy_url = bytes(urlparse.urljoin(self.channel.proxy_url, self.uri))
+    def gotLength(self, length):
+        """
+        Start the request to the backend as soon as the headers are received
+        in order to stream the body instead of buffering it.
+        """
+        # the body is never buffered; the empty content is kept for the
+        # parsing of the arguments done by http.Request.requestReceived
+        self.content = io.BytesIO()
+
+        if length is None:
+            # the backend does not support chunked request bodies
+            return
 
         hdrs = self.requestHeaders
+        for header in HOP_BY_HOP_HEADERS:
+            hdrs.removeHeader(header)
+
         hdrs.setRawHeaders('X-Forwarded-For', [self.getClientIP()])
 
         accept_encoding = self.getHeader('Accept-Encoding')
         if accept_encoding is not None and 'gzip' in accept_encoding:
             self.gzip = True
 
-	prod = None
-        content_length = self.getHeader('Content-Length')
-        if content_length is not None:
+        if length:
             hdrs.removeHeader('Content-Length')
-            prod = BodyProducer(self.content, self.reset_buffer, int(content_length))
-            self.registerProducer(prod, streaming=True)
+            self.body_producer = BodyProducer(self, length)
+
+        proxy_url = bytes(urlparse.urljoin(self.channel.proxy_url, self.proxy_path))
+
+        self.proxy_d = self.channel.http_agent.request(method=self.proxy_method,
+                                                       uri=proxy_url,
+                                                       headers=hdrs,
+                                                       bodyProducer=self.body_producer)
+
+    def handleContentChunk(self, data):
+        if self.body_producer is not None:
+            self.body_producer.write(data)
+
+    def process(self):
+        self.processing = True
+
+        if self.proxy_d is None:
+            self.setResponseCode(http.LENGTH_REQUIRED)
+            self.finish()
+            return NOT_DONE_YET
 
-        proxy_d = self.channel.http_agent.request(method=self.method,
-                                                  uri=proxy_url,
-                                                  headers=hdrs,
-                                                  bodyProducer=prod)
-        if prod is not None:
-            proxy_d.addBoth(self.proxyUnregister)
+        if self.body_producer is not None:
+            self.body_producer.finish()
 
-        proxy_d.addCallback(self.proxySuccess)
-        proxy_d.addErrback(self.proxyError)
+        self.proxy_d.addCallback(self.proxySuccess)
+        self.proxy_d.addErrback(self.proxyError)
 
         return NOT_DONE_YET
 
+    def connectionLost(self, reason):
+        http.Request.connectionLost(self, reason)
+
+        if self.body_producer is not None:
+            # the backend request is aborted if the body is incomplete
+            self.body_producer.abort(reason)
+
+        if self.proxy_d is not None and not self.processing:
+            self.proxy_d.addCallbacks(self.proxyDiscard, lambda _: None)
+            self.proxy_d.cancel()
+
     def proxySuccess(self, response):
         self.responseHeaders = response.headers
 
-        if self.gzip:
+        # the bodies already compressed by the backend, like the cached api
+        # resources and the static files, and the byte ranges are forwarded untouched
+        gzip = self.gzip and \
+               response.code != http.PARTIAL_CONTENT and \
+               not self.responseHeaders.hasHeader(b'content-encoding')
+
+        if gzip:
             self.responseHeaders.setRawHeaders(b'content-encoding', [b'gzip'])
+            self.responseHeaders.setRawHeaders(b'vary', [b'Accept-Encoding'])
+        elif response.length is not UNKNOWN_LENGTH:
+            self.responseHeaders.setRawHeaders(b'content-length', [bytes(response.length)])
 
         self.setResponseCode(response.code)
 
         d_forward = defer.Deferred()
 
-        if self.gzip:
+        if gzip:
             response.deliverBody(BodyGzipStreamer(self.write, d_forward))
         else:
             response.deliverBody(BodyStreamer(self.write, d_forward))
@@ -156,30 +271,79 @@ class HTTPStreamProxyRequest(http.Request):
         self.setResponseCode(502)
         self.forwardClose()
 
-    def proxyUnregister(self, o):
-        self.unregisterProducer()
-        return o
+    def proxyDiscard(self, response):
+        # the response is read in order to release the backend connection
+        response.deliverBody(protocol.Protocol())
 
     def forwardClose(self, *args):
         self.content.close()
-        self.finish()
+
+        if not self._disconnected:
+            self.finish()
+
+
+class HTTPStreamConnectionPool(HTTPConnectionPool):
+    """
+    Pool of the persistent connections to the backend accounting
+    how many requests have been served by reusing a connection
+    """
+    def __init__(self, reactor, max_persistent_per_host, cached_connection_timeout):
+        HTTPConnectionPool.__init__(self, reactor, persistent=True)
+        self.maxPersistentPerHost = max_persistent_per_host
+        self.cachedConnectionTimeout = cached_connection_timeout
+        self.requests = 0
+        self.connections = 0
+
+    def getConnection(self, key, endpoint):
+        self.requests += 1
+        return HTTPConnectionPool.getConnection(self, key, endpoint)
+
+    def _newConnection(self, key, endpoint):
+        self.connections += 1
+        return HTTPConnectionPool._newConnection(self, key, endpoint)
+
+    def get_stats(self):
+        return {
+            'requests': self.requests,
+            'connections': self.connections,
+            'idle_connections': sum(len(c) for c in self._connections.values())
+        }
 
 
 class HTTPStreamChannel(http.HTTPChannel):
     requestFactory = HTTPStreamProxyRequest
 
-    def __init__(self, proxy_url, *args, **kwargs):
+    def __init__(self, proxy_url, http_agent, *args, **kwargs):
         http.HTTPChannel.__init__(self, *args, **kwargs)
 
         self.proxy_url = proxy_url
-        self.http_agent = Agent(reactor, connectTimeout=2)
+        self.http_agent = http_agent
+
+    def lineReceived(self, line):
+        requests = len(self.requests)
+
+        http.HTTPChannel.lineReceived(self, line)
+
+        # a new request is created when its request line is received
+        if len(self.requests) > requests:
+            parts = line.split()
+            if len(parts) == 3:
+                self.requests[-1].gotRequestLine(parts[0], parts[1])
 
 
 class HTTPStreamFactory(http.HTTPFactory):
-    def __init__(self, proxy_url, *args, **kwargs):
+    def __init__(self, proxy_url, pool_size=8, pool_timeout=60, *args, **kwargs):
         http.HTTPFactory.__init__(self, *args, **kwargs)
         self.proxy_url = proxy_url
 
+        # the connections to the backend are shared by all the clients
+        self.pool = HTTPStreamConnectionPool(reactor, pool_size, pool_timeout)
+        self.http_agent = Agent(reactor, connectTimeout=2, pool=self.pool)
+
     def buildProtocol(self, addr):
-        proto = HTTPStreamChannel(self.proxy_url)
+        proto = HTTPStreamChannel(self.proxy_url, self.http_agent)
         return proto
+
+    def stopFactory(self):
+        http.HTTPFactory.stopFactory(self)
+        return self.pool.closeCachedConnections()
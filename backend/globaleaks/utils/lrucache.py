@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    A thread safe dictionary bounded in size that discards the least
+    recently used items and keeps track of its hits and misses.
+    """
+    def __init__(self, size_limit):
+        self.size_limit = size_limit
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+            # move the item to the end of the ordered dict
+            item = self.items.pop(key)
+            self.items[key] = item
+
+            return item
+
+    def set(self, key, item):
+        with self.lock:
+            self.items.pop(key, None)
+
+            while len(self.items) >= self.size_limit:
+                self.items.popitem(last=False)
+
+            self.items[key] = item
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.hits = 0
+            self.misses = 0
@@ -10,6 +10,7 @@ import re
 import sys
 import traceback
 from calendar import timegm
+from collections import deque
 from email import Charset # pylint: disable=no-name-in-module
 from email import utils as mailutils
 from email.header import Header
@@ -18,12 +19,13 @@ from email.mime.text import MIMEText
 
 from OpenSSL import SSL
 from datetime import datetime
-from twisted.internet import reactor, defer
+from twisted.internet import reactor, defer, protocol
 from twisted.internet.endpoints import TCP4ClientEndpoint
 from twisted.internet.ssl import ClientContextFactory
-from twisted.mail.smtp import ESMTPSenderFactory, SMTPError
+from twisted.mail.smtp import DNSNAME, ESMTPSender, SMTPClient, SMTPDeliveryError, SMTPError, SUCCESS
 from twisted.protocols import tls
 from twisted.python.failure import Failure
+from twisted.python.threadable import isInIOThread
 from txsocksx.client import SOCKS5ClientEndpoint
 
 from globaleaks import __version__
@@ -65,6 +67,298 @@ class GLClientContextFactory(ClientContextFactory):
         return ctx
 
 
+def get_smtp_session_key():
+    """
+    Return the settings an ESMTP session depends on; sessions established
+    with different settings cannot be reused.
+    """
+    return (GLSettings.memory_copy.notif.server,
+            GLSettings.memory_copy.notif.port,
+            GLSettings.memory_copy.notif.security,
+            GLSettings.memory_copy.notif.username,
+            GLSettings.memory_copy.private.smtp_password,
+            GLSettings.memory_copy.notif.source_email,
+            GLSettings.memory_copy.anonymize_outgoing_connections)
+
+
+class GLMail(object):
+    def __init__(self, to_address, message):
+        self.to_address = to_address
+        self.message = message
+        self.deferred = defer.Deferred()
+
+
+class GLESMTPSender(ESMTPSender):
+    """
+    ESMTP sender delivering over the same authenticated session all the
+    mails it pulls from the dispatcher queue; when the queue is empty the
+    session is kept idle for a while waiting for new mails.
+    """
+    def __init__(self, dispatcher, key, *args, **kwargs):
+        ESMTPSender.__init__(self, *args, **kwargs)
+        self.dispatcher = dispatcher
+        self.key = key
+        self.mail = None
+        self.processed = 0
+        self.ready = False
+        self.idle_call = None
+        self.error = None
+
+    def reusable(self):
+        return self.key == get_smtp_session_key() and \
+               self.processed < GLSettings.mail_session_messages_limit
+
+    def smtpState_from(self, code, resp):
+        if not self.ready:
+            self.ready = True
+            self.dispatcher.session_ready(self)
+
+        if not self.dispatcher.queue and self.reusable():
+            self.setTimeout(None)
+            self.idle_call = reactor.callLater(GLSettings.mail_session_idle_timeout, self.quit)
+            self.dispatcher.session_idle(self)
+            return
+
+        ESMTPSender.smtpState_from(self, code, resp)
+
+    def resume(self):
+        self.idle_call.cancel()
+        self.idle_call = None
+        self.setTimeout(self.timeout)
+        ESMTPSender.smtpState_from(self, 250, '')
+
+    def quit(self):
+        if self.idle_call is not None and self.idle_call.active():
+            self.idle_call.cancel()
+
+        self.idle_call = None
+        self.dispatcher.session_busy(self)
+        self.setTimeout(self.timeout)
+        self._disconnectFromServer()
+
+    def getMailFrom(self):
+        if not self.reusable():
+            return None
+
+        self.mail = self.dispatcher.next_mail()
+        if self.mail is None:
+            return None
+
+        return str(self.key[5])
+
+    def getMailTo(self):
+        return [self.mail.to_address]
+
+    def getMailData(self):
+        return self.mail.message
+
+    def sentMail(self, code, resp, numOk, addresses, log):
+        mail, self.mail = self.mail, None
+        self.processed += 1
+
+        if code in SUCCESS:
+            mail.deferred.callback(None)
+        else:
+            mail.deferred.errback(SMTPDeliveryError(code, resp, log.str(), addresses))
+
+    def fail_mail(self, reason):
+        mail, self.mail = self.mail, None
+
+        if mail is not None:
+            self.processed += 1
+            mail.deferred.errback(reason)
+
+    def sendError(self, exc):
+        self.error = exc
+        SMTPClient.sendError(self, exc)
+        self.fail_mail(exc)
+
+    def connectionLost(self, reason=protocol.connectionDone):
+        ESMTPSender.connectionLost(self, reason)
+
+        if self.idle_call is not None and self.idle_call.active():
+            self.idle_call.cancel()
+
+        self.idle_call = None
+
+        # a session lost before being ready (e.g. a failed TLS handshake or
+        # a server closing the connection) is a failure even if no mail was
+        # in delivery; SMTPClient.connectionLost does not call sendError
+        if self.error is None and (self.mail is not None or not self.ready):
+            self.error = reason.value
+
+        if self.mail is not None:
+            self.fail_mail(reason)
+
+        self.dispatcher.session_lost(self)
+
+
+class GLESMTPSenderFactory(protocol.ClientFactory):
+    domain = DNSNAME
+    protocol = GLESMTPSender
+
+    def __init__(self, dispatcher, key, context_factory):
+        self.dispatcher = dispatcher
+        self.key = key
+        self.context_factory = context_factory
+
+    def buildProtocol(self, addr):
+        p = self.protocol(self.dispatcher,
+                          self.key,
+                          self.key[3].encode('utf-8'),
+                          self.key[4].encode('utf-8'),
+                          self.context_factory,
+                          self.domain)
+
+        p.heloFallback = False
+        p.requireAuthentication = True
+        p.requireTransportSecurity = (self.key[2] != 'SSL')
+        p.factory = self
+        p.timeout = GLSettings.mail_timeout
+
+        return p
+
+
+class MailDispatcher(object):
+    """
+    Dispatcher delivering the mails over a small pool of authenticated
+    ESMTP sessions (torified if anonymize_outgoing_connections is enabled);
+    every session delivers many mails and the idle sessions are reused.
+    """
+    def __init__(self):
+        self.queue = deque()
+        self.sessions = set()
+        self.idle = []
+        self.connecting = 0
+        self.failures = 0
+        self.retry_call = None
+
+    def dispatch(self, mail):
+        self.queue.append(mail)
+        self.process()
+
+    def next_mail(self):
+        return self.queue.popleft() if self.queue else None
+
+    def process(self):
+        key = get_smtp_session_key()
+
+        for session in list(self.idle):
+            if session.key != key:
+                session.quit()
+
+        while self.queue and self.idle:
+            self.idle.pop().resume()
+
+        if self.retry_call is not None:
+            # new sessions are opened only when the retry delay expires
+            return
+
+        while len(self.queue) > self.connecting and \
+              len(self.sessions) + self.connecting < GLSettings.mail_sessions_limit:
+            self.connect(key)
+
+    def connect(self, key):
+        smtp_host, smtp_port, security = key[0], key[1], key[2]
+
+        log.debug('Opening SMTP session with server [%s:%d] [%s]' %
+                  (smtp_host, smtp_port, security))
+
+        context_factory = GLClientContextFactory()
+
+        factory = GLESMTPSenderFactory(self, key, context_factory)
+
+        if security == "SSL":
+            factory = tls.TLSMemoryBIOFactory(context_factory, True, factory)
+
+        if key[6]:
+            socksProxy = TCP4ClientEndpoint(reactor, GLSettings.socks_host, GLSettings.socks_port, timeout=GLSettings.mail_timeout)
+            endpoint = SOCKS5ClientEndpoint(smtp_host.encode('utf-8'), smtp_port, socksProxy)
+        else:
+            endpoint = TCP4ClientEndpoint(reactor, smtp_host.encode('utf-8'), smtp_port, timeout=GLSettings.mail_timeout)
+
+        self.connecting += 1
+
+        d = endpoint.connect(factory)
+        d.addErrback(self.connection_failed)
+
+    def connection_failed(self, reason):
+        self.connecting -= 1
+        self.failures += 1
+        self.abort(reason)
+        self.retry()
+
+    def retry(self):
+        """
+        Process the queue after a delay growing with the consecutive failures
+        """
+        if self.retry_call is not None:
+            return
+
+        delay = min(GLSettings.mail_session_retry_delay * 2 ** (self.failures - 1),
+                    GLSettings.mail_session_retry_max_delay)
+
+        self.retry_call = reactor.callLater(delay, self.retry_expired)
+
+    def retry_expired(self):
+        self.retry_call = None
+        self.process()
+
+    def abort(self, reason):
+        """
+        Fail the queued mails if no other session can deliver them
+        """
+        if isinstance(reason, Failure):
+            reason = reason.value
+
+        log.err("SMTP connection failed (Exception: %s)" % reason)
+
+        if self.sessions or self.connecting:
+            return
+
+        # the queue is replaced before firing the errbacks because
+        # these could dispatch new mails
+        queue, self.queue = self.queue, deque()
+
+        for mail in queue:
+            mail.deferred.errback(reason)
+
+    def session_ready(self, session):
+        self.connecting -= 1
+        self.sessions.add(session)
+        self.failures = 0
+
+    def session_idle(self, session):
+        self.idle.append(session)
+
+    def session_busy(self, session):
+        if session in self.idle:
+            self.idle.remove(session)
+
+    def session_lost(self, session):
+        self.session_busy(session)
+
+        if session.ready:
+            self.sessions.discard(session)
+        else:
+            self.connecting -= 1
+
+        if session.error is None:
+            self.process()
+            return
+
+        self.failures += 1
+
+        if session.processed == 0:
+            # avoid reconnecting in loop to a server that is failing
+            self.abort(session.error)
+
+        self.retry()
+
+
+mail_dispatcher = MailDispatcher()
+
+
 def sendmail(to_address, subject, body):
     """
     Sends an email using SMTPS/SMTP+TLS and torify the connection
@@ -72,31 +366,12 @@ def sendmail(to_address, subject, body):
     @param to_address: the to address field of the email
     @param subject: the mail subject
     @param body: the mail body
-    @param event: the event description, needed to keep track of failure/success
+    @return: a deferred firing when the mail has been sent
     """
     try:
         if to_address == "":
             return
 
-        result_deferred = defer.Deferred()
-
-        def errback(reason, *args, **kwargs):
-            # TODO: here it should be written a complete debugging of the possible
-            #       errors by writing clear log lines in relation to all the stack:
-            #       e.g. it should debugged all errors related to: TCP/SOCKS/TLS/SSL/SMTP/SFIGA
-            if isinstance(reason, Failure):
-                log.err("SMTP connection failed (Exception: %s)" % reason.value)
-                log.debug(reason)
-
-            return result_deferred.errback(reason)
-
-        authentication_username=GLSettings.memory_copy.notif.username
-        authentication_password=GLSettings.memory_copy.private.smtp_password
-        from_address=GLSettings.memory_copy.notif.source_email
-        smtp_host=GLSettings.memory_copy.notif.server
-        smtp_port=GLSettings.memory_copy.notif.port
-        security=GLSettings.memory_copy.notif.security
-
         message = MIME_mail_build(GLSettings.memory_copy.notif.source_name,
                                   GLSettings.memory_copy.notif.source_email,
                                   to_address,
@@ -105,43 +380,23 @@ def sendmail(to_address, subject, body):
                                   body)
 
         log.debug('Sending email to %s using SMTP server [%s:%d] [%s]' %
-                  (to_address, smtp_host, smtp_port, security))
-
-        context_factory = GLClientContextFactory()
-
-        esmtp_deferred = defer.Deferred()
-        esmtp_deferred.addCallbacks(result_deferred.callback, errback)
-
-        factory = ESMTPSenderFactory(
-            authentication_username.encode('utf-8'),
-            authentication_password.encode('utf-8'),
-            from_address,
-            to_address,
-            message,
-            esmtp_deferred,
-            contextFactory=context_factory,
-            requireAuthentication=True,
-            requireTransportSecurity=(security != 'SSL'),
-            retries=0,
-            timeout=GLSettings.mail_timeout)
-
-        if security == "SSL":
-            factory = tls.TLSMemoryBIOFactory(context_factory, True, factory)
+                  (to_address,
+                   GLSettings.memory_copy.notif.server,
+                   GLSettings.memory_copy.notif.port,
+                   GLSettings.memory_copy.notif.security))
 
         if GLSettings.testing:
             #  Hooking the test down to here is a trick to be able to test all the above code :)
             return defer.succeed(None)
 
-        if GLSettings.memory_copy.anonymize_outgoing_connections:
-            socksProxy = TCP4ClientEndpoint(reactor, GLSettings.socks_host, GLSettings.socks_port, timeout=GLSettings.mail_timeout)
-            endpoint = SOCKS5ClientEndpoint(smtp_host.encode('utf-8'), smtp_port, socksProxy)
-        else:
-            endpoint = TCP4ClientEndpoint(reactor, smtp_host.encode('utf-8'), smtp_port, timeout=GLSettings.mail_timeout)
+        mail = GLMail(to_address, message)
 
-        d = endpoint.connect(factory)
-        d.addErrback(errback)
+        if isInIOThread():
+            mail_dispatcher.dispatch(mail)
+        else:
+            reactor.callFromThread(mail_dispatcher.dispatch, mail)
 
-        return result_deferred
+        return mail.deferred
 
     except Exception as excep:
         # we strongly need to avoid raising exception inside email logic to avoid chained errors
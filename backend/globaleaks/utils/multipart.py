@@ -0,0 +1,181 @@
+# -*- encoding: utf-8 -*-
+#
+# multipart
+# *********
+#
+# Incremental parser of multipart/form-data request bodies used to stream
+# the file uploads to disk as their bytes are received from the socket.
+
+from cyclone.httputil import HTTPFile, HTTPHeaders, _parse_header
+
+from globaleaks.security import GLSecureTemporaryFile
+
+# maximum size of the headers of a single part
+MULTIPART_HEADERS_MAX_SIZE = 8 * 1024
+
+# maximum size of all the fields that are not files
+MULTIPART_FIELDS_MAX_SIZE = 64 * 1024
+
+
+class MultipartError(Exception):
+    pass
+
+
+def get_multipart_boundary(content_type):
+    """
+    Extract the boundary from a multipart/form-data Content-Type header
+
+    @return: the boundary or None if the header is invalid
+    """
+    fields = content_type.split(";")
+    if fields[0].strip() != "multipart/form-data":
+        return None
+
+    for field in fields[1:]:
+        k, sep, v = field.strip().partition("=")
+        if k == "boundary" and v:
+            # the standard allows for the boundary to be quoted
+            if v.startswith('"') and v.endswith('"'):
+                v = v[1:-1]
+
+            return v
+
+    return None
+
+
+class MultipartStreamParser(object):
+    """
+    Parser of multipart/form-data bodies fed incrementally with write().
+
+    The file parts are written encrypted to GLSecureTemporaryFile objects
+    while they are received, the other fields are kept in memory; the
+    memory used is bounded by the size of the data passed to each write().
+
+    Once the body is completed the parsed data is available in the
+    attributes arguments and files, in the same format used by cyclone.
+    """
+    def __init__(self, boundary, filedir, max_files=1):
+        self.delimiter = '\r\n--' + boundary
+        self.filedir = filedir
+        self.max_files = max_files
+
+        # the first delimiter is not preceded by CRLF
+        self.buffer = '\r\n'
+        self.state = 'preamble'
+
+        self.arguments = {}
+        self.files = {}
+
+        self.fields_size = 0
+        self.files_count = 0
+        self.part = None
+
+    def write(self, data):
+        self.buffer += data
+
+        while True:
+            if self.state in ('preamble', 'body'):
+                idx = self.buffer.find(self.delimiter)
+                if idx == -1:
+                    # keep the bytes that could be the beginning of the delimiter
+                    keep = len(self.delimiter) - 1
+                    if len(self.buffer) > keep:
+                        self.part_data(self.buffer[:-keep])
+                        self.buffer = self.buffer[-keep:]
+                    return
+
+                self.part_data(self.buffer[:idx])
+                self.part_end()
+                self.buffer = self.buffer[idx + len(self.delimiter):]
+                self.state = 'boundary'
+
+            elif self.state == 'boundary':
+                if len(self.buffer) < 2:
+                    return
+
+                if self.buffer.startswith('--'):
+                    self.buffer = ''
+                    self.state = 'epilogue'
+                elif self.buffer.startswith('\r\n'):
+                    self.buffer = self.buffer[2:]
+                    self.state = 'headers'
+                else:
+                    raise MultipartError("Invalid multipart/form-data boundary")
+
+            elif self.state == 'headers':
+                idx = self.buffer.find('\r\n\r\n')
+                if idx == -1:
+                    if len(self.buffer) > MULTIPART_HEADERS_MAX_SIZE:
+                        raise MultipartError("multipart/form-data headers too long")
+                    return
+
+                self.part_begin(self.buffer[:idx])
+                self.buffer = self.buffer[idx + 4:]
+                self.state = 'body'
+
+            else:  # self.state == 'epilogue'
+                self.buffer = ''
+                return
+
+    def part_begin(self, data):
+        try:
+            headers = HTTPHeaders.parse(data.decode('utf-8'))
+        except Exception:
+            raise MultipartError("Invalid multipart/form-data headers")
+
+        disposition, params = _parse_header(headers.get("Content-Disposition", ""))
+        if disposition != "form-data" or not params.get("name"):
+            raise MultipartError("Invalid multipart/form-data part")
+
+        name = params["name"]
+
+        if params.get("filename"):
+            if self.files_count >= self.max_files:
+                raise MultipartError("Too many files in multipart/form-data")
+
+            self.files_count += 1
+
+            self.part = HTTPFile(name=name,
+                                 filename=params["filename"],
+                                 content_type=headers.get("Content-Type", "application/unknown"),
+                                 body=GLSecureTemporaryFile(self.filedir),
+                                 size=0)
+
+            self.files.setdefault(name, []).append(self.part)
+        else:
+            self.part = {'name': name, 'value': []}
+
+    def part_data(self, data):
+        if self.part is None or not data:
+            # the preamble is discarded
+            return
+
+        if isinstance(self.part, HTTPFile):
+            self.part['body'].write(data)
+            self.part['size'] += len(data)
+        else:
+            self.fields_size += len(data)
+            if self.fields_size > MULTIPART_FIELDS_MAX_SIZE:
+                raise MultipartError("multipart/form-data fields too long")
+
+            self.part['value'].append(data)
+
+    def part_end(self):
+        if self.part is not None and not isinstance(self.part, HTTPFile):
+            self.arguments.setdefault(self.part['name'], []).append(''.join(self.part['value']))
+
+        self.part = None
+
+    def finish(self):
+        if self.state != 'epilogue':
+            raise MultipartError("Invalid multipart/form-data: no final boundary")
+
+    def close(self):
+        """
+        Close and delete all the files received
+        """
+        for files in self.files.values():
+            for f in files:
+                f['body'].close()
+
+        self.files = {}
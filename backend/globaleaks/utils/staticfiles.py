@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# staticfiles
+# ***********
+#
+# Index of the static files of the client computed at startup.
+#
+# For every file are computed a strong ETag, derived from the digest of its
+# content, and the compressed variants served to the clients accepting them.
+# The variants are stored in a cache directory and named after the digest of
+# the content so that they are computed only once for each release of the client.
+
+import hashlib
+import os
+import re
+
+from globaleaks.utils.compression import CONTENT_ENCODINGS, select_content_encoding
+
+__all__ = ['GLStaticFiles']
+
+# extensions of the files whose content is worth to be compressed
+COMPRESSIBLE_EXTENSIONS = frozenset(['.css', '.eot', '.html', '.js', '.json', '.svg', '.ttf', '.txt', '.xml'])
+
+# files smaller than this size are always served uncompressed
+COMPRESSION_MIN_SIZE = 1024
+
+# a compressed variant is served only if at least 10% smaller than the file
+COMPRESSION_MAX_RATIO = 0.9
+
+# files whose name includes the digest of the content, e.g. scripts.3f2a9c1b.js;
+# their content never changes and they are served with long-lived cache headers
+HASHED_FILENAME_REGEXP = re.compile(r'\.[0-9a-f]{8,}\.[a-z0-9]+$')
+
+
+class StaticFileVariant(object):
+    """
+    A representation of a static file, the file itself or one of its
+    compressed variants
+    """
+    def __init__(self, path, encoding, etag):
+        self.path = path
+        self.encoding = encoding
+        self.etag = etag
+
+
+class StaticFile(object):
+    def __init__(self, path, digest, mtime):
+        self.path = path
+        self.digest = digest
+        self.mtime = mtime
+        self.immutable = HASHED_FILENAME_REGEXP.search(os.path.basename(path)) is not None
+        self.variants = {None: StaticFileVariant(path, None, '"%s"' % digest)}
+
+    def add_variant(self, path, encoding):
+        self.variants[encoding] = StaticFileVariant(path, encoding, '"%s-%s"' % (self.digest, encoding))
+
+    def get_variant(self, accept_encoding):
+        return self.variants[select_content_encoding(accept_encoding, self.variants)]
+
+
+class StaticFilesIndex(object):
+    def __init__(self):
+        self.files = {}
+
+    def get(self, path):
+        return self.files.get(path)
+
+    def load(self, root_path, cache_path):
+        """
+        Index the files contained in root_path computing their compressed
+        variants in cache_path; the variants not anymore needed are removed.
+
+        The function is blocking and it is intended to be run in a thread.
+        """
+        files = {}
+        variants = set()
+
+        root_path = os.path.abspath(root_path)
+
+        for dirpath, _, filenames in os.walk(root_path):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                staticfile = self.load_file(path, cache_path)
+                files[path] = staticfile
+                variants.update(v.path for v in staticfile.variants.values() if v.encoding is not None)
+
+        for filename in os.listdir(cache_path):
+            path = os.path.join(cache_path, filename)
+            if path not in variants:
+                os.remove(path)
+
+        self.files = files
+
+    def load_file(self, path, cache_path):
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        staticfile = StaticFile(path, hashlib.sha256(data).hexdigest(), os.stat(path).st_mtime)
+
+        if len(data) < COMPRESSION_MIN_SIZE or \
+           os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return staticfile
+
+        for encoding, extension, compress in CONTENT_ENCODINGS:
+            variant_path = os.path.join(cache_path, '%s.%s' % (staticfile.digest, extension))
+
+            if not os.path.exists(variant_path):
+                compressed_data = compress(data)
+                if len(compressed_data) > len(data) * COMPRESSION_MAX_RATIO:
+                    continue
+
+                tmp_path = variant_path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(compressed_data)
+
+                os.rename(tmp_path, variant_path)
+
+            staticfile.add_variant(variant_path, encoding)
+
+        return staticfile
+
+
+GLStaticFiles = StaticFilesIndex()
@@ -1,5 +1,17 @@
 # -*- coding: utf-8 -*-
-
+#
+# tempdict
+# ********
+#
+# Dictionaries whose entries expire after a timeout.
+#
+# The expiration times are tracked with a hashed timing wheel with a
+# resolution of one second: the entries are kept in buckets indexed by the
+# second of their expiration so that insertion, touch and expiration are O(1),
+# and each dictionary keeps at most one delayed call scheduled on the reactor,
+# at the second of the next expiration, independently of its number of entries.
+
+import math
 from collections import OrderedDict
 
 from twisted.internet import reactor
@@ -9,6 +21,41 @@ from twisted.internet import reactor
 test_reactor = None
 
 
+def get_reactor():
+    return reactor if test_reactor is None else test_reactor
+
+
+class ExpireCall(object):
+    """
+    Handle of the expiration of an entry of a TempDict; it exposes the
+    same interface of the twisted IDelayedCall used to handle it.
+    """
+    def __init__(self, tempdict, key, tick):
+        self.tempdict = tempdict
+        self.key = key
+        self.tick = tick
+
+    def getTime(self):
+        return self.tick
+
+    def active(self):
+        return self.tick is not None
+
+    def reset(self, timeout):
+        if self.tick is not None:
+            self.tempdict._unschedule(self)
+            self.tick = self.tempdict._get_tick(timeout)
+            self.tempdict._schedule(self)
+
+    def cancel(self):
+        if self.tick is not None:
+            self.tempdict._unschedule(self)
+            self.tick = None
+
+    def __repr__(self):
+        return "<ExpireCall %s at %s>" % (self.key, self.tick)
+
+
 class TempDict(OrderedDict):
     reactor = None
     expireCallback = None
@@ -18,6 +65,14 @@ class TempDict(OrderedDict):
         self.size_limit = size_limit
         OrderedDict.__init__(self)
 
+        # buckets of the timing wheel indexed by the second of expiration
+        self.buckets = {}
+
+        # the single delayed call driving the wheel and its tick
+        self.timer = None
+        self.timer_tick = None
+        self.timer_reactor = None
+
         self._check_size_limit()
 
     def get_timeout(self):
@@ -30,11 +85,12 @@ class TempDict(OrderedDict):
 
     def set(self, key, item):
         self._check_size_limit()
-        timeout = self.get_timeout()
-        if test_reactor is None:
-            item.expireCall = reactor.callLater(timeout, self._expire, key)
-        else:
-            item.expireCall = test_reactor.callLater(timeout, self._expire, key)
+
+        if key in self and self[key].expireCall is not None:
+            self[key].expireCall.cancel()
+
+        item.expireCall = ExpireCall(self, key, self._get_tick(self.get_timeout()))
+        self._schedule(item.expireCall)
 
         self[key] = item
 
@@ -55,6 +111,10 @@ class TempDict(OrderedDict):
         else:
             raise Exception("Failed to delete %s from %s" % (key, self.__class__))
 
+    def clear(self):
+        OrderedDict.clear(self)
+        self.buckets = {}
+        self._stop_timer()
 
     def _check_size_limit(self):
         size_limit = self.get_size_limit()
@@ -71,3 +131,56 @@ class TempDict(OrderedDict):
                 self.expireCallback(self[key])
 
             del self[key]
+
+    def _get_tick(self, timeout):
+        return int(math.ceil(get_reactor().seconds() + timeout))
+
+    def _schedule(self, expire_call):
+        self.buckets.setdefault(expire_call.tick, OrderedDict())[expire_call.key] = expire_call
+
+        if self.timer is None or \
+           self.timer_reactor is not get_reactor() or \
+           expire_call.tick < self.timer_tick:
+            self._start_timer(expire_call.tick)
+
+    def _unschedule(self, expire_call):
+        bucket = self.buckets.get(expire_call.tick)
+        if bucket is not None:
+            bucket.pop(expire_call.key, None)
+            if not bucket:
+                del self.buckets[expire_call.tick]
+
+    def _start_timer(self, tick):
+        self._stop_timer()
+
+        self.timer_reactor = get_reactor()
+        self.timer_tick = tick
+        self.timer = self.timer_reactor.callLater(max(0, tick - self.timer_reactor.seconds()), self._tick)
+
+    def _stop_timer(self):
+        if self.timer is not None and self.timer.active():
+            self.timer.cancel()
+
+        self.timer = None
+        self.timer_tick = None
+
+    def _tick(self):
+        """
+        Expire the entries of the buckets elapsed and schedule the
+        delayed call at the second of the next expiration.
+        """
+        self.timer = None
+
+        tick = self.timer_tick
+        now = self.timer_reactor.seconds()
+
+        while self.buckets and tick <= now:
+            for key, expire_call in self.buckets.pop(tick, {}).iteritems():
+                expire_call.tick = None
+                if key in self and self[key].expireCall is expire_call:
+                    self._expire(key)
+
+            tick += 1
+
+        if self.buckets:
+            self._start_timer(min(self.buckets))
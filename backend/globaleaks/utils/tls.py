@@ -113,30 +113,71 @@ def new_tls_context():
 
 
 class TLSServerContextFactory(ssl.ContextFactory):
-    def __init__(self, priv_key, certificate, intermediate, dh):
+    def __init__(self, priv_key, certificate, intermediate, dh, session_timeout=300):
         """
         @param priv_key: String representation of the private key
         @param certificate: String representation of the certificate
         @param intermediate: String representation of the intermediate file
         @param dh: String representation of the DH parameters
+        @param session_timeout: Seconds during which a TLS session can be resumed
         """
-        self.ctx = new_tls_context()
+        self.priv_key = priv_key
+        self.certificate = certificate
+        self.intermediate = intermediate
+        self.dh = dh
+        self.session_timeout = session_timeout
 
-        x509 = load_certificate(FILETYPE_PEM, certificate)
-        self.ctx.use_certificate(x509)
+        self.handshakes = 0
+        self.resumed_sessions = 0
 
-        if intermediate != '':
-            x509 = load_certificate(FILETYPE_PEM, intermediate)
-            self.ctx.add_extra_chain_cert(x509)
+        self.ctx = self.new_context()
+
+    def new_context(self):
+        ctx = new_tls_context()
+
+        x509 = load_certificate(FILETYPE_PEM, self.certificate)
+        ctx.use_certificate(x509)
 
-        priv_key = load_privatekey(FILETYPE_PEM, priv_key)
-        self.ctx.use_privatekey(priv_key)
+        if self.intermediate != '':
+            x509 = load_certificate(FILETYPE_PEM, self.intermediate)
+            ctx.add_extra_chain_cert(x509)
 
-        load_dh_params_from_string(self.ctx, dh)
+        priv_key = load_privatekey(FILETYPE_PEM, self.priv_key)
+        ctx.use_privatekey(priv_key)
 
-        ecdh = _lib.EC_KEY_new_by_curve_name(_lib.NID_X9_62_prime256v1)
-        ecdh = _ffi.gc(ecdh, _lib.EC_KEY_free)
-        _lib.SSL_CTX_set_tmp_ecdh(self.ctx._context, ecdh)
+        load_dh_params_from_string(ctx, self.dh)
+
+        ctx.set_tmp_ecdh(crypto.get_elliptic_curve(u'prime256v1'))
+
+        # The sessions are resumed only by means of the session cache of the
+        # context; the session tickets stay disabled to preserve the forward
+        # secrecy of the connections.
+        #
+        # The cache is private to each https worker: a session is resumed
+        # only by the worker that issued it, i.e. about 1/N of the
+        # reconnections with N workers sharing the socket.
+        ctx.set_session_id(b'globaleaks')
+        ctx.set_session_cache_mode(SSL.SESS_CACHE_SERVER)
+        ctx.set_timeout(self.session_timeout)
+
+        ctx.set_info_callback(self.info_callback)
+
+        return ctx
+
+    def info_callback(self, conn, where, ret):
+        # the handshakes are accounted here because the counters of OpenSSL
+        # account twice the sessions resumed with TLS 1.3
+        if where & SSL.SSL_CB_HANDSHAKE_DONE:
+            self.handshakes += 1
+            if _lib.SSL_session_reused(conn._ssl):
+                self.resumed_sessions += 1
+
+    def get_session_stats(self):
+        return {
+            'handshakes': self.handshakes,
+            'resumed': self.resumed_sessions,
+            'cached': _lib.SSL_CTX_sess_number(self.ctx._context)
+        }
 
     def getContext(self):
         return self.ctx
@@ -6,6 +6,7 @@ if os.path.dirname(__file__) != '/usr/lib/python2.7/dist-packages/globaleaks/wor
     sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
 
 from globaleaks.workers.process import Process
 from globaleaks.utils.sock import listen_tls_on_sock
@@ -21,17 +22,20 @@ class HTTPSProcess(Process):
 
         proxy_url = 'http://' + self.cfg['proxy_ip'] + ':' + str(self.cfg['proxy_port'])
 
-        http_proxy_factory = HTTPStreamFactory(proxy_url)
+        self.http_proxy_factory = HTTPStreamFactory(proxy_url,
+                                                    self.cfg['proxy_pool_size'],
+                                                    self.cfg['proxy_pool_timeout'])
 
         cv = ChainValidator()
         ok, err = cv.validate(self.cfg, must_be_disabled=False)
         if not ok or not err is None:
             raise err
 
-        tls_factory = TLSServerContextFactory(self.cfg['ssl_key'],
-                                              self.cfg['ssl_cert'],
-                                              self.cfg['ssl_intermediate'],
-                                              self.cfg['ssl_dh'])
+        self.tls_factory = TLSServerContextFactory(self.cfg['ssl_key'],
+                                                   self.cfg['ssl_cert'],
+                                                   self.cfg['ssl_intermediate'],
+                                                   self.cfg['ssl_dh'],
+                                                   self.cfg['tls_session_timeout'])
 
         socket_fds = self.cfg['tls_socket_fds']
 
@@ -40,13 +44,25 @@ class HTTPSProcess(Process):
 
             port = listen_tls_on_sock(reactor,
                                       fd=socket_fd,
-                                      contextFactory=tls_factory,
-                                      factory=http_proxy_factory)
+                                      contextFactory=self.tls_factory,
+                                      factory=self.http_proxy_factory)
 
             self.ports.append(port)
             self.log("HTTPS proxy listening on %s" % port)
 
+        self.stats_loop = LoopingCall(self.send_stats)
+        self.stats_loop.start(self.cfg['stats_interval'], now=False)
+
+    def send_stats(self):
+        self.report_stats({
+            'proxy_pool': self.http_proxy_factory.pool.get_stats(),
+            'tls_sessions': self.tls_factory.get_session_stats()
+        })
+
     def shutdown(self):
+        if self.stats_loop.running:
+            self.stats_loop.stop()
+
         for port in self.ports:
             port.loseConnection()
 
@@ -11,6 +11,10 @@ from twisted.internet.protocol import ProcessProtocol
 
 from globaleaks.utils.utility import log
 
+
+# prefix of the lines by which the workers report their stats on the log pipe
+STATS_PREFIX = 'STATS '
+
 def SigQUIT(SIG, FRM):
     try:
         if reactor.running:
@@ -76,6 +80,9 @@ class Process(object):
         if self.cfg.get('debug', False):
             self._log('[%s:%d] %s\n' % (self.name, self.pid, m))
 
+    def report_stats(self, stats):
+        self._log('%s%s\n' % (STATS_PREFIX, json.dumps(stats)))
+
 
 class CfgFDProcProtocol(ProcessProtocol):
     def __init__(self, supervisor, cfg, cfg_fd=42):
@@ -87,6 +94,9 @@ class CfgFDProcProtocol(ProcessProtocol):
 
         self.startup_promise = defer.Deferred()
 
+        self.stats = {}
+        self.buf = ''
+
     def connectionMade(self):
         self.transport.writeToChild(self.cfg_fd, self.cfg)
         self.transport.closeChildFD(self.cfg_fd)
@@ -94,8 +104,13 @@ class CfgFDProcProtocol(ProcessProtocol):
         self.startup_promise.callback(None)
 
     def childDataReceived(self, childFD, data):
-        for line in data.split('\n'):
-            if line != '':
+        lines = (self.buf + data).split('\n')
+        self.buf = lines.pop()
+
+        for line in lines:
+            if line.startswith(STATS_PREFIX):
+                self.stats = json.loads(line[len(STATS_PREFIX):])
+            elif line != '':
                 log.debug(line)
 
     def processEnded(self, reason):
@@ -9,6 +9,7 @@ from twisted.internet import defer, reactor
 
 from globaleaks.models.config import PrivateFactory, load_tls_dict
 from globaleaks.orm import transact
+from globaleaks.settings import GLSettings
 from globaleaks.utils import tls
 from globaleaks.utils.utility import log, datetime_now, datetime_to_ISO8601
 from globaleaks.workers.process import HTTPSProcProtocol
@@ -41,6 +42,10 @@ class ProcessSupervisor(object):
         self.tls_cfg = {
           'proxy_ip': proxy_ip,
           'proxy_port': proxy_port,
+          'proxy_pool_size': GLSettings.https_proxy_pool_size,
+          'proxy_pool_timeout': GLSettings.https_proxy_pool_timeout,
+          'stats_interval': GLSettings.https_workers_stats_interval,
+          'tls_session_timeout': GLSettings.https_tls_session_timeout,
           'debug': log.loglevel <= logging.DEBUG,
         }
 
@@ -178,6 +183,34 @@ class ProcessSupervisor(object):
 
         return s
 
+    def get_workers_stats(self):
+        """
+        Aggregate the stats last reported by the running workers
+        """
+        requests = connections = idle_connections = 0
+        handshakes = resumed = 0
+
+        for pp in self.tls_process_pool:
+            pool_stats = pp.stats.get('proxy_pool', {})
+            requests += pool_stats.get('requests', 0)
+            connections += pool_stats.get('connections', 0)
+            idle_connections += pool_stats.get('idle_connections', 0)
+
+            session_stats = pp.stats.get('tls_sessions', {})
+            handshakes += session_stats.get('handshakes', 0)
+            resumed += session_stats.get('resumed', 0)
+
+        return {
+            'workers': len(self.tls_process_pool),
+            'proxy_requests': requests,
+            'proxy_connections': connections,
+            'proxy_idle_connections': idle_connections,
+            'proxy_connection_reuse_ratio': 1 - float(connections) / requests if requests else 0.0,
+            'tls_handshakes': handshakes,
+            'tls_resumed_sessions': resumed,
+            'tls_session_resumption_ratio': float(resumed) / handshakes if handshakes else 0.0
+        }
+
     def shutdown(self):
         log.debug('Starting shutdown of %d children' % len(self.tls_process_pool))
 